@@ -9,7 +9,18 @@ from distutils.core import Distribution
 ext_modules = [
     Pybind11Extension(
         "pycombo._combo",
-        sources=["src/Combo/Graph.cpp", "src/Combo/Combo.cpp", "src/Binder.cpp"],
+        sources=[
+            "src/Combo/Graph.cpp",
+            "src/PartitionedGraph.cpp",
+            "src/IntermediateResults.cpp",
+            "src/GraphFile.cpp",
+            "src/DenseGraph.cpp",
+            "src/SparseGraph.cpp",
+            "src/PreparedGraph.cpp",
+            "src/DynamicGraph.cpp",
+            "src/Multilevel.cpp",
+            "src/Binder.cpp",
+        ],
     )
 ]
 
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compares NetworkX graph ingestion paths:
+tuple list (`misc.deconstruct_graph`) vs contiguous buffers (`misc.edge_arrays`).
+
+Usage:
+    python example/ingestion_benchmark.py
+    python example/ingestion_benchmark.py --sizes 10000 100000 --unweighted
+
+10M edges graph takes a few GB of RAM in NetworkX alone.
+"""
+import argparse
+import time
+import tracemalloc
+
+import networkx as nx
+
+from pycombo.misc import deconstruct_graph, edge_arrays
+
+SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+AVG_DEGREE = 20
+
+
+def measure(func, graph, weight):
+    start = time.perf_counter()
+    func(graph, weight=weight)
+    elapsed = time.perf_counter() - start
+
+    # separate run, tracemalloc slows down allocations
+    tracemalloc.start()
+    func(graph, weight=weight)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="number of edges")
+    parser.add_argument("--unweighted", action="store_true", help="do not set `weight` on edges")
+    args = parser.parse_args()
+
+    print(f"{'edges':>10} {'path':>18} {'time, s':>10} {'peak, MB':>10}")
+    for m in args.sizes:
+        graph = nx.gnm_random_graph(2 * m // AVG_DEGREE, m, seed=42)
+        if not args.unweighted:
+            nx.set_edge_attributes(graph, 1.0, "weight")
+        for name, func in (("deconstruct_graph", deconstruct_graph), ("edge_arrays", edge_arrays)):
+            elapsed, peak = measure(func, graph, "weight")
+            print(f"{m:>10,} {name:>18} {elapsed:>10.3f} {peak / 2**20:>10.1f}")
+        del graph
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,43 @@ except ModuleNotFoundError:
 
 __version__ = importlib_metadata.version(__name__)
 
-from .pyCombo import execute
+from .pyCombo import (
+    ArrayPartition,
+    ComboGraph,
+    CommunityArrays,
+    CommunityGraph,
+    Diagnostics,
+    RunStats,
+    community_graph,
+    execute,
+    execute_arrays,
+    iter_execute,
+    modularity,
+)
+from .dynamic import DynamicCombo
+from .hierarchical import Dendrogram, execute_hierarchical
+from .intermediate import IntermediateResults, read_intermediate
+from .parallel import execute_many
+from .sweep import SweepResult, resolution_sweep
 
-__all__ = ["execute"]
+__all__ = [
+    "ArrayPartition",
+    "ComboGraph",
+    "CommunityArrays",
+    "CommunityGraph",
+    "Dendrogram",
+    "Diagnostics",
+    "DynamicCombo",
+    "IntermediateResults",
+    "RunStats",
+    "community_graph",
+    "execute",
+    "execute_arrays",
+    "execute_hierarchical",
+    "execute_many",
+    "iter_execute",
+    "modularity",
+    "read_intermediate",
+    "resolution_sweep",
+    "SweepResult",
+]
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import logging
+from typing import Hashable, Iterable, List, Optional, Tuple
+
+import pycombo._combo as comboCPP
+from pycombo.misc import is_graph
+
+__all__ = ["DynamicCombo"]
+
+logger = logging.getLogger(__name__)
+
+
+class DynamicCombo:
+    """
+    Partition of a graph kept up to date under batches of edge insertions, deletions and weight updates.
+
+    Edge weights, node strengths and per-community sums are kept by the C++ extension and updated
+    in O(1) per changed edge. After each batch, only communities containing endpoints of changed edges
+    are re-partitioned by Combo, starting from their current partition, while other communities stay fixed.
+    When total change of edge weights since the last full solve exceeds `drift_threshold` of the total weight,
+    the whole graph is re-partitioned from scratch instead.
+    Methods are not thread-safe, batches of the same object must not be applied concurrently.
+
+    Parameters
+    ----------
+    graph : NetworkX graph, default None
+        Initial graph, partitioned on construction. If None, the graph starts empty.
+    directed : bool, default None
+        Indicates if edges are directed. If None, taken from `graph` (False without it).
+    weight : str, default 'weight'
+        Graph edges property to use as weights of initial graph. If None, graph assumed to be unweighted.
+    modularity_resolution : float, default 1.0
+        Modularity resolution parameter.
+    drift_threshold : float, default 0.1
+        Fraction of the total edge weight that may change before the whole graph is re-partitioned.
+    **params
+        Parameters of Combo runs: max_communities, num_split_attempts, fixed_split_step,
+        verbose, random_seed, n_restarts and n_threads, see `execute`.
+
+    Attributes
+    ----------
+    nodes : list
+        Nodes in order of their indices in the C++ extension, new nodes are appended.
+    """
+
+    def __init__(
+        self,
+        graph=None,
+        directed: Optional[bool] = None,
+        weight: Optional[str] = "weight",
+        modularity_resolution: float = 1.0,
+        drift_threshold: float = 0.1,
+        **params,
+    ):
+        if graph is not None and not is_graph(graph):
+            raise ValueError(f"Wrong graph representation: `{graph}`")
+        if directed is None:
+            directed = graph.is_directed() if graph is not None else False
+        if params.get("max_communities") is not None and params["max_communities"] <= 0:
+            params["max_communities"] = None
+        if "n_threads" in params:
+            params["n_threads"] = max(params["n_threads"], 0)
+        self.drift_threshold = drift_threshold
+        self._params = params
+        self._graph = comboCPP.DynamicGraph(directed=directed, modularity_resolution=modularity_resolution)
+        self.nodes = []
+        self._index = {}
+        if graph is not None:
+            self._add_nodes(graph.nodes)
+            edges = graph.edges(data=weight, default=1.0) if weight is not None else graph.edges()
+            self.add_edges(edges, optimize=False)
+            self.resolve()
+
+    @property
+    def partition(self) -> dict:
+        """Nodes to community labels correspondence. Labels of communities not affected by updates do not change."""
+        return dict(zip(self.nodes, self._graph.communities))
+
+    @property
+    def modularity(self) -> float:
+        """Modularity of the current partition"""
+        return self._graph.modularity
+
+    @property
+    def drift(self) -> float:
+        """Total change of edge weights since the last full solve, relative to the total weight at that time"""
+        return self._graph.drift
+
+    def __len__(self) -> int:
+        return self._graph.size
+
+    def add_edges(self, edges: Iterable[Tuple], optimize: bool = True) -> None:
+        """
+        Add edges given as (u, v) or (u, v, weight) tuples. Weights of existing edges are increased,
+        new nodes are added, each in its own community.
+        If `optimize`, affected communities are re-partitioned, see `update`.
+        """
+        edges = list(edges)
+        self._add_nodes(node for edge in edges for node in edge[:2])
+        sources, destinations = self._indices(edges)
+        weights = [float(edge[2]) if len(edge) > 2 else 1.0 for edge in edges]
+        self._graph.add_edges(sources, destinations, weights)
+        if optimize:
+            self.update()
+
+    def remove_edges(self, edges: Iterable[Tuple], optimize: bool = True) -> None:
+        """
+        Remove existing edges given as (u, v) tuples, nodes are kept.
+        If `optimize`, affected communities are re-partitioned, see `update`.
+        """
+        sources, destinations = self._indices(list(edges))
+        self._graph.remove_edges(sources, destinations)
+        if optimize:
+            self.update()
+
+    def update_weights(self, edges: Iterable[Tuple], optimize: bool = True) -> None:
+        """
+        Set weights of existing edges given as (u, v, weight) tuples.
+        If `optimize`, affected communities are re-partitioned, see `update`.
+        """
+        edges = list(edges)
+        sources, destinations = self._indices(edges)
+        self._graph.update_weights(sources, destinations, [float(edge[2]) for edge in edges])
+        if optimize:
+            self.update()
+
+    def update(self) -> bool:
+        """
+        Re-partition communities affected by updates since the last call,
+        or the whole graph if drift exceeds `drift_threshold`.
+
+        Returns
+        -------
+        resolved : bool
+            True if the whole graph was re-partitioned.
+        """
+        if self.drift > self.drift_threshold:
+            self.resolve()
+            return True
+        n_nodes = self._graph.optimize(**self._params)
+        logger.debug(f"Re-partitioned {n_nodes} of {len(self)} nodes, modularity {self.modularity:.5f}")
+        return False
+
+    def resolve(self) -> None:
+        """Re-partition the whole graph from scratch and reset drift"""
+        self._graph.solve(**self._params)
+        logger.debug(f"Re-partitioned graph with {len(self)} nodes, modularity {self.modularity:.5f}")
+
+    def _add_nodes(self, nodes: Iterable[Hashable]) -> None:
+        for node in nodes:
+            if node not in self._index:
+                self._index[node] = len(self.nodes)
+                self.nodes.append(node)
+        self._graph.add_nodes(len(self.nodes))
+
+    def _indices(self, edges: List[Tuple]) -> Tuple[List[int], List[int]]:
+        try:
+            return [self._index[edge[0]] for edge in edges], [self._index[edge[1]] for edge in edges]
+        except KeyError as e:
+            raise ValueError(f"Node {e.args[0]!r} is not in the graph") from None
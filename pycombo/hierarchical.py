@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, NamedTuple, Optional, Sequence
+
+from pycombo.pyCombo import ComboGraph
+
+if TYPE_CHECKING:
+    import numpy
+
+__all__ = ["execute_hierarchical", "Dendrogram"]
+
+
+class Dendrogram(NamedTuple):
+    # per community of any level: parent community (-1 for the first level), level (0 for the first)
+    # and number of nodes, int64 arrays; communities are numbered level by level
+    parents: numpy.ndarray
+    levels: numpy.ndarray
+    sizes: numpy.ndarray
+    # per node (in order of node indices): community of the deepest level it belongs to, int64 array
+    labels: numpy.ndarray
+    # modularity of the first level partition
+    modularity: float
+    # nodes of NetworkX graph in order of their indices, or range of indices for other graphs
+    nodes: Sequence
+
+
+def execute_hierarchical(
+    graph,
+    levels: int = 2,
+    min_size: int = 2,
+    weight: Optional[str] = "weight",
+    modularity_resolution: float = 1,
+    treat_as_modularity: bool = False,
+    max_communities: Optional[int] = None,
+    num_split_attempts: int = 0,
+    fixed_split_step: int = 0,
+    start_separate: bool = False,
+    random_seed: Optional[int] = None,
+    n_threads: int = 1,
+    multilevel: bool = False,
+    coarsen_to: int = 20000,
+    time_limit_s: Optional[float] = None,
+    max_iterations: Optional[int] = None,
+) -> Dendrogram:
+    """
+    Partition graph into communities using Combo algorithm, then communities into subcommunities, and so on.
+
+    Each community is split by Combo run on its subgraph, normalized by weight of the subgraph as if
+    `execute` were run on it, which is copied from the sparse modularity matrix of the whole graph by the C++
+    extension. Communities of a level are split in parallel, each with its own seed derived from `random_seed`.
+    Directed graphs can only have one level, since the sparse matrix keeps them symmetrized. Requires numpy.
+
+    Parameters
+    ----------
+    graph : any graph supported by `execute`, or ComboGraph
+        Graph to partition. ComboGraph must not be split into components or reduced, dense ComboGraph
+        is converted to sparse form (and must not be read from a file); other graphs are prepared as sparse ComboGraph.
+    levels : int, default 2
+        Number of levels of communities, 1 being a single run of Combo.
+    min_size : int, default 2
+        Communities of fewer nodes are not split further.
+    weight, modularity_resolution, treat_as_modularity
+        Same as in `execute`, used if graph is not ComboGraph.
+    max_communities, num_split_attempts, fixed_split_step, start_separate, random_seed, multilevel, coarsen_to
+        Same as in `execute`, applied to each run, e.g. max_communities limits the number of children of a community.
+    n_threads : int, default 1
+        Number of threads splitting communities of a level concurrently. If <= 0, number of CPUs is used.
+    time_limit_s : float, default None
+        Time limit in seconds for all levels; communities left are not split.
+    max_iterations : int, default None
+        Maximum number of Combo iterations of each run.
+
+    Returns
+    -------
+    dendrogram : Dendrogram
+        Parents, levels and sizes of communities, the deepest community of each node,
+        modularity of the first level partition and nodes.
+    """
+    if levels <= 0:
+        raise ValueError("levels must be positive")
+    if multilevel and coarsen_to <= 0:
+        raise ValueError("coarsen_to must be positive")
+    if time_limit_s is not None and time_limit_s < 0:
+        raise ValueError("time_limit_s must be non-negative")
+    if max_iterations is not None and max_iterations < 0:
+        raise ValueError("max_iterations must be non-negative")
+    if max_communities is not None and max_communities <= 0:
+        max_communities = None
+    if not isinstance(graph, ComboGraph):
+        graph = ComboGraph(
+            graph,
+            weight=weight,
+            modularity_resolution=modularity_resolution,
+            treat_as_modularity=treat_as_modularity,
+            sparse=True,
+        )
+    dendrogram = graph._graph.run_hierarchical(
+        levels=levels,
+        min_size=max(min_size, 0),
+        max_communities=max_communities,
+        num_split_attempts=num_split_attempts,
+        fixed_split_step=fixed_split_step,
+        start_separate=start_separate,
+        random_seed=random_seed,
+        n_threads=max(n_threads, 0),
+        coarsen_to=coarsen_to if multilevel else None,
+        time_limit_s=time_limit_s,
+        max_iterations=max_iterations,
+    )
+    return Dendrogram(
+        dendrogram.parents,
+        dendrogram.levels,
+        dendrogram.sizes,
+        dendrogram.communities,
+        dendrogram.modularity,
+        graph.nodes if graph.nodes is not None else range(len(graph)),
+    )
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import os
+import struct
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    import numpy
+
+__all__ = ["read_intermediate", "IntermediateResults"]
+
+MAGIC = b"COMBOITR"
+# magic followed by uint64 number of nodes and uint64 stride
+HEADER = struct.Struct("=8sQQ")
+
+
+class IntermediateResults(NamedTuple):
+    # iterations of saved partitions, int32 array
+    iterations: numpy.ndarray
+    # labels of nodes in saved partitions, int32 array of shape (len(iterations), number of nodes)
+    partitions: numpy.ndarray
+    # stride the partitions were saved with (the last partition of a run is saved in any case)
+    stride: int
+
+
+def read_intermediate(path) -> IntermediateResults:
+    """
+    Read intermediate results saved with intermediate_results_format='binary', see `execute`.
+
+    The file is memory-mapped, not read into memory, and may be read while Combo is still writing it:
+    only records written completely are included. Requires numpy.
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        Path to the file given as intermediate_results_path.
+
+    Returns
+    -------
+    IntermediateResults
+        Iterations and partitions (rows of node labels in order of node indices) read from the file.
+    """
+    import numpy as np
+
+    with open(path, "rb") as file:
+        header = file.read(HEADER.size)
+    if len(header) < HEADER.size or header[: len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a file of binary intermediate results")
+    _, size, stride = HEADER.unpack(header)
+
+    record_bytes = 4 * (size + 1)
+    count = (os.path.getsize(path) - HEADER.size) // record_bytes
+    if count == 0:
+        records = np.empty((0, size + 1), dtype=np.int32)
+    else:
+        records = np.memmap(path, dtype=np.int32, mode="r", offset=HEADER.size, shape=(count, size + 1))
+    return IntermediateResults(records[:, 0], records[:, 1:], stride)
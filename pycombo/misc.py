@@ -1,3 +1,4 @@
+from array import array
 from typing import Optional, Tuple, Dict, List
 import logging
 
@@ -6,12 +7,43 @@ logger = logging.getLogger(__name__)
 nodes_ = Dict[int, int]
 edges_ = List[Tuple[int, int, float]]
 
+INT32_MAX = 2**31 - 1
+
 
 def is_graph(graph) -> bool:
     graph_names = {"Graph", "DiGraph", "MultiGraph", "MultiDiGraph"}
     return type(graph).__name__ in graph_names
 
 
+def is_sparse(graph) -> bool:
+    """Returns True if `graph` is a scipy sparse matrix or array"""
+    return type(graph).__module__.startswith("scipy.sparse")
+
+
+def csr_arrays(matrix) -> tuple:
+    """deconstructs square scipy sparse matrix into CSR buffers
+
+    Returns indptr, indices and data (float32 or float64) arrays
+    and a flag indicating if matrix is not symmetric (graph is directed).
+    No copy is made for CSR matrix with floating point data.
+    """
+    if len(matrix.shape) != 2 or matrix.shape[0] != matrix.shape[1]:
+        raise ValueError(f"Matrix must be square, got shape {matrix.shape}")
+    csr = matrix.tocsr()
+    directed = (csr != csr.T).nnz > 0
+    return csr.indptr, csr.indices, float_array(csr.data), directed
+
+
+def float_array(values):
+    """returns numpy array as C-contiguous float32 or float64 array
+
+    Copy (to float64) is made only if array has other dtype or memory layout.
+    """
+    if values.dtype.kind != "f" or values.dtype.itemsize not in (4, 8) or not values.flags.c_contiguous:
+        return values.astype("float64", order="C")
+    return values
+
+
 def is_weighted(G, edge: Optional[tuple] = None, weight: str = "weight") -> bool:
     """Returns True if `G` has weighted edges.
 
@@ -95,3 +127,39 @@ def deconstruct_graph(graph, weight: Optional[str] = None) -> Tuple[nodes_, edge
             (nodenum[edge[0]], nodenum[edge[1]], edge[2].get(weight, default_))
         )
     return nodes, edges
+
+
+def edge_arrays(graph, weight: Optional[str] = None) -> Tuple[list, array, array, array]:
+    """deconstructs networkx.Graph into contiguous edge buffers
+
+    Single pass over graph edges, producing list of nodes (index -> name)
+    and three `array.array` buffers: sources and destinations (int32,
+    or int64 for graphs with more than 2**31 - 1 nodes) and weights (float64).
+    Edges without `weight` property get weight 1, same as in `deconstruct_graph`.
+    """
+    nodes = list(graph)
+    index = {node: i for i, node in enumerate(nodes)}
+    typecode = "i" if len(nodes) <= INT32_MAX else "q"
+    sources, destinations, weights = array(typecode), array(typecode), array("d")
+
+    add_source, add_destination = sources.append, destinations.append
+    if weight is None:
+        for u, v in graph.edges():
+            add_source(index[u])
+            add_destination(index[v])
+        weights = array("d", [1.0]) * len(sources)
+        return nodes, sources, destinations, weights
+
+    add_weight = weights.append
+    missing = 0
+    for u, v, w in graph.edges(data=weight, default=None):
+        add_source(index[u])
+        add_destination(index[v])
+        if w is None:
+            missing += 1
+            w = 1
+        add_weight(w)
+
+    if missing:
+        logger.info(f"No property found: `{weight}`. Using as unweighted graph")
+    return nodes, sources, destinations, weights
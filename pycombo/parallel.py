@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from pycombo.misc import is_graph, is_sparse
+from pycombo.pyCombo import execute
+
+__all__ = ["execute_many"]
+
+# Graphs are grouped into chunks of about this many nodes + edges,
+# so that tiny graphs do not pay dispatch overhead one by one
+CHUNK_SIZE = 10_000
+
+BACKENDS = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+
+def execute_many(
+    graphs: Iterable,
+    n_jobs: Optional[int] = None,
+    backend: str = "thread",
+    ordered: bool = True,
+    chunksize: Optional[int] = None,
+    **params,
+) -> Iterator:
+    """
+    Partition many graphs into communities using Combo algorithm on a pool of workers.
+
+    Parameters
+    ----------
+    graphs : iterable
+        Graphs of any type supported by `execute`. Iterable is consumed lazily,
+        only a few chunks per worker are in flight at any time.
+    n_jobs : int, default None
+        Number of workers. If None or <= 0, number of CPUs is used.
+    backend : {'thread', 'process'}, default 'thread'
+        'thread' runs partitions in a thread pool, C++ extension releases the GIL
+        while partitioning, so threads run concurrently.
+        'process' runs partitions in a process pool, graphs and results are pickled.
+    ordered : bool, default True
+        If True, results are yielded in order of `graphs`.
+        If False, `(index, result)` pairs are yielded as soon as chunks are completed.
+    chunksize : int, default None
+        Number of graphs sent to a worker at once. If None, consecutive graphs
+        are grouped into chunks of about 10000 nodes and edges.
+    **params
+        Parameters passed to `execute` for each graph.
+
+    Returns
+    -------
+    results : iterator
+        Results of `execute` for each graph, or `(index, result)` pairs if ordered=False.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend `{backend}`, expected one of {list(BACKENDS)}")
+    if chunksize is not None and chunksize <= 0:
+        raise ValueError("chunksize must be positive")
+    if n_jobs is None or n_jobs <= 0:
+        n_jobs = os.cpu_count() or 1
+    return _execute_chunks(BACKENDS[backend], n_jobs, _chunks(graphs, chunksize), params, ordered)
+
+
+def _graph_size(graph) -> int:
+    """Returns number of nodes plus number of edges (non-zero entries) of `graph`, used to balance chunks"""
+    if is_graph(graph):
+        return graph.number_of_nodes() + graph.number_of_edges()
+    if is_sparse(graph):
+        return graph.shape[0] + graph.nnz
+    if type(graph) is str:
+        # size of graph in file is not known before reading, send it alone
+        return CHUNK_SIZE
+    return len(graph) * (len(graph) + 1)
+
+
+def _chunks(graphs: Iterable, chunksize: Optional[int]) -> Iterator[Tuple[int, List]]:
+    """Yields (index of the first graph, graphs) chunks"""
+    start, chunk, size = 0, [], 0
+    for graph in graphs:
+        chunk.append(graph)
+        size += 1 if chunksize else _graph_size(graph)
+        if size >= (chunksize or CHUNK_SIZE):
+            yield start, chunk
+            start, chunk, size = start + len(chunk), [], 0
+    if chunk:
+        yield start, chunk
+
+
+def _execute_chunk(graphs: List, params: dict) -> List:
+    return [execute(graph, **params) for graph in graphs]
+
+
+def _execute_chunks(executor_class, n_jobs: int, chunks: Iterator, params: dict, ordered: bool) -> Iterator:
+    max_pending = 2 * n_jobs
+    with executor_class(n_jobs) as executor:
+        pending = deque() if ordered else {}
+
+        def submit():
+            item = next(chunks, None)
+            if item is None:
+                return
+            start, chunk = item
+            future = executor.submit(_execute_chunk, chunk, params)
+            if ordered:
+                pending.append(future)
+            else:
+                pending[future] = start
+
+        try:
+            for _ in range(max_pending):
+                submit()
+            if ordered:
+                while pending:
+                    results = pending.popleft().result()
+                    submit()
+                    yield from results
+            else:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        start = pending.pop(future)
+                        submit()
+                        for i, result in enumerate(future.result()):
+                            yield start + i, result
+        finally:
+            # stop queued chunks if iteration is interrupted
+            for future in pending:
+                future.cancel()
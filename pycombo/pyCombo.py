@@ -2,20 +2,145 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import copy
 import logging
-from typing import Optional, Tuple, Union
+import queue
+import threading
+import time
+from array import array
+from typing import TYPE_CHECKING, Callable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
 
 import pycombo._combo as comboCPP
-from pycombo.misc import deconstruct_graph, is_graph
+from pycombo.misc import csr_arrays, edge_arrays, float_array, is_graph, is_sparse
+
+if TYPE_CHECKING:
+    import numpy
 
 __author__ = "Philipp Kats"
 __copyright__ = "Philipp Kats"
 __license__ = "fmit"
-__all__ = ["execute"]
+__all__ = [
+    "ArrayPartition",
+    "ComboGraph",
+    "CommunityArrays",
+    "CommunityGraph",
+    "Diagnostics",
+    "RunStats",
+    "community_graph",
+    "execute",
+    "execute_arrays",
+    "iter_execute",
+    "modularity",
+]
 
 logger = logging.getLogger(__name__)
 
 
+class RunStats(NamedTuple):
+    """
+    Timings and counters of a run, returned with return_stats=True.
+    Times of phases inside runs are summed over all restarts and components, i.e. over threads running them.
+    """
+
+    # building the graph: Python conversion of the input into arrays, conversion of arguments
+    # by pybind11, and construction of the modularity matrix in C++
+    deconstruction_seconds: float
+    conversion_seconds: float
+    construction_seconds: float
+    # wall time of the run, of all restarts and components
+    run_seconds: float
+    # searching for the best splits of communities, including Kernighan-Lin shifts
+    split_seconds: float
+    kernighan_lin_seconds: float
+    # deletion of communities emptied by splits
+    deletion_seconds: float
+    # multilevel mode: coarsening of the graph and refinement of projected partitions
+    coarsening_seconds: float
+    refinement_seconds: float
+    # random or fixed initial splits tried, splits applied (iterations of Combo),
+    # and node moves made by Kernighan-Lin shifts
+    split_attempts: int
+    splits_accepted: int
+    kernighan_lin_moves: int
+    # modularity matrix, and the largest memory used by a single run besides it
+    matrix_bytes: int
+    peak_run_bytes: int
+    # modularity before the first and after each iteration of the returned run (followed by modularity
+    # after refinement in multilevel mode), empty for graphs split into components
+    modularity_trajectory: List[float]
+
+
+class Diagnostics(NamedTuple):
+    """
+    Quality of a partition, returned with return_diagnostics=True. Community arrays are indexed by labels
+    of the returned partition, node arrays are in order of node indices (of `ComboGraph.nodes` for NetworkX graphs).
+    """
+
+    # number of nodes of each community (int64)
+    community_sizes: numpy.ndarray
+    # weight of edges within each community and strength of its nodes (average of out and in strengths)
+    # as fractions of the total; NaN for graphs read from files, whose strengths of nodes are not kept
+    internal_weights: numpy.ndarray
+    strengths: numpy.ndarray
+    # term of each community in modularity, they sum up to modularity of the partition
+    modularity_contributions: numpy.ndarray
+    # other community with the highest modularity gain of moving each node there (among communities
+    # of its neighbors for sparse graphs, all communities of its component for dense ones), -1 with NaN gain if there is none;
+    # gains are not positive for partitions Combo converged to
+    best_communities: numpy.ndarray
+    best_gains: numpy.ndarray
+
+
+class CommunityGraph(NamedTuple):
+    """
+    Graph of communities of a partition, returned by `community_graph`: node k of it is community labels[k],
+    communities being ordered by their first nodes. Weights form a symmetric matrix in CSR form,
+    e.g. ``scipy.sparse.csr_array((weights, indices, indptr))``. Requires numpy.
+    """
+
+    # CSR arrays (int64 indptr and indices) of summed weights of edges between communities (in both directions
+    # for directed graphs) and within them (on the diagonal), in units of edge weights of the graph
+    indptr: numpy.ndarray
+    indices: numpy.ndarray
+    weights: numpy.ndarray
+    # number of nodes of each community (int64)
+    sizes: numpy.ndarray
+    # label of each community in the partition
+    labels: Sequence
+
+
+class ArrayPartition(NamedTuple):
+    """
+    Partition returned with output="array".
+    """
+
+    # community labels (int32 numpy array) of nodes in order of `nodes`
+    labels: numpy.ndarray
+    # nodes of NetworkX graph in order of their indices, range of indices for other graph types
+    nodes: Sequence
+
+
+class CommunityArrays(NamedTuple):
+    """
+    Partition returned with output="communities": community c consists of nodes with
+    indices members[offsets[c]:offsets[c + 1]], in increasing order.
+    """
+
+    # int32 numpy array of number of communities + 1 offsets into members
+    offsets: numpy.ndarray
+    # int32 numpy array of node indices grouped by communities
+    members: numpy.ndarray
+    # nodes of NetworkX graph in order of their indices, range of indices for other graph types
+    nodes: Sequence
+
+
+# forms of partitions returned by `execute`, see its `output` parameter
+OUTPUTS = ("dict", "array", "communities")
+# partition in any of these forms, returned by `execute` alone or as the first element of a tuple
+# followed by modularity, restarts, converged flag, stats and diagnostics as requested
+Partition = Union[dict, ArrayPartition, CommunityArrays]
+
+
 def execute(
     graph,
     weight: Optional[str] = "weight",
@@ -27,17 +152,38 @@ def execute(
     treat_as_modularity: bool = False,
     verbose: int = 0,
     intermediate_results_path: Optional[str] = None,
+    intermediate_results_format: str = "text",
+    intermediate_results_stride: int = 1,
     return_modularity: bool = True,
     random_seed: Optional[int] = None,
-) -> Union[Tuple[dict, float], dict]:
+    sparse: Optional[bool] = None,
+    components: bool = False,
+    reduce: bool = False,
+    n_restarts: int = 1,
+    n_threads: int = 1,
+    return_restarts: bool = False,
+    initial_partition=None,
+    multilevel: bool = False,
+    coarsen_to: int = 20000,
+    time_limit_s: Optional[float] = None,
+    max_iterations: Optional[int] = None,
+    return_converged: bool = False,
+    callback: Optional[Callable[[int, int, float], Optional[bool]]] = None,
+    callback_interval_s: float = 0.1,
+    return_stats: bool = False,
+    output: str = "dict",
+    return_diagnostics: bool = False,
+) -> Union[Partition, Tuple]:
     """
     Partition graph into communities using Combo algorithm.
     All details are here: https://github.com/Casyfill/pyCOMBO
 
     Parameters
     ----------
-    graph : NetworkX graph or path to the file (str)
-        nx.Graph object, or string treated as path to Pajek .net file.
+    graph : NetworkX graph, path to the file (str), adjacency matrix or scipy sparse matrix
+        nx.Graph object, or string treated as path to Pajek .net file,
+        or adjacency matrix passed as numpy array, list or any scipy sparse matrix.
+        Sparse matrices are passed to C++ extension as CSR buffers without densifying.
     weight : str, default 'weight'
         Graph edges property to use as weights. If None, graph assumed to be unweighted.
         Ignored if graph is passed as string (path to the file).
@@ -65,86 +211,872 @@ def execute(
     intermediate_results_path : str, default None
         Path to the file where community assignments will be saved on each iteration.
         If None or empty, intermediate results will not be saved.
+    intermediate_results_format : str, default 'text'
+        Format of intermediate results: 'text' rewrites the file with labels of nodes (one per line)
+        on each iteration, 'binary' appends int32 labels of each iteration to a binary file through a buffer,
+        see `read_intermediate`.
+    intermediate_results_stride : int, default 1
+        Community assignments are saved every `intermediate_results_stride` iterations
+        (and after the last one).
     return_modularity : bool, default True
         Indicates if function should return achieved modularity score.
     random_seed : int, default None
         Random seed to use.
-        None indicates using some internal default value that is based on time
-        and is expected to be different for each call.
+        None indicates using a seed drawn from std::random_device,
+        which is expected to be different for each call, including concurrent ones.
+    sparse : bool, default None
+        Indicates if modularity matrix should be stored sparsely, as sparse adjacency part
+        plus null model computed from node strengths, using O(nodes + edges) memory
+        instead of O(nodes^2). If None, sparse storage is used for NetworkX graphs and scipy sparse matrices
+        when less than 5% of adjacency matrix entries are non-zero and treat_as_modularity is False,
+        numpy and list matrices and files are stored densely.
+        With treat_as_modularity=True missing edges are treated as zero modularity scores.
+    components : bool, default False
+        Indicates if graph should be split into weakly connected components, partitioned independently
+        and in parallel (on `n_threads` threads), since communities never span several components.
+        Each component is normalized by its own total weight, with resolution scaled by its share
+        of the total weight, so modularity of the combined partition is that of the whole graph.
+        Components of at most 5 nodes (e.g. isolated nodes and single edges) are partitioned exactly.
+        Can not be combined with max_communities and intermediate_results_path,
+        not supported for graphs read from files.
+    reduce : bool, default False
+        Indicates if pendant trees and chains should be folded into the nodes they hang off before
+        partitioning, as weighted nodes whose internal edges become loops, and expanded back after.
+        Every partition of the reduced graph has the same modularity as its expansion. A single pendant node
+        always belongs with its neighbor (for resolution <= 1); larger fringes are folded while their strength is
+        small enough for joining their neighbor's community to be better unless that community holds
+        a large share of the total weight, so large trees are not collapsed. See `ComboGraph.reduced_size`.
+        Can not be combined with treat_as_modularity and intermediate_results_path,
+        not supported for graphs read from files.
+    n_restarts : int, default 1
+        Number of independent runs of Combo with different random seeds derived from `random_seed`.
+        Modularity matrix is built once and shared by all runs, the partition with
+        the highest modularity is returned. The first run uses `random_seed` itself.
+    n_threads : int, default 1
+        Number of threads running restarts (or components) concurrently. If <= 0, number of CPUs is used.
+    return_restarts : bool, default False
+        Indicates if function should also return results of all restarts, e.g. for consensus analysis.
+    initial_partition : dict or sequence, default None
+        Partition Combo starts from and improves, e.g. the result of a previous run on a slightly
+        changed graph, instead of starting from a single community. Either a dict of nodes
+        (indices for matrices and files) to community labels of any type, or a sequence
+        (e.g. int32 / int64 array) of labels in the order of node indices.
+        Can not be combined with start_separate.
+    multilevel : bool, default False
+        Indicates if graphs larger than `coarsen_to` nodes should be partitioned in multilevel mode:
+        the graph is coarsened by Louvain-style local moves and aggregation of communities into nodes
+        to about `coarsen_to` nodes, Combo partitions the coarsest graph, and its partition is projected back
+        level by level, refined at each level by moves of single nodes between communities.
+        Keeps Combo quality on graphs with millions of nodes. Requires sparse storage, so `sparse` defaults
+        to True; not supported for intermediate_results_path.
+        With initial_partition, its communities are kept apart while coarsening.
+    coarsen_to : int, default 20000
+        Number of nodes of the coarsest graph in multilevel mode.
+    time_limit_s : float, default None
+        Time limit in seconds for the whole run, including all restarts and components. When it is reached,
+        Combo stops and returns the best partition found so far. The limit is checked between Kernighan-Lin
+        shifts, so runs may take longer by the time of a single shift. If None, Combo runs until convergence.
+    max_iterations : int, default None
+        Maximum number of Combo iterations (applied splits of communities) of each run. If None, not limited.
+    return_converged : bool, default False
+        Indicates if function should also return whether Combo converged, i.e. was not stopped
+        by time_limit_s, max_iterations or callback (in any restart or component of the returned partition).
+    callback : callable, default None
+        Function called as callback(iteration, n_communities, modularity) with progress of the run
+        (of one of restarts or components, modularity being that of the component), at most once per
+        `callback_interval_s` seconds. Returning False stops all runs, keeping the best partition found so far,
+        as time_limit_s does; exceptions raised by the callback stop runs too and are raised after them.
+        Runs are interruptible by KeyboardInterrupt (Ctrl-C) in any case.
+    callback_interval_s : float, default 0.1
+        Minimum interval between calls of `callback` in seconds.
+    return_stats : bool, default False
+        Indicates if function should also return `RunStats` with wall time of phases (building the graph,
+        splits, Kernighan-Lin shifts etc.), counters of splits and moves, memory and modularity trajectory.
+        Statistics are not collected otherwise.
+    output : str, default 'dict'
+        Form of returned partitions (including those of restarts): 'dict' of nodes to community labels,
+        'array' for `ArrayPartition` holding int32 numpy array of labels in order of nodes, or 'communities'
+        for `CommunityArrays` holding members of communities as CSR-style int32 numpy arrays.
+        Arrays are converted from labels of the run by the C++ extension, without Python objects per node. Require numpy.
+    return_diagnostics : bool, default False
+        Indicates if function should also return `Diagnostics` of the partition: size, internal weight, strength
+        and modularity contribution of each community, and the best other community of each node with modularity
+        gain of moving it there, computed by the C++ extension in one more pass over the modularity matrix
+        after the run. Requires numpy.
 
     Returns
     -------
-    partition : dict{int : int}
-        Nodes to community labels correspondence.
+    partition : dict{int : int}, ArrayPartition or CommunityArrays
+        Nodes to community labels correspondence, in the form given by `output`.
     modularity : float
         Achieved modularity value. Only returned if return_modularity=True
+    restarts : list of (partition, modularity)
+        Partitions and modularity values of all restarts in order of their seeds.
+        Only returned if return_restarts=True
+    converged : bool
+        False if Combo was stopped by limits before convergence. Only returned if return_converged=True
+    stats : RunStats
+        Timings and counters of the run. Only returned if return_stats=True
+    diagnostics : Diagnostics
+        Quality of communities and nodes of the partition. Only returned if return_diagnostics=True
     """
-    if max_communities is not None and max_communities <= 0:
-        max_communities = None
+    combo_graph = ComboGraph(
+        graph,
+        weight=weight,
+        modularity_resolution=modularity_resolution,
+        treat_as_modularity=treat_as_modularity,
+        sparse=True if multilevel and sparse is None else sparse,
+        components=components,
+        reduce=reduce,
+    )
+    return combo_graph.run(
+        max_communities=max_communities,
+        num_split_attempts=num_split_attempts,
+        fixed_split_step=fixed_split_step,
+        start_separate=start_separate,
+        verbose=verbose,
+        intermediate_results_path=intermediate_results_path,
+        intermediate_results_format=intermediate_results_format,
+        intermediate_results_stride=intermediate_results_stride,
+        return_modularity=return_modularity,
+        random_seed=random_seed,
+        n_restarts=n_restarts,
+        n_threads=n_threads,
+        return_restarts=return_restarts,
+        initial_partition=initial_partition,
+        multilevel=multilevel,
+        coarsen_to=coarsen_to,
+        time_limit_s=time_limit_s,
+        max_iterations=max_iterations,
+        return_converged=return_converged,
+        callback=callback,
+        callback_interval_s=callback_interval_s,
+        return_stats=return_stats,
+        output=output,
+        return_diagnostics=return_diagnostics,
+    )
 
-    if type(graph) is str:
-        community_labels, modularity = comboCPP.execute_from_file(
-            graph_path=graph,
-            max_communities=max_communities,
+
+def execute_arrays(
+    sources,
+    destinations,
+    weights=None,
+    size: Optional[int] = None,
+    directed: bool = False,
+    max_communities: Optional[int] = None,
+    modularity_resolution: int = 1,
+    num_split_attempts: int = 0,
+    fixed_split_step: int = 0,
+    start_separate: bool = False,
+    treat_as_modularity: bool = False,
+    verbose: int = 0,
+    intermediate_results_path: Optional[str] = None,
+    intermediate_results_format: str = "text",
+    intermediate_results_stride: int = 1,
+    return_modularity: bool = True,
+    random_seed: Optional[int] = None,
+    sparse: Optional[bool] = None,
+    components: bool = False,
+    reduce: bool = False,
+    n_restarts: int = 1,
+    n_threads: int = 1,
+    return_restarts: bool = False,
+    initial_partition=None,
+    multilevel: bool = False,
+    coarsen_to: int = 20000,
+    time_limit_s: Optional[float] = None,
+    max_iterations: Optional[int] = None,
+    return_converged: bool = False,
+    callback: Optional[Callable[[int, int, float], Optional[bool]]] = None,
+    callback_interval_s: float = 0.1,
+    return_stats: bool = False,
+    output: str = "dict",
+    return_diagnostics: bool = False,
+) -> Union[Partition, Tuple]:
+    """
+    Partition graph given as edge arrays into communities using Combo algorithm.
+    Arrays are read by the C++ extension in place, without conversion to Python objects.
+
+    Parameters
+    ----------
+    sources, destinations : C-contiguous int32 or int64 arrays
+        Nodes indices of edges ends, in range [0, size). Any object supporting
+        buffer protocol works, e.g. numpy.ndarray or array.array.
+    weights : C-contiguous float32 or float64 array, default None
+        Edges weights. If None, graph assumed to be unweighted.
+    size : int, default None
+        Number of nodes. If None, inferred as max node index + 1.
+    directed : bool, default False
+        Indicates if edges are directed.
+
+    Other parameters are the same as in `execute`.
+
+    Returns
+    -------
+    partition : dict{int : int}, ArrayPartition or CommunityArrays
+        Nodes indices to community labels correspondence, in the form given by `output`.
+    modularity : float
+        Achieved modularity value. Only returned if return_modularity=True
+    restarts : list of (partition, modularity)
+        Results of all restarts. Only returned if return_restarts=True
+    converged : bool
+        Only returned if return_converged=True
+    stats : RunStats
+        Only returned if return_stats=True
+    diagnostics : Diagnostics
+        Only returned if return_diagnostics=True
+    """
+    combo_graph = ComboGraph.from_arrays(
+        sources,
+        destinations,
+        weights=weights,
+        size=size,
+        directed=directed,
+        modularity_resolution=modularity_resolution,
+        treat_as_modularity=treat_as_modularity,
+        sparse=True if multilevel and sparse is None else sparse,
+        components=components,
+        reduce=reduce,
+    )
+    return combo_graph.run(
+        max_communities=max_communities,
+        num_split_attempts=num_split_attempts,
+        fixed_split_step=fixed_split_step,
+        start_separate=start_separate,
+        verbose=verbose,
+        intermediate_results_path=intermediate_results_path,
+        intermediate_results_format=intermediate_results_format,
+        intermediate_results_stride=intermediate_results_stride,
+        return_modularity=return_modularity,
+        random_seed=random_seed,
+        n_restarts=n_restarts,
+        n_threads=n_threads,
+        return_restarts=return_restarts,
+        initial_partition=initial_partition,
+        multilevel=multilevel,
+        coarsen_to=coarsen_to,
+        time_limit_s=time_limit_s,
+        max_iterations=max_iterations,
+        return_converged=return_converged,
+        callback=callback,
+        callback_interval_s=callback_interval_s,
+        return_stats=return_stats,
+        output=output,
+        return_diagnostics=return_diagnostics,
+    )
+
+
+def modularity(
+    graph,
+    partition,
+    weight: Optional[str] = "weight",
+    modularity_resolution: float = 1,
+    treat_as_modularity: bool = False,
+    directed: Optional[bool] = None,
+    sparse: Optional[bool] = None,
+    n_threads: int = 1,
+) -> Union[float, List[float]]:
+    """
+    Modularity of partition of graph, computed by the C++ extension exactly as Combo computes it.
+
+    Parameters
+    ----------
+    graph : any graph supported by `execute`
+        Graph the partition is scored on.
+    partition : dict, sequence, list of them or 2-D array
+        Community labels of nodes, given as in `initial_partition` of `execute`: a dict of nodes to labels
+        of any type, or a sequence (e.g. int32 / int64 array) of labels in order of node indices.
+        A list of such partitions or a 2-D array with a partition per row is scored in one call,
+        with the modularity matrix built once.
+    weight, modularity_resolution, treat_as_modularity, sparse
+        Same as in `execute`. With treat_as_modularity=True, the score is the sum of edge weights within communities.
+    directed : bool, default None
+        If False, edges of directed NetworkX graph are treated as undirected, both directions being added up.
+        If None, direction is taken from the graph; matrices are directed if they are not symmetric.
+    n_threads : int, default 1
+        Number of threads scoring partitions of a batch. If <= 0, number of CPUs is used.
+
+    Returns
+    -------
+    modularity : float or list of float
+        Modularity of the partition, or of each partition of the batch.
+    """
+    if directed is not None and is_graph(graph) and directed != graph.is_directed():
+        if directed:
+            raise ValueError("undirected graph can not be scored as directed")
+        nodes, sources, destinations, weights = edge_arrays(graph, weight=weight)
+        combo_graph = ComboGraph.from_arrays(
+            sources,
+            destinations,
+            weights,
+            size=len(nodes),
+            directed=False,
             modularity_resolution=modularity_resolution,
-            num_split_attempts=num_split_attempts,
-            fixed_split_step=fixed_split_step,
-            start_separate=start_separate,
             treat_as_modularity=treat_as_modularity,
-            verbose=verbose,
-            intermediate_results_path=intermediate_results_path,
-            random_seed=random_seed,
+            sparse=sparse,
+        )
+        combo_graph.nodes = nodes
+    else:
+        combo_graph = ComboGraph(
+            graph,
+            weight=weight,
+            modularity_resolution=modularity_resolution,
+            treat_as_modularity=treat_as_modularity,
+            sparse=sparse,
         )
+    return combo_graph.modularity(partition, n_threads=n_threads)
 
-        partition = {i: community for i, community in enumerate(community_labels)}
 
-    elif type(graph) is list or type(graph).__name__ == 'ndarray':
-        community_labels, modularity = comboCPP.execute_from_matrix(
-            matrix=graph,
-            max_communities=max_communities,
+def community_graph(
+    graph,
+    partition,
+    weight: Optional[str] = "weight",
+    treat_as_modularity: bool = False,
+) -> CommunityGraph:
+    """
+    Graph of communities of partition, with weights of edges summed up between and within communities.
+
+    It is aggregated by the C++ extension from the modularity matrix, as multilevel partitioning
+    aggregates its levels, without a pass over edges in Python. Requires numpy.
+
+    Parameters
+    ----------
+    graph : ComboGraph or any graph supported by `execute`
+        Graph the partition is of. ComboGraph must not be split into components or reduced, nor read from a file;
+        other graphs are prepared as sparse ComboGraph (numpy and list matrices as dense one).
+    partition : dict or sequence
+        Community labels of nodes, given as in `initial_partition` of `execute`, e.g. a partition returned by `execute`.
+    weight, treat_as_modularity
+        Same as in `execute`, used if graph is not ComboGraph.
+
+    Returns
+    -------
+    community_graph : CommunityGraph
+        Weights between communities as CSR arrays, sizes and labels of communities.
+    """
+    if not isinstance(graph, ComboGraph):
+        graph = ComboGraph(graph, weight=weight, treat_as_modularity=treat_as_modularity, sparse=True)
+    return graph.community_graph(partition)
+
+
+def iter_execute(
+    graph,
+    weight: Optional[str] = "weight",
+    modularity_resolution: int = 1,
+    treat_as_modularity: bool = False,
+    sparse: Optional[bool] = None,
+    queue_size: int = 1,
+    **params,
+) -> Iterator[Tuple[int, numpy.ndarray, float]]:
+    """
+    Partition graph into communities using Combo algorithm, yielding partitions of all iterations.
+
+    Combo runs on a background thread, see `ComboGraph.iter_run`. Requires numpy.
+
+    Parameters
+    ----------
+    graph : any graph supported by `execute`
+        Graph to partition.
+    weight, modularity_resolution, treat_as_modularity, sparse
+        Same as in `execute`.
+    queue_size : int, default 1
+        Number of partitions the run may get ahead of the consumer.
+    **params
+        Parameters of `execute` for a single run, such as random_seed, max_communities,
+        initial_partition, time_limit_s, max_iterations and callback.
+
+    Yields
+    ------
+    iteration : int
+        Number of iterations done, 0 for the initial partition.
+    labels : numpy.ndarray
+        Community labels (int64) of nodes in order of their indices (of `ComboGraph.nodes` for NetworkX graphs).
+    modularity : float
+        Modularity of the partition.
+    """
+    combo_graph = ComboGraph(
+        graph,
+        weight=weight,
+        modularity_resolution=modularity_resolution,
+        treat_as_modularity=treat_as_modularity,
+        sparse=sparse,
+    )
+    return combo_graph.iter_run(queue_size=queue_size, **params)
+
+
+class ComboGraph:
+    """
+    Graph prepared for Combo algorithm: modularity matrix (dense, or sparse plus
+    null model) is built once and partitioned by `run` any number of times,
+    e.g. with different seeds or settings. The graph is not modified by runs,
+    so `run` may be called from several threads at once.
+    Pickling uses a compact binary form of the matrix, not Python objects.
+
+    Parameters
+    ----------
+    graph : NetworkX graph, path to the file (str), adjacency matrix or scipy sparse matrix
+        Same as in `execute`.
+    weight : str, default 'weight'
+        Graph edges property to use as weights. If None, graph assumed to be unweighted.
+    modularity_resolution : float, default 1.0
+        Modularity resolution parameter.
+    treat_as_modularity : bool, default False
+        Indicates if edge weights should be treated as modularity scores, see `execute`.
+    sparse : bool, default None
+        Indicates if modularity matrix should be stored sparsely, see `execute`.
+    components : bool, default False
+        Indicates if graph should be split into connected components partitioned separately, see `execute`.
+    reduce : bool, default False
+        Indicates if pendant trees and chains should be folded before partitioning, see `execute`.
+
+    Attributes
+    ----------
+    nodes : list or None
+        Nodes of NetworkX graph in order of their indices, None for other graph types,
+        for which nodes are identified by indices.
+    """
+
+    def __init__(
+        self,
+        graph,
+        weight: Optional[str] = "weight",
+        modularity_resolution: int = 1,
+        treat_as_modularity: bool = False,
+        sparse: Optional[bool] = None,
+        components: bool = False,
+        reduce: bool = False,
+    ):
+        self.nodes = None
+        started = time.perf_counter()
+
+        if type(graph) is str:
+            if components or reduce:
+                raise ValueError("components and reduce are not supported for graphs read from files")
+            self._build(
+                comboCPP.Graph.from_file,
+                started,
+                graph_path=graph,
+                modularity_resolution=modularity_resolution,
+                treat_as_modularity=treat_as_modularity,
+                sparse=sparse,
+            )
+
+        elif type(graph) is list or type(graph).__name__ == 'ndarray':
+            self._build(
+                comboCPP.Graph.from_matrix,
+                started,
+                matrix=graph if type(graph) is list else float_array(graph),
+                modularity_resolution=modularity_resolution,
+                treat_as_modularity=treat_as_modularity,
+                sparse=sparse,
+                components=components,
+                reduce=reduce,
+            )
+
+        elif is_sparse(graph):
+            if graph.shape[0] == 0:
+                raise ValueError("Graph is empty")
+
+            indptr, indices, data, directed = csr_arrays(graph)
+
+            self._build(
+                comboCPP.Graph.from_csr,
+                started,
+                indptr=indptr,
+                indices=indices,
+                data=data,
+                directed=directed,
+                modularity_resolution=modularity_resolution,
+                treat_as_modularity=treat_as_modularity,
+                sparse=sparse,
+                components=components,
+                reduce=reduce,
+            )
+
+        elif is_graph(graph):
+            if len(graph) == 0:
+                raise ValueError("Graph is empty")
+
+            self.nodes, sources, destinations, weights = edge_arrays(graph, weight=weight)
+
+            self._build(
+                comboCPP.Graph.from_edges,
+                started,
+                sources=sources,
+                destinations=destinations,
+                weights=weights,
+                size=len(self.nodes),
+                directed=graph.is_directed(),
+                modularity_resolution=modularity_resolution,
+                treat_as_modularity=treat_as_modularity,
+                sparse=sparse,
+                components=components,
+                reduce=reduce,
+            )
+
+        else:
+            raise ValueError(f"Wrong graph representation: `{graph}`")
+
+    @classmethod
+    def from_arrays(
+        cls,
+        sources,
+        destinations,
+        weights=None,
+        size: Optional[int] = None,
+        directed: bool = False,
+        modularity_resolution: int = 1,
+        treat_as_modularity: bool = False,
+        sparse: Optional[bool] = None,
+        components: bool = False,
+        reduce: bool = False,
+    ) -> "ComboGraph":
+        """
+        Prepare graph given as edge arrays, see `execute_arrays` for parameters.
+        """
+        started = time.perf_counter()
+        if len(sources) == 0 and not size:
+            raise ValueError("Graph is empty")
+        if weights is None:
+            weights = array("d", [1.0]) * len(sources)
+        if size is None:
+            size = 1 + int(max(_max(sources), _max(destinations)))
+
+        combo_graph = cls.__new__(cls)
+        combo_graph.nodes = None
+        combo_graph._build(
+            comboCPP.Graph.from_edges,
+            started,
+            sources=sources,
+            destinations=destinations,
+            weights=weights,
+            size=size,
+            directed=directed,
             modularity_resolution=modularity_resolution,
-            num_split_attempts=num_split_attempts,
-            fixed_split_step=fixed_split_step,
-            start_separate=start_separate,
             treat_as_modularity=treat_as_modularity,
-            verbose=verbose,
-            intermediate_results_path=intermediate_results_path,
-            random_seed=random_seed,
+            sparse=sparse,
+            components=components,
+            reduce=reduce,
         )
+        return combo_graph
 
-        partition = {i: community for i, community in enumerate(community_labels)}
+    def _build(self, build, started: float, **params):
+        """Builds C++ graph by build(**params), keeping times of its phases since started for RunStats"""
+        deconstructed = time.perf_counter()
+        self._graph = build(**params)
+        conversion = time.perf_counter() - deconstructed - self._graph.build_seconds
+        self._build_seconds = (deconstructed - started, max(conversion, 0.0), self._graph.build_seconds)
 
-    elif is_graph(graph):
-        if len(graph) == 0:
-            raise ValueError("Graph is empty")
+    def __len__(self) -> int:
+        return self._graph.size
+
+    def __repr__(self) -> str:
+        storage = "sparse" if self.sparse else "dense"
+        reduced = f" ({self.reduced_size} after reduction)" if self.reduced_size != len(self) else ""
+        return f"ComboGraph({len(self)} nodes{reduced}, {storage}, {self.memory_bytes} bytes)"
+
+    @property
+    def sparse(self) -> bool:
+        """Indicates if modularity matrix is stored sparsely"""
+        return self._graph.sparse
 
-        nodes, edges = deconstruct_graph(graph, weight=weight)
+    @property
+    def reduced_size(self) -> int:
+        """Number of nodes partitioned by Combo, smaller than number of nodes if pendant trees and chains are folded"""
+        return self._graph.reduced_size
 
-        community_labels, modularity = comboCPP.execute(
-            size=graph.number_of_nodes(),
-            edges=edges,
-            directed=graph.is_directed(),
+    @property
+    def n_components(self) -> int:
+        """Number of connected components partitioned separately, 0 if the graph is not split"""
+        return self._graph.number_of_components
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes allocated for modularity matrix by the C++ extension"""
+        return self._graph.memory_bytes
+
+    def run(
+        self,
+        max_communities: Optional[int] = None,
+        num_split_attempts: int = 0,
+        fixed_split_step: int = 0,
+        start_separate: bool = False,
+        verbose: int = 0,
+        intermediate_results_path: Optional[str] = None,
+        intermediate_results_format: str = "text",
+        intermediate_results_stride: int = 1,
+        return_modularity: bool = True,
+        random_seed: Optional[int] = None,
+        n_restarts: int = 1,
+        n_threads: int = 1,
+        return_restarts: bool = False,
+        initial_partition=None,
+        multilevel: bool = False,
+        coarsen_to: int = 20000,
+        time_limit_s: Optional[float] = None,
+        max_iterations: Optional[int] = None,
+        return_converged: bool = False,
+        callback: Optional[Callable[[int, int, float], Optional[bool]]] = None,
+        callback_interval_s: float = 0.1,
+        return_stats: bool = False,
+        output: str = "dict",
+        return_diagnostics: bool = False,
+    ) -> Union[Partition, Tuple]:
+        """
+        Partition graph into communities using Combo algorithm.
+        Parameters and returned values are the same as in `execute`.
+        """
+        if output not in OUTPUTS:
+            raise ValueError(f"output must be one of {', '.join(OUTPUTS)}, got {output!r}")
+        result = self._run(
             max_communities=max_communities,
-            modularity_resolution=modularity_resolution,
             num_split_attempts=num_split_attempts,
             fixed_split_step=fixed_split_step,
             start_separate=start_separate,
-            treat_as_modularity=treat_as_modularity,
             verbose=verbose,
             intermediate_results_path=intermediate_results_path,
+            intermediate_results_format=intermediate_results_format,
+            intermediate_results_stride=intermediate_results_stride,
             random_seed=random_seed,
+            n_restarts=n_restarts,
+            n_threads=n_threads,
+            return_restarts=return_restarts,
+            initial_partition=initial_partition,
+            multilevel=multilevel,
+            coarsen_to=coarsen_to,
+            time_limit_s=time_limit_s,
+            max_iterations=max_iterations,
+            callback=callback,
+            callback_interval_s=callback_interval_s,
+            collect_stats=return_stats,
         )
 
-        partition = {
-            nodes[i]: community for i, community in enumerate(community_labels)
-        }
+        logger.debug(f"Modularity for {self!r}: {result.modularity:.5f}")
+
+        stats = self._run_stats(result.stats) if return_stats else None
+        diagnostics = self._diagnostics(result) if return_diagnostics else None
+        return _output(result, self.nodes, return_modularity, return_restarts, return_converged, stats, diagnostics, output)
+
+    def iter_run(self, queue_size: int = 1, **params) -> Iterator[Tuple[int, numpy.ndarray, float]]:
+        """
+        Partition graph into communities using Combo algorithm, yielding partitions of all iterations,
+        see `iter_execute`. Requires numpy.
+
+        Combo runs on a background thread and waits while `queue_size` partitions are not consumed yet,
+        so memory does not grow with the number of iterations; labels are copied only when there is room
+        for them. Closing the generator (e.g. leaving a for loop early) stops the run.
+        Restarts, components, reduced graphs and multilevel mode are not supported.
+        """
+        import numpy as np
+
+        if queue_size <= 0:
+            raise ValueError("queue_size must be positive")
+        callback = params.pop("callback", None)
+        slots = threading.Semaphore(queue_size)
+        items = queue.Queue()
+        closed = threading.Event()
+
+        def on_partition(iteration, labels, modularity):
+            slots.acquire()
+            if closed.is_set():
+                return False
+            items.put((iteration, np.array(labels, dtype=np.int64), modularity))
+
+        def progress(*args):
+            if closed.is_set():
+                return False
+            return None if callback is None else callback(*args)
+
+        def run():
+            try:
+                self._run(partition_callback=on_partition, callback=progress, **params)
+            except BaseException as e:
+                items.put(e)
+            else:
+                items.put(None)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = items.get()
+                if item is None:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                slots.release()
+                yield item
+        finally:
+            closed.set()
+            slots.release()
+            thread.join()
+
+    def modularity(self, partition, n_threads: int = 1) -> Union[float, List[float]]:
+        """
+        Modularity of partition of the graph, or of each of partitions given as a list or 2-D array,
+        see `pycombo.modularity`. ValueError is raised for graphs split into components or reduced.
+        """
+        if _is_batch(partition):
+            partitions = [self._communities(p, "partition") for p in partition]
+            return self._graph.modularity(partitions, n_threads=max(n_threads, 0))
+        return self._graph.modularity([self._communities(partition, "partition")])[0]
+
+    def community_graph(self, partition) -> CommunityGraph:
+        """
+        Graph of communities of partition, see `pycombo.community_graph`. ValueError is raised
+        for graphs split into components or reduced, and for graphs read from files.
+        """
+        graph = self._graph.community_graph(self._communities(partition, "partition"))
+        first_nodes = graph.first_nodes.tolist()
+        if isinstance(partition, dict):
+            keys = self.nodes if self.nodes is not None else range(len(self))
+            labels = [partition[keys[i]] for i in first_nodes]
+        else:
+            labels = [partition[i] for i in first_nodes]
+        return CommunityGraph(graph.indptr, graph.indices, graph.weights, graph.sizes, labels)
+
+    def with_resolution(self, modularity_resolution: float) -> "ComboGraph":
+        """
+        Same graph with another modularity resolution. Sparse graphs share the matrix
+        with this one, since resolution only scales the null model term;
+        dense modularity matrix can not be changed, ValueError is raised for dense graphs.
+        """
+        combo_graph = copy.copy(self)
+        combo_graph._graph = self._graph.with_resolution(modularity_resolution)
+        return combo_graph
+
+    def _run(
+        self,
+        max_communities: Optional[int] = None,
+        n_threads: int = 1,
+        initial_partition=None,
+        multilevel: bool = False,
+        coarsen_to: int = 20000,
+        time_limit_s: Optional[float] = None,
+        max_iterations: Optional[int] = None,
+        **params,
+    ):
+        """Runs C++ extension and returns its result (communities, modularity and restarts)"""
+        if max_communities is not None and max_communities <= 0:
+            max_communities = None
+        if multilevel and coarsen_to <= 0:
+            raise ValueError("coarsen_to must be positive")
+        if time_limit_s is not None and time_limit_s < 0:
+            raise ValueError("time_limit_s must be non-negative")
+        if max_iterations is not None and max_iterations < 0:
+            raise ValueError("max_iterations must be non-negative")
+        if params.get("callback_interval_s", 0) < 0:
+            raise ValueError("callback_interval_s must be non-negative")
+        if params.get("intermediate_results_stride", 1) <= 0:
+            raise ValueError("intermediate_results_stride must be positive")
+        return self._graph.run(
+            max_communities=max_communities,
+            n_threads=max(n_threads, 0),
+            initial_communities=self._communities(initial_partition, "initial_partition"),
+            coarsen_to=coarsen_to if multilevel else None,
+            time_limit_s=time_limit_s,
+            max_iterations=max_iterations,
+            **params,
+        )
+
+    def _run_stats(self, stats) -> RunStats:
+        """RunStats of the graph and the run with stats collected by the C++ extension"""
+        return RunStats(
+            *self._build_seconds,
+            run_seconds=stats.run_seconds,
+            split_seconds=stats.split_seconds,
+            kernighan_lin_seconds=stats.kernighan_lin_seconds,
+            deletion_seconds=stats.deletion_seconds,
+            coarsening_seconds=stats.coarsening_seconds,
+            refinement_seconds=stats.refinement_seconds,
+            split_attempts=stats.split_attempts,
+            splits_accepted=stats.splits_accepted,
+            kernighan_lin_moves=stats.kernighan_lin_moves,
+            matrix_bytes=self.memory_bytes,
+            peak_run_bytes=stats.peak_run_bytes,
+            modularity_trajectory=stats.modularity_trajectory,
+        )
+
+    def _diagnostics(self, result) -> Diagnostics:
+        """Diagnostics of the partition of the C++ extension result"""
+        diagnostics = self._graph.diagnostics(result)
+        return Diagnostics(
+            community_sizes=diagnostics.community_sizes,
+            internal_weights=diagnostics.internal_weights,
+            strengths=diagnostics.strengths,
+            modularity_contributions=diagnostics.modularity_contributions,
+            best_communities=diagnostics.best_communities,
+            best_gains=diagnostics.best_gains,
+        )
+
+    def _communities(self, partition, name: str):
+        """Community labels of nodes in order of indices, int arrays are passed to C++ extension as is"""
+        if partition is None:
+            return None
+        if isinstance(partition, dict):
+            keys = self.nodes if self.nodes is not None else range(len(self))
+            try:
+                labels = [partition[key] for key in keys]
+            except KeyError as e:
+                raise ValueError(f"{name} has no community for node {e.args[0]!r}") from None
+        elif type(partition).__name__ == "ndarray" or isinstance(partition, array):
+            return partition
+        else:
+            labels = partition
+        ids = {}
+        return [ids.setdefault(label, len(ids)) for label in labels]
+
+
+def _is_batch(partition) -> bool:
+    """Indicates if partition is a 2-D array or a list of partitions rather than a single one"""
+    if type(partition).__name__ == "ndarray":
+        return partition.ndim == 2
+    if not isinstance(partition, (list, tuple)) or len(partition) == 0:
+        return False
+    first = partition[0]
+    return isinstance(first, (dict, list, tuple, array)) or type(first).__name__ == "ndarray"
+
+
+def _partition(communities, nodes=None) -> dict:
+    """Nodes (or their indices if nodes is None) to community labels correspondence"""
+    if nodes is None:
+        return dict(enumerate(communities))
+    return dict(zip(nodes, communities))
+
+
+def _partition_form(result, nodes, form: str):
+    """Partition of C++ extension result in the form given by `output` of `execute`"""
+    if form == "dict":
+        return _partition(result.communities, nodes)
+    index = nodes if nodes is not None else range(len(result.communities))
+    if form == "array":
+        return ArrayPartition(result.labels, index)
+    return CommunityArrays(*result.community_arrays(), index)
 
-    else:
-        raise ValueError(f"Wrong graph representation: `{graph}`")
 
-    logger.debug(f"Modularity for {graph.__repr__()}: {modularity:.5f}")
+def _output(
+    result,
+    nodes,
+    return_modularity: bool,
+    return_restarts: bool,
+    return_converged: bool = False,
+    stats: Optional[RunStats] = None,
+    diagnostics: Optional[Diagnostics] = None,
+    form: str = "dict",
+):
+    partition = _partition_form(result, nodes, form)
+    output = (partition, result.modularity) if return_modularity else (partition,)
+    if return_restarts:
+        output += ([(_partition_form(r, nodes, form), r.modularity) for r in result.restarts],)
+    if return_converged:
+        output += (result.converged,)
+    if stats is not None:
+        output += (stats,)
+    if diagnostics is not None:
+        output += (diagnostics,)
+    return output if len(output) > 1 else partition
 
-    if return_modularity:
-        return partition, modularity
 
-    return partition
+def _max(values):
+    # numpy arrays are much faster with their own method
+    return values.max() if hasattr(values, "max") else max(values)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, NamedTuple, Optional
+
+from pycombo.pyCombo import ComboGraph, _partition
+
+__all__ = ["resolution_sweep", "SweepResult"]
+
+
+class SweepResult(NamedTuple):
+    resolution: float
+    modularity: float
+    n_communities: int
+    partition: dict
+
+
+def resolution_sweep(
+    graph,
+    resolutions: Iterable[float],
+    warm_start: bool = True,
+    n_jobs: Optional[int] = None,
+    weight: Optional[str] = "weight",
+    **params,
+) -> List[SweepResult]:
+    """
+    Partition graph into communities using Combo algorithm for each of modularity resolutions.
+
+    The graph is prepared once as sparse adjacency part plus null model, and each resolution
+    only rescales the null model term, so the matrix is not rebuilt. Dense inputs (matrices and files)
+    are rebuilt for each resolution, as their modularity matrix does not keep the null model separately.
+
+    Parameters
+    ----------
+    graph : any graph supported by `execute`, or sparse ComboGraph
+        Graph to partition.
+    resolutions : iterable of float
+        Modularity resolution values.
+    warm_start : bool, default True
+        If True, resolutions are run in increasing order, each one starting from the partition
+        found for the previous one, which is usually close and converges faster.
+    n_jobs : int, default None
+        Number of threads. If None or <= 0, number of CPUs is used.
+        With warm_start=True, sorted resolutions are split into n_jobs contiguous ranges,
+        warm-started within each range.
+    weight : str, default 'weight'
+        Graph edges property to use as weights, see `execute`.
+    **params
+        Other parameters of `ComboGraph.run`, e.g. random_seed or max_communities.
+
+    Returns
+    -------
+    results : list of SweepResult
+        (resolution, modularity, n_communities, partition) named tuples in order of `resolutions`,
+        e.g. `pandas.DataFrame(results)` makes a table of them.
+    """
+    resolutions = list(resolutions)
+    if not resolutions:
+        return []
+    if n_jobs is None or n_jobs <= 0:
+        n_jobs = os.cpu_count() or 1
+    if isinstance(graph, ComboGraph):
+        combo_graph = graph
+    elif type(graph) in (str, list) or type(graph).__name__ == "ndarray":
+        # dense modularity matrix is built for each resolution
+        combo_graph = None
+    else:
+        combo_graph = ComboGraph(graph, weight=weight, sparse=True)
+    nodes = combo_graph.nodes if combo_graph is not None else None
+
+    def graph_with_resolution(resolution: float) -> ComboGraph:
+        if combo_graph is None:
+            return ComboGraph(graph, modularity_resolution=resolution)
+        return combo_graph.with_resolution(resolution)
+
+    def run(indices: List[int]) -> None:
+        communities = None
+        for i in indices:
+            result = graph_with_resolution(resolutions[i])._run(initial_partition=communities, **params)
+            if warm_start:
+                communities = result.communities
+            results[i] = SweepResult(
+                resolutions[i],
+                result.modularity,
+                len(set(result.communities)),
+                _partition(result.communities, nodes),
+            )
+
+    results = [None] * len(resolutions)
+    order = sorted(range(len(resolutions)), key=resolutions.__getitem__)
+    n_jobs = min(n_jobs, len(order))
+    if warm_start:
+        bounds = [len(order) * j // n_jobs for j in range(n_jobs + 1)]
+        tasks = [order[start:end] for start, end in zip(bounds, bounds[1:])]
+    else:
+        tasks = [[i] for i in order]
+    if n_jobs <= 1:
+        for task in tasks:
+            run(task)
+    else:
+        with ThreadPoolExecutor(n_jobs) as executor:
+            # raise the first error, if any
+            list(executor.map(run, tasks))
+    return results
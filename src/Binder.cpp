@@ -1,36 +1,631 @@
+#include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 
+#include <algorithm>
+#include <atomic>
+#include <chrono>
+#include <cstdint>
+#include <exception>
+#include <iostream>
+#include <limits>
+#include <thread>
+#include <utility>
+#include <variant>
+
 #include "Combo/Graph.h"
-#include "Combo/Combo.h"
+#include "ComboRun.h"
+#include "DenseGraph.h"
+#include "DynamicGraph.h"
+#include "GraphFile.h"
+#include "ModularityMatrix.h"
+#include "PreparedGraph.h"
+#include "Reduction.h"
+#include "SparseGraph.h"
 
 namespace py = pybind11;
 
 
-std::tuple<std::vector<size_t>, double> execute_from_file(
+// Calls func with released GIL, so that other Python threads run meanwhile; func must not use Python API
+template<typename Func>
+auto WithoutGIL(Func&& func)
+{
+	py::gil_scoped_release release;
+	return func();
+}
+
+// Progress of runs, called from threads running them with released GIL: at most once per interval (shared by
+// all threads) the GIL is acquired to call Python callback. Python handles signals (e.g. KeyboardInterrupt) in the
+// main thread only, so they are checked by the thread that started the runs, on its own interval.
+// Runs stop if the callback returns False or raises, the exception is raised by RaiseError after the runs.
+class PythonProgress
+{
+public:
+	PythonProgress(std::optional<py::function> callback = std::nullopt, double interval_s = SIGNALS_INTERVAL_S) :
+		m_callback(std::move(callback)),
+		m_callback_interval(ToDuration(interval_s)),
+		m_thread(std::this_thread::get_id()),
+		m_next_check(std::chrono::steady_clock::now()),
+		m_next_callback(m_next_check.time_since_epoch().count())
+	{
+	}
+
+	// callback for ComboSettings::progress, refers to this object
+	ProgressCallback Callback()
+	{
+		return [this](size_t iteration, size_t number_of_communities, double modularity) {
+			return (*this)(iteration, number_of_communities, modularity);
+		};
+	}
+
+	bool operator()(size_t iteration, size_t number_of_communities, double modularity)
+	{
+		if (m_stopped)
+			return false;
+		std::chrono::steady_clock::time_point now = std::chrono::steady_clock::now();
+		bool check_signals = std::this_thread::get_id() == m_thread && now >= m_next_check;
+		if (check_signals)
+			m_next_check = now + ToDuration(SIGNALS_INTERVAL_S);
+		bool call = m_callback.has_value() && Claim(m_next_callback, now, m_callback_interval);
+		if (!check_signals && !call)
+			return true;
+		py::gil_scoped_acquire acquire;
+		try {
+			if (check_signals && PyErr_CheckSignals() != 0)
+				throw py::error_already_set();
+			if (call) {
+				py::object result = m_callback.value()(iteration, number_of_communities, modularity);
+				if (!result.is_none() && !result.cast<bool>())
+					m_stopped = true;
+			}
+		} catch (...) {
+			if (!m_error)
+				m_error = std::current_exception();
+			m_stopped = true;
+		}
+		return !m_stopped;
+	}
+
+	// Raises exception of callback or signal handler, if any; requires GIL
+	void RaiseError() const
+	{
+		if (m_error)
+			std::rethrow_exception(m_error);
+	}
+
+private:
+	// signals are checked this often even if callback is called less often
+	static constexpr double SIGNALS_INTERVAL_S = 0.1;
+
+	std::optional<py::function> m_callback;
+	std::chrono::steady_clock::duration m_callback_interval;
+	// thread that started the runs, and its time of the next check of signals
+	std::thread::id m_thread;
+	std::chrono::steady_clock::time_point m_next_check;
+	// ticks of the next call of callback, claimed by one of the threads
+	std::atomic<int64_t> m_next_callback;
+	std::atomic<bool> m_stopped = false;
+	// accessed with GIL held only
+	std::exception_ptr m_error;
+
+	static std::chrono::steady_clock::duration ToDuration(double seconds)
+	{
+		return std::chrono::duration_cast<std::chrono::steady_clock::duration>(std::chrono::duration<double>(seconds));
+	}
+
+	// True for the single thread that moves next from a time before now to now + interval
+	static bool Claim(std::atomic<int64_t>& next, std::chrono::steady_clock::time_point now,
+		std::chrono::steady_clock::duration interval)
+	{
+		int64_t ticks = now.time_since_epoch().count();
+		int64_t expected = next;
+		return ticks >= expected && next.compare_exchange_strong(expected, ticks + interval.count());
+	}
+};
+
+// Builder of graph measuring its time (after conversion of arguments by pybind11), see PreparedGraph::BuildSeconds
+template<typename... Args>
+auto Timed(PreparedGraph (*build)(Args...))
+{
+	return [build](Args... args) {
+		std::chrono::steady_clock::time_point start = std::chrono::steady_clock::now();
+		PreparedGraph graph = build(std::forward<Args>(args)...);
+		graph.SetBuildSeconds(std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count());
+		return graph;
+	};
+}
+
+ComboSettings MakeSettings(
+	std::optional<size_t> max_communities,
+	int num_split_attempts,
+	int fixed_split_step,
+	bool start_separate,
+	int verbose,
+	std::optional<std::string> intermediate_results_path,
+	std::optional<int> random_seed,
+	size_t n_restarts,
+	size_t n_threads,
+	bool return_restarts,
+	std::optional<std::vector<size_t>> initial_communities,
+	std::optional<size_t> coarsen_to,
+	std::optional<double> time_limit_s,
+	std::optional<size_t> max_iterations)
+{
+	ComboSettings settings;
+	settings.max_communities = max_communities;
+	settings.num_split_attempts = num_split_attempts;
+	settings.fixed_split_step = fixed_split_step;
+	settings.start_separate = start_separate;
+	settings.verbose = verbose;
+	settings.intermediate_results_path = intermediate_results_path;
+	if (random_seed.has_value())
+		settings.random_seed = uint_fast32_t(random_seed.value());
+	settings.n_restarts = n_restarts;
+	settings.n_threads = n_threads;
+	settings.return_restarts = return_restarts;
+	settings.initial_communities = std::move(initial_communities);
+	settings.coarsen_to = coarsen_to;
+	if (time_limit_s.has_value())
+		settings.deadline = std::chrono::steady_clock::now() + std::chrono::duration_cast<std::chrono::steady_clock::duration>(
+			std::chrono::duration<double>(time_limit_s.value()));
+	settings.max_iterations = max_iterations;
+	return settings;
+}
+
+py::buffer_info VectorBufferInfo(const py::buffer& buffer, const char* name)
+{
+	py::buffer_info info = buffer.request();
+	if (info.ndim != 1)
+		throw py::value_error(std::string(name) + " must be one-dimensional");
+	if (info.shape[0] > 1 && info.strides[0] != info.itemsize)
+		throw py::value_error(std::string(name) + " must be C-contiguous");
+	return info;
+}
+
+// Calls func(first, second, values) with pointers to data of buffers of their actual types:
+// int32 or int64 for first and second (of the same type), float64 or float32 for values
+template<typename Index, typename Func>
+auto VisitBuffers(const py::buffer_info& first, const py::buffer_info& second, const py::buffer_info& values,
+	const std::string& values_name, Func&& func)
+{
+	const Index* first_ptr = static_cast<const Index*>(first.ptr);
+	const Index* second_ptr = static_cast<const Index*>(second.ptr);
+	if (values.item_type_is_equivalent_to<double>())
+		return func(first_ptr, second_ptr, static_cast<const double*>(values.ptr));
+	if (values.item_type_is_equivalent_to<float>())
+		return func(first_ptr, second_ptr, static_cast<const float*>(values.ptr));
+	throw py::type_error(values_name + " must be float32 or float64, got format " + values.format);
+}
+
+template<typename Func>
+auto VisitBuffers(const py::buffer_info& first, const py::buffer_info& second, const py::buffer_info& values,
+	const std::string& indices_name, const std::string& values_name, Func&& func)
+{
+	if (first.format != second.format || first.itemsize != second.itemsize)
+		throw py::type_error(indices_name + " must have the same dtype");
+	if (first.item_type_is_equivalent_to<int32_t>())
+		return VisitBuffers<int32_t>(first, second, values, values_name, std::forward<Func>(func));
+	if (first.item_type_is_equivalent_to<int64_t>())
+		return VisitBuffers<int64_t>(first, second, values, values_name, std::forward<Func>(func));
+	throw py::type_error(indices_name + " must be int32 or int64, got format " + first.format);
+}
+
+// Calls func(sources, destinations, weights, num_edges) with pointers to data of edge arrays
+template<typename Func>
+auto VisitEdges(const py::buffer& sources, const py::buffer& destinations, const py::buffer& weights, Func&& func)
+{
+	py::buffer_info src = VectorBufferInfo(sources, "sources");
+	py::buffer_info dst = VectorBufferInfo(destinations, "destinations");
+	py::buffer_info wgt = VectorBufferInfo(weights, "weights");
+	if (dst.shape[0] != src.shape[0] || wgt.shape[0] != src.shape[0])
+		throw py::value_error("sources, destinations and weights must have the same length");
+	size_t num_edges = size_t(src.shape[0]);
+	return WithoutGIL([&] {
+		return VisitBuffers(src, dst, wgt, "sources and destinations", "weights",
+			[&](auto src_ptr, auto dst_ptr, auto wgt_ptr) {return func(src_ptr, dst_ptr, wgt_ptr, num_edges);});
+	});
+}
+
+void CheckReduce(bool reduce, bool treat_as_modularity)
+{
+	if (reduce && treat_as_modularity)
+		throw py::value_error("reduce can not be used with treat_as_modularity");
+}
+
+// Graph built from entries of adjacency matrix as directed edges (see EdgeList), split into components or reduced
+PreparedGraph GraphFromEdgeList(const EdgeList& edges, size_t size, double modularity_resolution, bool treat_as_modularity,
+	std::optional<bool> sparse, bool components, bool reduce)
+{
+	if (reduce)
+		return ReducedGraphFromEdges(size, edges.sources.data(), edges.destinations.data(), edges.weights.data(),
+			edges.weights.size(), true, modularity_resolution, sparse, components);
+	return PreparedGraphFromEdges(size, edges.sources.data(), edges.destinations.data(), edges.weights.data(),
+		edges.weights.size(), true, modularity_resolution, treat_as_modularity, sparse, components);
+}
+
+PreparedGraph graph_from_edges(
+	const py::buffer& sources,
+	const py::buffer& destinations,
+	const py::buffer& weights,
+	size_t size,
+	bool directed=false,
+	double modularity_resolution=1.0,
+	bool treat_as_modularity=false,
+	std::optional<bool> sparse=std::nullopt,
+	bool components=false,
+	bool reduce=false)
+{
+	CheckReduce(reduce, treat_as_modularity);
+	return VisitEdges(sources, destinations, weights, [&](auto src, auto dst, auto wgt, size_t num_edges) {
+		if (reduce)
+			return ReducedGraphFromEdges(size, src, dst, wgt, num_edges, directed, modularity_resolution, sparse, components);
+		return PreparedGraphFromEdges(size, src, dst, wgt, num_edges, directed, modularity_resolution, treat_as_modularity,
+			sparse, components);
+	});
+}
+
+// Calls func(size, indptr, indices, data) with pointers to data of CSR arrays
+template<typename Func>
+auto VisitCSR(const py::buffer& indptr, const py::buffer& indices, const py::buffer& data, Func&& func)
+{
+	py::buffer_info ptr = VectorBufferInfo(indptr, "indptr");
+	py::buffer_info ind = VectorBufferInfo(indices, "indices");
+	py::buffer_info values = VectorBufferInfo(data, "data");
+	if (ptr.shape[0] < 1)
+		throw py::value_error("indptr must not be empty");
+	size_t size = size_t(ptr.shape[0] - 1);
+	return WithoutGIL([&] {
+		return VisitBuffers(ptr, ind, values, "indptr and indices", "data", [&](auto ptr_data, auto ind_data, auto values_data) {
+			if (size_t(ptr_data[size]) > size_t(ind.shape[0]) || size_t(ptr_data[size]) > size_t(values.shape[0]))
+				throw py::value_error("indptr does not match length of indices or data");
+			return func(size, ptr_data, ind_data, values_data);
+		});
+	});
+}
+
+PreparedGraph graph_from_csr(
+	const py::buffer& indptr,
+	const py::buffer& indices,
+	const py::buffer& data,
+	bool directed=false,
+	double modularity_resolution=1.0,
+	bool treat_as_modularity=false,
+	std::optional<bool> sparse=std::nullopt,
+	bool components=false,
+	bool reduce=false)
+{
+	CheckReduce(reduce, treat_as_modularity);
+	if (components || reduce)
+		return VisitCSR(indptr, indices, data, [&](size_t size, auto ptr, auto ind, auto values) {
+			// entries as directed edges, loops of undirected graph doubled, normalize as the whole matrix
+			EdgeList edges = EdgesFromCSR(size, ptr, ind, values, !directed && !treat_as_modularity);
+			return GraphFromEdgeList(edges, size, modularity_resolution, treat_as_modularity, sparse, components, reduce);
+		});
+	size_t size = size_t(std::max<py::ssize_t>(indptr.request().size - 1, 0));
+	if (UseSparse(sparse, size_t(indices.request().size), size, treat_as_modularity))
+		return PreparedGraph(VisitCSR(indptr, indices, data, [&](size_t size, auto ptr, auto ind, auto values) {
+			return SparseGraphFromCSR(size, ptr, ind, values, directed, modularity_resolution, treat_as_modularity);
+		}));
+	return PreparedGraph(VisitCSR(indptr, indices, data, [&](size_t size, auto ptr, auto ind, auto values) {
+		if (treat_as_modularity)
+			return DenseGraph(FillModularityMatrixFromCSR(size, ptr, ind, values, directed), ZeroNullModel(size),
+				modularity_resolution);
+		NullModel null_model;
+		Matrix matrix = ModularityMatrixFromCSR(size, ptr, ind, values, directed, modularity_resolution, &null_model);
+		return DenseGraph(std::move(matrix), std::move(null_model), modularity_resolution);
+	}));
+}
+
+template<typename Rows>
+DenseGraph DenseGraphFromMatrix(size_t size, const Rows& rows, double modularity_resolution, bool treat_as_modularity)
+{
+	bool directed = !IsDenseMatrixSymmetric(size, rows);
+	if (treat_as_modularity)
+		return DenseGraph(FillModularityMatrixFromDense(size, rows, directed), ZeroNullModel(size), modularity_resolution);
+	NullModel null_model;
+	Matrix matrix = ModularityMatrixFromDense(size, rows, directed, modularity_resolution, &null_model);
+	return DenseGraph(std::move(matrix), std::move(null_model), modularity_resolution);
+}
+
+// Calls func(size, rows) with released GIL, rows being a view of buffer or the nested Matrix
+template<typename Func>
+auto VisitDense(const py::buffer& matrix, Func&& func)
+{
+	py::buffer_info info = matrix.request();
+	if (info.ndim != 2 || info.shape[0] != info.shape[1])
+		throw py::value_error("matrix must be a square matrix");
+	size_t size = size_t(info.shape[0]);
+	if (size > 1 && (info.strides[1] != info.itemsize || info.strides[0] != info.itemsize * info.shape[1]))
+		throw py::value_error("matrix must be C-contiguous");
+	if (info.item_type_is_equivalent_to<double>())
+		return WithoutGIL([&] {return func(size, DenseMatrixView<double>{static_cast<const double*>(info.ptr), size});});
+	if (info.item_type_is_equivalent_to<float>())
+		return WithoutGIL([&] {return func(size, DenseMatrixView<float>{static_cast<const float*>(info.ptr), size});});
+	throw py::type_error("matrix must be float32 or float64, got format " + info.format);
+}
+
+template<typename Func>
+auto VisitDense(const Matrix& matrix, Func&& func)
+{
+	for (const std::vector<double>& row : matrix)
+		if (row.size() != matrix.size())
+			throw py::value_error("matrix must be a square matrix");
+	return WithoutGIL([&] {return func(matrix.size(), matrix);});
+}
+
+// matrix is either a buffer (read in place) or a nested list converted to Matrix by pybind11
+// matrix is stored densely unless sparse is true (or not given, with components or reduce)
+template<typename MatrixType>
+PreparedGraph graph_from_matrix(
+	const MatrixType& matrix,
+	double modularity_resolution=1.0,
+	bool treat_as_modularity=false,
+	std::optional<bool> sparse=std::nullopt,
+	bool components=false,
+	bool reduce=false)
+{
+	CheckReduce(reduce, treat_as_modularity);
+	return VisitDense(matrix, [&](size_t size, const auto& rows) {
+		if (!components && !reduce && !sparse.value_or(false))
+			return PreparedGraph(DenseGraphFromMatrix(size, rows, modularity_resolution, treat_as_modularity));
+		bool directed = !IsDenseMatrixSymmetric(size, rows);
+		if (!components && !reduce)
+			return PreparedGraph(SparseGraphFromDense(size, rows, directed, modularity_resolution, treat_as_modularity));
+		EdgeList edges = EdgesFromDense(size, rows, !directed && !treat_as_modularity);
+		return GraphFromEdgeList(edges, size, modularity_resolution, treat_as_modularity, sparse, components, reduce);
+	});
+}
+
+// dense graph (by default) keeps only the modularity matrix computed by Combo,
+// sparse one is built from edges (or matrix) of the file
+PreparedGraph graph_from_file(
 	std::string file_name,
 	double modularity_resolution=1.0,
+	bool treat_as_modularity=false,
+	std::optional<bool> sparse=std::nullopt)
+{
+	return WithoutGIL([&] {
+		if (!sparse.value_or(false))
+			return PreparedGraph(DenseGraph(ReadGraphFromFile(file_name, modularity_resolution, treat_as_modularity).GetModularityMatrix()));
+		GraphFile graph_file = ReadGraphFile(file_name);
+		if (graph_file.is_matrix)
+			return PreparedGraph(SparseGraphFromDense(graph_file.size, graph_file.matrix,
+				!IsDenseMatrixSymmetric(graph_file.size, graph_file.matrix), modularity_resolution, treat_as_modularity));
+		return PreparedGraph(SparseGraphFromEdges(graph_file.size, graph_file.sources.data(), graph_file.destinations.data(),
+			graph_file.weights.data(), graph_file.weights.size(), graph_file.is_directed, modularity_resolution,
+			treat_as_modularity));
+	});
+}
+
+// Community labels of nodes given as int32 or int64 array, or as a list
+std::vector<size_t> CommunitiesVector(const std::variant<py::buffer, std::vector<size_t>>& communities,
+	const std::string& name = "initial_communities")
+{
+	if (std::holds_alternative<std::vector<size_t>>(communities))
+		return std::get<std::vector<size_t>>(communities);
+	py::buffer_info info = VectorBufferInfo(std::get<py::buffer>(communities), name.c_str());
+	if (info.item_type_is_equivalent_to<int32_t>()) {
+		const int32_t* data = static_cast<const int32_t*>(info.ptr);
+		return std::vector<size_t>(data, data + info.shape[0]);
+	}
+	if (info.item_type_is_equivalent_to<int64_t>()) {
+		const int64_t* data = static_cast<const int64_t*>(info.ptr);
+		return std::vector<size_t>(data, data + info.shape[0]);
+	}
+	throw py::type_error(name + " must be int32 or int64, got format " + info.format);
+}
+
+// Modularity of partitions given as community labels of nodes, computed with released GIL
+std::vector<double> graph_modularity(
+	const PreparedGraph& graph,
+	const std::vector<std::variant<py::buffer, std::vector<size_t>>>& partitions,
+	size_t n_threads=1)
+{
+	std::vector<std::vector<size_t>> communities;
+	communities.reserve(partitions.size());
+	for (const auto& partition : partitions)
+		communities.push_back(CommunitiesVector(partition, "partitions"));
+	return WithoutGIL([&] {return graph.Modularity(communities, n_threads);});
+}
+
+// Runs Combo with released GIL, graph is not modified and may be run by several threads at once
+ComboResult run(
+	const PreparedGraph& graph,
 	std::optional<size_t> max_communities=std::nullopt,
 	int num_split_attempts=0,
 	int fixed_split_step=0,
 	bool start_separate=false,
-	bool treat_as_modularity=false,
 	int verbose=0,
 	std::optional<std::string> intermediate_results_path=std::nullopt,
-	std::optional<int> random_seed=std::nullopt)
+	std::optional<int> random_seed=std::nullopt,
+	size_t n_restarts=1,
+	size_t n_threads=1,
+	bool return_restarts=false,
+	const std::optional<std::variant<py::buffer, std::vector<size_t>>>& initial_communities=std::nullopt,
+	std::optional<size_t> coarsen_to=std::nullopt,
+	std::optional<double> time_limit_s=std::nullopt,
+	std::optional<size_t> max_iterations=std::nullopt,
+	const std::optional<py::function>& callback=std::nullopt,
+	double callback_interval_s=0.1,
+	bool collect_stats=false,
+	const std::string& intermediate_results_format="text",
+	size_t intermediate_results_stride=1,
+	const std::optional<py::function>& partition_callback=std::nullopt)
 {
-	Graph graph = ReadGraphFromFile(file_name, modularity_resolution, treat_as_modularity);
-	if(graph.Size() <= 0) {
+	ComboSettings settings = MakeSettings(max_communities, num_split_attempts, fixed_split_step, start_separate, verbose,
+		intermediate_results_path, random_seed, n_restarts, n_threads, return_restarts,
+		initial_communities.has_value() ? std::optional(CommunitiesVector(initial_communities.value())) : std::nullopt,
+		coarsen_to, time_limit_s, max_iterations);
+	if (graph.Size() == 0) {
 		std::cerr << "Error: graph is empty" << std::endl;
 		return {std::vector<size_t>(), -1.0};
 	}
-	ComboAlgorithm combo(random_seed, num_split_attempts, fixed_split_step, verbose);
-	combo.Run(graph, max_communities, start_separate, intermediate_results_path);
-	return {graph.Communities(), graph.Modularity()};
+	settings.collect_stats = collect_stats;
+	if (intermediate_results_format == "binary")
+		settings.intermediate_results_format = IntermediateResultsFormat::BINARY;
+	else if (intermediate_results_format != "text")
+		throw py::value_error("intermediate_results_format must be 'text' or 'binary'");
+	settings.intermediate_results_stride = intermediate_results_stride;
+	// labels are passed as read-only memoryview of the run's partition, released after the call
+	if (partition_callback.has_value())
+		settings.partitions = [&](size_t iteration, const std::vector<size_t>& communities, double modularity) {
+			py::gil_scoped_acquire acquire;
+			py::memoryview labels = py::memoryview::from_buffer(const_cast<size_t*>(communities.data()), {communities.size()}, {sizeof(size_t)}, true);
+			py::object result = partition_callback.value()(iteration, labels, modularity);
+			labels.attr("release")();
+			return result.is_none() || result.cast<bool>();
+		};
+	PythonProgress progress(callback, callback_interval_s);
+	settings.progress = progress.Callback();
+	std::chrono::steady_clock::time_point start = std::chrono::steady_clock::now();
+	ComboResult result = WithoutGIL([&] {return graph.Run(settings);});
+	progress.RaiseError();
+	if (collect_stats)
+		result.stats.run_seconds = std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+	return result;
+}
+
+// Re-partitions communities touched by edge updates, see DynamicGraph::Optimize
+size_t optimize_dynamic(
+	DynamicGraph& graph,
+	std::optional<size_t> max_communities=std::nullopt,
+	int num_split_attempts=0,
+	int fixed_split_step=0,
+	int verbose=0,
+	std::optional<int> random_seed=std::nullopt,
+	size_t n_restarts=1,
+	size_t n_threads=1)
+{
+	ComboSettings settings = MakeSettings(max_communities, num_split_attempts, fixed_split_step, false, verbose,
+		std::nullopt, random_seed, n_restarts, n_threads, false, std::nullopt, std::nullopt, std::nullopt, std::nullopt);
+	PythonProgress progress;
+	settings.progress = progress.Callback();
+	size_t number_of_nodes = WithoutGIL([&] {return graph.Optimize(settings);});
+	progress.RaiseError();
+	return number_of_nodes;
+}
+
+void solve_dynamic(
+	DynamicGraph& graph,
+	std::optional<size_t> max_communities=std::nullopt,
+	int num_split_attempts=0,
+	int fixed_split_step=0,
+	int verbose=0,
+	std::optional<int> random_seed=std::nullopt,
+	size_t n_restarts=1,
+	size_t n_threads=1)
+{
+	ComboSettings settings = MakeSettings(max_communities, num_split_attempts, fixed_split_step, false, verbose,
+		std::nullopt, random_seed, n_restarts, n_threads, false, std::nullopt, std::nullopt, std::nullopt, std::nullopt);
+	PythonProgress progress;
+	settings.progress = progress.Callback();
+	WithoutGIL([&] {graph.Solve(settings);});
+	progress.RaiseError();
+}
+
+// Community labels of nodes as int32 numpy array (numpy is imported when called only); labels of the run are
+// size_t, so they are copied once, which is negligible next to the run and to conversion into a list
+py::array_t<int32_t> labels_array(const ComboResult& result)
+{
+	const std::vector<size_t>& communities = result.communities;
+	if (communities.size() > size_t(std::numeric_limits<int32_t>::max()))
+		throw py::value_error("array output is limited to 2^31 - 1 nodes");
+	py::array_t<int32_t> labels(py::ssize_t(communities.size()));
+	int32_t* data = labels.mutable_data();
+	for (size_t i = 0; i < communities.size(); ++i)
+		data[i] = int32_t(communities[i]);
+	return labels;
+}
+
+// Communities as int32 numpy arrays of offsets and members (node indices in increasing order),
+// community c consisting of members[offsets[c]:offsets[c + 1]]
+std::pair<py::array_t<int32_t>, py::array_t<int32_t>> community_arrays(const ComboResult& result)
+{
+	const std::vector<size_t>& communities = result.communities;
+	if (communities.size() > size_t(std::numeric_limits<int32_t>::max()))
+		throw py::value_error("array output is limited to 2^31 - 1 nodes");
+	size_t number = communities.empty() ? 0 : 1 + *std::max_element(communities.begin(), communities.end());
+	py::array_t<int32_t> offsets(py::ssize_t(number + 1));
+	py::array_t<int32_t> members(py::ssize_t(communities.size()));
+	int32_t* offsets_data = offsets.mutable_data();
+	int32_t* members_data = members.mutable_data();
+	std::fill(offsets_data, offsets_data + number + 1, 0);
+	for (size_t community : communities)
+		++offsets_data[community + 1];
+	for (size_t c = 0; c < number; ++c)
+		offsets_data[c + 1] += offsets_data[c];
+	std::vector<int32_t> positions(offsets_data, offsets_data + number);
+	for (size_t i = 0; i < communities.size(); ++i)
+		members_data[positions[communities[i]]++] = int32_t(i);
+	return {offsets, members};
+}
+
+// Copy of vector as numpy array (numpy is imported when called only)
+template<typename T, typename ArrayT = T>
+py::array_t<ArrayT> NumpyArray(const std::vector<T>& values)
+{
+	py::array_t<ArrayT> array(py::ssize_t(values.size()));
+	std::copy(values.begin(), values.end(), array.mutable_data());
+	return array;
 }
 
-std::tuple< std::vector<size_t>, double> execute_from_matrix(
-	const std::vector<std::vector<double>>& matrix,
+// Diagnostics of the partition of result, computed with released GIL
+PartitionDiagnostics graph_diagnostics(const PreparedGraph& graph, const ComboResult& result)
+{
+	return WithoutGIL([&] {return graph.Diagnostics(result.communities);});
+}
+
+// Graph of communities of partition given as community labels of nodes, built with released GIL
+CommunityGraph graph_community_graph(const PreparedGraph& graph, const std::variant<py::buffer, std::vector<size_t>>& partition)
+{
+	std::vector<size_t> communities = CommunitiesVector(partition, "partition");
+	return WithoutGIL([&] {return graph.GetCommunityGraph(communities);});
+}
+
+// Runs hierarchical Combo with released GIL, see PreparedGraph::RunHierarchical
+Dendrogram run_hierarchical(
+	const PreparedGraph& graph,
+	size_t levels=2,
+	size_t min_size=2,
+	std::optional<size_t> max_communities=std::nullopt,
+	int num_split_attempts=0,
+	int fixed_split_step=0,
+	bool start_separate=false,
+	std::optional<int> random_seed=std::nullopt,
+	size_t n_threads=1,
+	std::optional<size_t> coarsen_to=std::nullopt,
+	std::optional<double> time_limit_s=std::nullopt,
+	std::optional<size_t> max_iterations=std::nullopt)
+{
+	ComboSettings settings = MakeSettings(max_communities, num_split_attempts, fixed_split_step, start_separate, 0,
+		std::nullopt, random_seed, 1, n_threads, false, std::nullopt, coarsen_to, time_limit_s, max_iterations);
+	PythonProgress progress;
+	settings.progress = progress.Callback();
+	Dendrogram dendrogram = WithoutGIL([&] {return graph.RunHierarchical(settings, levels, min_size);});
+	progress.RaiseError();
+	return dendrogram;
+}
+
+// Entry points of versions before Graph, kept for compatibility: build dense graph, run once, return labels and modularity
+std::tuple<std::vector<size_t>, double> execute_from_file(
+	std::string file_name,
+	double modularity_resolution=1.0,
+	std::optional<size_t> max_communities=std::nullopt,
+	int num_split_attempts=0,
+	int fixed_split_step=0,
+	bool start_separate=false,
+	bool treat_as_modularity=false,
+	int verbose=0,
+	std::optional<std::string> intermediate_results_path=std::nullopt,
+	std::optional<int> random_seed=std::nullopt)
+{
+	ComboResult result = run(graph_from_file(file_name, modularity_resolution, treat_as_modularity), max_communities,
+		num_split_attempts, fixed_split_step, start_separate, verbose, intermediate_results_path, random_seed);
+	return {result.communities, result.modularity};
+}
+
+std::tuple<std::vector<size_t>, double> execute_from_matrix(
+	const Matrix& matrix,
 	double modularity_resolution=1.0,
 	std::optional<size_t> max_communities=std::nullopt,
 	int num_split_attempts=0,
@@ -41,13 +636,12 @@ std::tuple< std::vector<size_t>, double> execute_from_matrix(
 	std::optional<std::string> intermediate_results_path=std::nullopt,
 	std::optional<int> random_seed=std::nullopt)
 {
-	Graph graph(matrix, modularity_resolution, treat_as_modularity);
-	ComboAlgorithm combo(random_seed, num_split_attempts, fixed_split_step, verbose);
-	combo.Run(graph, max_communities, start_separate, intermediate_results_path);
-	return {graph.Communities(), graph.Modularity()};
+	ComboResult result = run(graph_from_matrix(matrix, modularity_resolution, treat_as_modularity), max_communities,
+		num_split_attempts, fixed_split_step, start_separate, verbose, intermediate_results_path, random_seed);
+	return {result.communities, result.modularity};
 }
 
-std::tuple< std::vector<size_t>, double> execute(
+std::tuple<std::vector<size_t>, double> execute(
 	int size,
 	const std::vector<std::tuple<int, int, double>>& edges,
 	bool directed=false,
@@ -61,16 +655,212 @@ std::tuple< std::vector<size_t>, double> execute(
 	std::optional<std::string> intermediate_results_path=std::nullopt,
 	std::optional<int> random_seed=std::nullopt)
 {
-	Graph graph(size, edges, directed, modularity_resolution, treat_as_modularity);
-	ComboAlgorithm combo(random_seed, num_split_attempts, fixed_split_step, verbose);
-	combo.Run(graph, max_communities, start_separate, intermediate_results_path);
-	return {graph.Communities(), graph.Modularity()};
+	if (size < 0)
+		throw py::value_error("size must not be negative");
+	std::vector<int> sources, destinations;
+	std::vector<double> weights;
+	for (const auto& [source, destination, weight] : edges) {
+		sources.push_back(source);
+		destinations.push_back(destination);
+		weights.push_back(weight);
+	}
+	PreparedGraph graph = WithoutGIL([&] {
+		return PreparedGraphFromEdges(size_t(size), sources.data(), destinations.data(), weights.data(), weights.size(),
+			directed, modularity_resolution, treat_as_modularity, false, false);
+	});
+	ComboResult result = run(graph, max_communities, num_split_attempts, fixed_split_step, start_separate, verbose,
+		intermediate_results_path, random_seed);
+	return {result.communities, result.modularity};
 }
 
-
 PYBIND11_MODULE(_combo, m) {
     m.doc() = "Python binding for Combo community detection algorithm"; // optional module docstring
 
+	py::class_<RunStats>(m, "RunStats", "counters and timings of runs of combo algorithm")
+		.def_readonly("run_seconds", &RunStats::run_seconds)
+		.def_readonly("split_seconds", &RunStats::split_seconds)
+		.def_readonly("kernighan_lin_seconds", &RunStats::kernighan_lin_seconds)
+		.def_readonly("deletion_seconds", &RunStats::deletion_seconds)
+		.def_readonly("coarsening_seconds", &RunStats::coarsening_seconds)
+		.def_readonly("refinement_seconds", &RunStats::refinement_seconds)
+		.def_readonly("split_attempts", &RunStats::split_attempts)
+		.def_readonly("splits_accepted", &RunStats::splits_accepted)
+		.def_readonly("kernighan_lin_moves", &RunStats::kernighan_lin_moves)
+		.def_readonly("peak_run_bytes", &RunStats::peak_run_bytes)
+		.def_readonly("modularity_trajectory", &RunStats::modularity_trajectory);
+
+	py::class_<PartitionDiagnostics>(m, "Diagnostics", "quality of communities of a partition and of its nodes")
+		.def_property_readonly("community_sizes", [](const PartitionDiagnostics& d) {
+			return NumpyArray<size_t, int64_t>(d.community_sizes);})
+		.def_property_readonly("internal_weights", [](const PartitionDiagnostics& d) {return NumpyArray(d.internal_weights);})
+		.def_property_readonly("strengths", [](const PartitionDiagnostics& d) {return NumpyArray(d.strengths);})
+		.def_property_readonly("modularity_contributions", [](const PartitionDiagnostics& d) {
+			return NumpyArray(d.modularity_contributions);})
+		.def_property_readonly("best_communities", [](const PartitionDiagnostics& d) {return NumpyArray(d.best_communities);})
+		.def_property_readonly("best_gains", [](const PartitionDiagnostics& d) {return NumpyArray(d.best_gains);});
+
+	py::class_<CommunityGraph>(m, "CommunityGraph", "graph of communities of a partition as CSR matrix")
+		.def_property_readonly("sizes", [](const CommunityGraph& g) {return NumpyArray<size_t, int64_t>(g.sizes);})
+		.def_property_readonly("first_nodes", [](const CommunityGraph& g) {return NumpyArray<size_t, int64_t>(g.first_nodes);})
+		.def_property_readonly("indptr", [](const CommunityGraph& g) {return NumpyArray<size_t, int64_t>(g.indptr);})
+		.def_property_readonly("indices", [](const CommunityGraph& g) {return NumpyArray<size_t, int64_t>(g.indices);})
+		.def_property_readonly("weights", [](const CommunityGraph& g) {return NumpyArray(g.weights);});
+
+	py::class_<Dendrogram>(m, "Dendrogram", "communities of several levels found by hierarchical partitioning")
+		.def_property_readonly("parents", [](const Dendrogram& d) {return NumpyArray(d.parents);})
+		.def_property_readonly("levels", [](const Dendrogram& d) {return NumpyArray<size_t, int64_t>(d.levels);})
+		.def_property_readonly("sizes", [](const Dendrogram& d) {return NumpyArray<size_t, int64_t>(d.sizes);})
+		.def_property_readonly("communities", [](const Dendrogram& d) {return NumpyArray<size_t, int64_t>(d.communities);})
+		.def_readonly("modularity", &Dendrogram::modularity);
+
+	py::class_<ComboResult>(m, "Result", "communities and modularity found by combo algorithm")
+		.def_readonly("communities", &ComboResult::communities)
+		.def_readonly("modularity", &ComboResult::modularity)
+		.def_readonly("converged", &ComboResult::converged)
+		.def_readonly("stats", &ComboResult::stats)
+		.def_readonly("restarts", &ComboResult::restarts)
+		.def_property_readonly("labels", &labels_array, "community labels of nodes as int32 numpy array")
+		.def("community_arrays", &community_arrays,
+			"offsets and members (node indices) of communities as int32 numpy arrays, "
+			"community c consisting of members[offsets[c]:offsets[c + 1]]");
+
+	py::class_<PreparedGraph>(m, "Graph", "graph with modularity matrix built once, to be partitioned by combo algorithm many times")
+		.def_static("from_edges", Timed(&graph_from_edges), "build graph from arrays of edge sources, destinations and weights",
+			py::arg("sources"),
+			py::arg("destinations"),
+			py::arg("weights"),
+			py::arg("size"),
+			py::arg("directed") = false,
+			py::arg("modularity_resolution") = 1.0,
+			py::arg("treat_as_modularity") = false,
+			py::arg("sparse") = std::nullopt,
+			py::arg("components") = false,
+			py::arg("reduce") = false)
+		.def_static("from_csr", Timed(&graph_from_csr), "build graph from sparse matrix in CSR format",
+			py::arg("indptr"),
+			py::arg("indices"),
+			py::arg("data"),
+			py::arg("directed") = false,
+			py::arg("modularity_resolution") = 1.0,
+			py::arg("treat_as_modularity") = false,
+			py::arg("sparse") = std::nullopt,
+			py::arg("components") = false,
+			py::arg("reduce") = false)
+		// buffer overload goes first, so that numpy arrays are not converted to nested vectors
+		.def_static("from_matrix", Timed(&graph_from_matrix<py::buffer>), "build graph from adjacency (or modularity) matrix",
+			py::arg("matrix"),
+			py::arg("modularity_resolution") = 1.0,
+			py::arg("treat_as_modularity") = false,
+			py::arg("sparse") = std::nullopt,
+			py::arg("components") = false,
+			py::arg("reduce") = false)
+		.def_static("from_matrix", Timed(&graph_from_matrix<Matrix>), "build graph from adjacency (or modularity) matrix",
+			py::arg("matrix"),
+			py::arg("modularity_resolution") = 1.0,
+			py::arg("treat_as_modularity") = false,
+			py::arg("sparse") = std::nullopt,
+			py::arg("components") = false,
+			py::arg("reduce") = false)
+		.def_static("from_file", Timed(&graph_from_file), "build graph read from specified file",
+			py::arg("graph_path"),
+			py::arg("modularity_resolution") = 1.0,
+			py::arg("treat_as_modularity") = false,
+			py::arg("sparse") = std::nullopt)
+		.def_property_readonly("size", &PreparedGraph::Size)
+		.def_property_readonly("sparse", &PreparedGraph::IsSparse)
+		.def_property_readonly("memory_bytes", &PreparedGraph::MemoryBytes)
+		.def_property_readonly("build_seconds", &PreparedGraph::BuildSeconds,
+			"time spent building the graph, after conversion of arguments, 0 for graphs not built from input")
+		.def_property_readonly("reduced_size", &PreparedGraph::ReducedSize,
+			"number of nodes partitioned by combo algorithm after folding pendant trees and chains")
+		.def_property_readonly("number_of_components", &PreparedGraph::NumberOfComponents,
+			"number of connected components partitioned separately, 0 if the graph is not split")
+		.def("run", &run, "execute combo algorithm on the graph",
+			py::arg("max_communities") = std::nullopt,
+			py::arg("num_split_attempts") = 0,
+			py::arg("fixed_split_step") = 0,
+			py::arg("start_separate") = false,
+			py::arg("verbose") = 0,
+			py::arg("intermediate_results_path") = std::nullopt,
+			py::arg("random_seed") = std::nullopt,
+			py::arg("n_restarts") = 1,
+			py::arg("n_threads") = 1,
+			py::arg("return_restarts") = false,
+			py::arg("initial_communities") = std::nullopt,
+			py::arg("coarsen_to") = std::nullopt,
+			py::arg("time_limit_s") = std::nullopt,
+			py::arg("max_iterations") = std::nullopt,
+			py::arg("callback") = std::nullopt,
+			py::arg("callback_interval_s") = 0.1,
+			py::arg("collect_stats") = false,
+			py::arg("intermediate_results_format") = "text",
+			py::arg("intermediate_results_stride") = 1,
+			py::arg("partition_callback") = std::nullopt)
+		.def("run_hierarchical", &run_hierarchical, "partitions graph and communities found recursively",
+			py::arg("levels") = 2,
+			py::arg("min_size") = 2,
+			py::arg("max_communities") = std::nullopt,
+			py::arg("num_split_attempts") = 0,
+			py::arg("fixed_split_step") = 0,
+			py::arg("start_separate") = false,
+			py::arg("random_seed") = std::nullopt,
+			py::arg("n_threads") = 1,
+			py::arg("coarsen_to") = std::nullopt,
+			py::arg("time_limit_s") = std::nullopt,
+			py::arg("max_iterations") = std::nullopt)
+		.def("diagnostics", &graph_diagnostics, "diagnostics of the partition found by a run",
+			py::arg("result"))
+		.def("community_graph", &graph_community_graph, "graph of communities of partition given as community labels of nodes",
+			py::arg("partition"))
+		.def("modularity", &graph_modularity, "modularity of partitions given as community labels of nodes",
+			py::arg("partitions"),
+			py::arg("n_threads") = 1)
+		.def("with_resolution", &PreparedGraph::WithResolution,
+			"sparse graph sharing the matrix with this one, with another modularity resolution",
+			py::arg("modularity_resolution"))
+		.def(py::pickle(
+			[](const PreparedGraph& graph) {
+				return py::bytes(WithoutGIL([&] {return graph.Serialize();}));
+			},
+			[](const py::bytes& state) {
+				std::string data = state;
+				return WithoutGIL([&] {return PreparedGraph::Deserialize(data);});
+			}));
+
+	py::class_<DynamicGraph>(m, "DynamicGraph", "graph under edge updates with partition kept by local re-optimization")
+		.def(py::init<bool, double>(), py::arg("directed") = false, py::arg("modularity_resolution") = 1.0)
+		.def("add_nodes", &DynamicGraph::AddNodes, "add isolated nodes up to the given number of nodes", py::arg("size"))
+		.def("add_edges", &DynamicGraph::AddEdges, "add weights to edges, creating missing edges and nodes",
+			py::arg("sources"), py::arg("destinations"), py::arg("weights"))
+		.def("remove_edges", &DynamicGraph::RemoveEdges, "remove existing edges",
+			py::arg("sources"), py::arg("destinations"))
+		.def("update_weights", &DynamicGraph::UpdateWeights, "set weights of existing edges",
+			py::arg("sources"), py::arg("destinations"), py::arg("weights"))
+		.def_property_readonly("size", &DynamicGraph::Size)
+		.def_property_readonly("number_of_edges", &DynamicGraph::NumberOfEdges)
+		.def_property_readonly("drift", &DynamicGraph::Drift)
+		.def_property_readonly("communities", &DynamicGraph::Communities)
+		.def_property_readonly("modularity", &DynamicGraph::Modularity)
+		.def("optimize", &optimize_dynamic, "re-partition communities touched by edge updates",
+			py::arg("max_communities") = std::nullopt,
+			py::arg("num_split_attempts") = 0,
+			py::arg("fixed_split_step") = 0,
+			py::arg("verbose") = 0,
+			py::arg("random_seed") = std::nullopt,
+			py::arg("n_restarts") = 1,
+			py::arg("n_threads") = 1)
+		.def("solve", &solve_dynamic, "re-partition the whole graph",
+			py::arg("max_communities") = std::nullopt,
+			py::arg("num_split_attempts") = 0,
+			py::arg("fixed_split_step") = 0,
+			py::arg("verbose") = 0,
+			py::arg("random_seed") = std::nullopt,
+			py::arg("n_restarts") = 1,
+			py::arg("n_threads") = 1)
+		.def("sparse_graph", [](const DynamicGraph& graph) {return PreparedGraph(graph.GetSparseGraph());},
+			"copy of the whole graph as sparse Graph");
+
+	// entry points of versions before Graph
 	m.def("execute_from_file", &execute_from_file, "execute combo algorithm on a graph read from specified file",
 		py::arg("graph_path"),
 		py::arg("modularity_resolution") = 1.0,
@@ -81,8 +871,7 @@ PYBIND11_MODULE(_combo, m) {
 		py::arg("treat_as_modularity") = false,
 		py::arg("verbose") = 0,
 		py::arg("intermediate_results_path") = std::nullopt,
-		py::arg("random_seed") = std::nullopt
-		);
+		py::arg("random_seed") = std::nullopt);
 
 	m.def("execute_from_matrix", &execute_from_matrix, "execute combo algorithm on a graph passed as matrix",
 		py::arg("matrix"),
@@ -94,8 +883,7 @@ PYBIND11_MODULE(_combo, m) {
 		py::arg("treat_as_modularity") = false,
 		py::arg("verbose") = 0,
 		py::arg("intermediate_results_path") = std::nullopt,
-		py::arg("random_seed") = std::nullopt
-		);
+		py::arg("random_seed") = std::nullopt);
 
 	m.def("execute", &execute, "execute combo algorithm on a graph passed as list of edges",
 		py::arg("size"),
@@ -109,6 +897,5 @@ PYBIND11_MODULE(_combo, m) {
 		py::arg("treat_as_modularity") = false,
 		py::arg("verbose") = 0,
 		py::arg("intermediate_results_path") = std::nullopt,
-		py::arg("random_seed") = std::nullopt
-	);
+		py::arg("random_seed") = std::nullopt);
 }
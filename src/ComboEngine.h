@@ -0,0 +1,488 @@
+#ifndef COMBO_ENGINE_H
+#define COMBO_ENGINE_H
+
+#include "Combo/Matrix.h"
+#include "IntermediateResults.h"
+
+#include <algorithm>
+#include <chrono>
+#include <cmath>
+#include <cstdint>
+#include <functional>
+#include <iostream>
+#include <numeric>
+#include <optional>
+#include <random>
+#include <string>
+#include <vector>
+
+// Counters and timings of runs, collected only if requested; times of phases are summed over runs
+// (that is, over threads running them), run_seconds is set by the caller to the wall time of all runs
+struct RunStats
+{
+	double run_seconds = 0;
+	// searching for the best splits of communities, including Kernighan-Lin shifts
+	double split_seconds = 0;
+	double kernighan_lin_seconds = 0;
+	// deletion of communities emptied by splits
+	double deletion_seconds = 0;
+	// multilevel mode: coarsening of the graph and refinement of projected partitions by local moves
+	double coarsening_seconds = 0;
+	double refinement_seconds = 0;
+	// random or fixed initial splits tried, and splits applied (iterations)
+	size_t split_attempts = 0;
+	size_t splits_accepted = 0;
+	// moves of nodes made by Kernighan-Lin shifts with positive gain
+	size_t kernighan_lin_moves = 0;
+	// the largest memory used by a run besides the modularity matrix: move gains, splits and submatrix
+	size_t peak_run_bytes = 0;
+	// modularity before the first and after each iteration, of the returned run
+	std::vector<double> modularity_trajectory;
+
+	// adds counters and timings of other to these ones, trajectory is not changed
+	void Add(const RunStats& other)
+	{
+		run_seconds += other.run_seconds;
+		split_seconds += other.split_seconds;
+		kernighan_lin_seconds += other.kernighan_lin_seconds;
+		deletion_seconds += other.deletion_seconds;
+		coarsening_seconds += other.coarsening_seconds;
+		refinement_seconds += other.refinement_seconds;
+		split_attempts += other.split_attempts;
+		splits_accepted += other.splits_accepted;
+		kernighan_lin_moves += other.kernighan_lin_moves;
+		peak_run_bytes = std::max(peak_run_bytes, other.peak_run_bytes);
+	}
+};
+
+// Adds wall time of its scope to seconds, does nothing if seconds is null
+class ScopedTimer
+{
+public:
+	explicit ScopedTimer(double* seconds) :
+		m_seconds(seconds), m_start(seconds != nullptr ? std::chrono::steady_clock::now() : std::chrono::steady_clock::time_point())
+	{
+	}
+	~ScopedTimer()
+	{
+		if (m_seconds != nullptr)
+			*m_seconds += std::chrono::duration<double>(std::chrono::steady_clock::now() - m_start).count();
+	}
+	ScopedTimer(const ScopedTimer&) = delete;
+	ScopedTimer& operator=(const ScopedTimer&) = delete;
+
+private:
+	double* m_seconds;
+	std::chrono::steady_clock::time_point m_start;
+};
+
+// Combo algorithm (same steps, settings and random sequence as ComboAlgorithm from src/Combo)
+// over any graph model providing Graph-like interface and a modularity submatrix type with split kernels:
+//   GraphT::Submatrix: Size, Row, RowSums, PositiveRowSums, AddToDiagonal, ModularityGain, MoveGains
+//                      returning ShiftGains with Best and Move;
+//   GraphT: Size, NumberOfCommunities, Modularity, SetCommunities, CommunityIndices, GetModularitySubmatrix,
+//           GetCorrectionVector(indices, community), PerformSplit, DeleteCommunityIfEmpty.
+template<typename GraphT>
+class ComboEngine
+{
+public:
+	explicit ComboEngine(std::optional<uint_fast32_t> random_seed = std::nullopt,
+		int num_split_attempts = 0, int fixed_split_step = 0, int output_info_level = 0) :
+		m_fixed_split_step(fixed_split_step),
+		m_output_info_level(output_info_level),
+		m_random_number_generator(random_seed.has_value() ? random_seed.value() :
+			static_cast<uint_fast32_t>(std::chrono::duration_cast<std::chrono::microseconds>(
+				std::chrono::steady_clock::now().time_since_epoch()).count())),
+		m_bernoulli_distribution(0.5)
+	{
+		SetNumberOfSplitAttempts(num_split_attempts);
+	}
+
+	// initial_communities (labels 0, 1, ..., k - 1), if given, are improved instead of a trivial partition.
+	// Returns false if the run was stopped by limits before convergence, with the partition found so far.
+	bool Run(GraphT& graph, std::optional<size_t> max_communities = std::nullopt, bool start_separate = false,
+		IntermediateResults* intermediate_results = nullptr,
+		const std::optional<std::vector<size_t>>& initial_communities = std::nullopt);
+
+	void SetNumberOfSplitAttempts(int split_tries)
+	{
+		if (split_tries == -1) {
+			m_autoC1 = 1.5 * std::log(10);
+			m_autoC2 = 1;
+		} else if (split_tries == -2) {
+			m_autoC1 = std::log(10);
+			m_autoC2 = 1;
+		} else {
+			m_autoC1 = 2;
+			m_autoC2 = 1.5;
+		}
+		m_num_split_attempts = split_tries;
+	}
+
+	// Run stops at deadline (checked between Kernighan-Lin shifts) or after max_iterations applied splits
+	void SetLimits(std::optional<std::chrono::steady_clock::time_point> deadline, std::optional<size_t> max_iterations)
+	{
+		m_deadline = deadline;
+		m_max_iterations = max_iterations;
+	}
+
+	// progress(iteration, number of communities, modularity) is called between Kernighan-Lin shifts
+	// and stops Run if it returns false
+	void SetProgress(std::function<bool(size_t, size_t, double)> progress)
+	{
+		m_progress = std::move(progress);
+	}
+
+	// partitions(iteration, communities, modularity) is called before the first and after each iteration
+	// with the current partition (valid during the call only) and stops Run if it returns false
+	void SetPartitions(std::function<bool(size_t, const std::vector<size_t>&, double)> partitions)
+	{
+		m_partitions = std::move(partitions);
+	}
+
+	// counters and timings of Run are added to stats (if not null), its modularity trajectory is replaced
+	void SetStats(RunStats* stats) {m_stats = stats;}
+
+private:
+	typedef typename GraphT::Submatrix Submatrix;
+	typedef std::vector<std::vector<double>> MoveGains;
+	typedef std::vector<std::vector<bool>> SplitsCommunities;
+
+	int m_num_split_attempts;
+	int m_fixed_split_step;
+	int m_output_info_level;
+	double m_autoC1;
+	double m_autoC2;
+	std::mt19937 m_random_number_generator;
+	std::bernoulli_distribution m_bernoulli_distribution;
+	double m_current_best_gain;
+	std::optional<std::chrono::steady_clock::time_point> m_deadline;
+	std::optional<size_t> m_max_iterations;
+	std::function<bool(size_t, size_t, double)> m_progress;
+	std::function<bool(size_t, const std::vector<size_t>&, double)> m_partitions;
+	RunStats* m_stats = nullptr;
+	// state of Run reported to progress, partitions and stats
+	size_t m_iteration = 0;
+	size_t m_number_of_communities = 0;
+	double m_modularity = 0;
+	// set once Run has to stop, by deadline or progress
+	bool m_stopped = false;
+
+	bool Stopped();
+
+	double PerformKernighansShift(const Submatrix& Q, const std::vector<double>& correction_vector,
+		const std::vector<int>& communities_old, std::vector<int>& communities_new);
+	std::vector<int> FixedSplit(const Submatrix& Q, int fixed_split_type);
+	double Split(Submatrix& Q, const std::vector<double>& correction_vector, std::vector<int>& to_be_moved);
+	void ReCalc(GraphT& graph, MoveGains& move_gains, SplitsCommunities& splits_communities, size_t origin, size_t destination);
+	bool DeleteCommunityIfEmpty(GraphT& graph, MoveGains& move_gains, SplitsCommunities& splits_communities, size_t origin);
+	static double BestGain(const MoveGains& move_gains, size_t& origin, size_t& destination);
+};
+
+template<typename GraphT>
+bool ComboEngine<GraphT>::Stopped()
+{
+	if (!m_stopped && m_deadline.has_value() && std::chrono::steady_clock::now() >= m_deadline.value())
+		m_stopped = true;
+	if (!m_stopped && m_progress)
+		m_stopped = !m_progress(m_iteration, m_number_of_communities, m_modularity);
+	return m_stopped;
+}
+
+template<typename GraphT>
+double ComboEngine<GraphT>::PerformKernighansShift(const Submatrix& Q, const std::vector<double>& correction_vector,
+	const std::vector<int>& communities_old, std::vector<int>& communities_new)
+{
+	ScopedTimer timer(m_stats != nullptr ? &m_stats->kernighan_lin_seconds : nullptr);
+	size_t n = Q.Size();
+	typename Submatrix::ShiftGains gains = Q.MoveGains(correction_vector, communities_old);
+	std::vector<double> gains_got(n, 0.0);
+	std::vector<size_t> gains_indexes(n, 0);
+	for (size_t i = 0; i < n; ++i) {
+		size_t gains_ind = gains.Best(gains_got[i]);
+		gains_indexes[i] = gains_ind;
+		if (i > 0)
+			gains_got[i] = gains_got[i] + gains_got[i-1];
+		gains.Move(gains_ind);
+	}
+	std::vector<double>::iterator it = std::max_element(gains_got.begin(), gains_got.end());
+	double mod_gain = *it;
+	size_t steps_to_get_max_gain = size_t(it - gains_got.begin() + 1);
+	communities_new = communities_old;
+	if (mod_gain > 0) {
+		for (size_t i = 0; i < steps_to_get_max_gain; ++i)
+			communities_new[gains_indexes[i]] = !communities_new[gains_indexes[i]];
+		// shifts with smaller gain are discarded by Split
+		if (m_stats != nullptr && mod_gain > THRESHOLD)
+			m_stats->kernighan_lin_moves += steps_to_get_max_gain;
+	} else
+		mod_gain = 0;
+	return mod_gain;
+}
+
+template<typename GraphT>
+std::vector<int> ComboEngine<GraphT>::FixedSplit(const Submatrix& Q, int fixed_split_type)
+{
+	size_t n = Q.Size();
+	if (fixed_split_type == 1 || fixed_split_type == 2)
+		return std::vector<int>(n, 2 - fixed_split_type);
+	std::vector<double> sum_pos = Q.PositiveRowSums();
+	size_t node_ind;
+	if (fixed_split_type == 3 || fixed_split_type == 4)
+		node_ind = size_t(std::max_element(sum_pos.begin(), sum_pos.end()) - sum_pos.begin());
+	else
+		node_ind = size_t(std::min_element(sum_pos.begin(), sum_pos.end()) - sum_pos.begin());
+	std::vector<int> communities(n, -1);
+	int community = 1;
+	communities[node_ind] = community;
+	while (true) {
+		const std::vector<double>& row = Q.Row(node_ind);
+		std::optional<size_t> next_node_ind;
+		double cur_min = 1e300;
+		double cur_max = -1e300;
+		for (size_t i = 0; i < n; ++i) {
+			if (communities[i] == -1) {
+				if ((fixed_split_type == 3 || fixed_split_type == 5) && row[i] < cur_min) {
+					next_node_ind = i;
+					cur_min = row[i];
+				} else if ((fixed_split_type == 4 || fixed_split_type == 6) && row[i] > cur_max) {
+					next_node_ind = i;
+					cur_max = row[i];
+				}
+			}
+		}
+		if (!next_node_ind.has_value())
+			break;
+		node_ind = next_node_ind.value();
+		community ^= 1;
+		communities[node_ind] = community;
+	}
+	return communities;
+}
+
+template<typename GraphT>
+double ComboEngine<GraphT>::Split(Submatrix& Q, const std::vector<double>& correction_vector, std::vector<int>& to_be_moved)
+{
+	double mod_gain = 0.0;
+	std::vector<double> sumQ = Q.RowSums();
+	size_t n = Q.Size();
+	for (size_t i = 0; i < n; ++i)
+		sumQ[i] = 2 * correction_vector[i] - sumQ[i];
+	Q.AddToDiagonal(sumQ); //adjust the submatrix
+	int tries;
+	if (m_num_split_attempts > 0)
+		tries = m_num_split_attempts;
+	else
+		tries = int(std::pow(std::abs(std::log(m_current_best_gain)), m_autoC2) / m_autoC1 + 3);
+	for (int tryI = 1; tryI <= tries; ++tryI) {
+		if (m_stats != nullptr)
+			++m_stats->split_attempts;
+		std::vector<int> communities(n); // 0 - stay in origin, 1 - move to destination
+		//perform an initial simple split
+		if (m_fixed_split_step > 0 && tryI <= 6 * m_fixed_split_step && tryI % m_fixed_split_step == 0)
+			communities = FixedSplit(Q, tryI / m_fixed_split_step);
+		else {
+			for (size_t i = 0; i < n; ++i)
+				communities[i] = m_bernoulli_distribution(m_random_number_generator);
+		}
+		double mod_gain_total = Q.ModularityGain(correction_vector, communities);
+		double mod_gain_from_shift = 1;
+		while (mod_gain_from_shift > THRESHOLD && !Stopped()) {
+			std::vector<int> communities_shifted(n);
+			mod_gain_from_shift = PerformKernighansShift(Q, correction_vector, communities, communities_shifted);
+			if (mod_gain_from_shift > THRESHOLD) {
+				mod_gain_total += mod_gain_from_shift;
+				communities = communities_shifted;
+			}
+		}
+		if (mod_gain < mod_gain_total) {
+			to_be_moved = communities;
+			mod_gain = mod_gain_total;
+		}
+		if (mod_gain <= 1e-6)
+			tries = int(tries / 2);
+		if (Stopped())
+			break;
+	}
+	if (std::fabs(mod_gain) < THRESHOLD)
+		to_be_moved.assign(n, 1);
+	return mod_gain;
+}
+
+template<typename GraphT>
+void ComboEngine<GraphT>::ReCalc(GraphT& graph, MoveGains& move_gains, SplitsCommunities& splits_communities,
+	size_t origin, size_t destination)
+{
+	move_gains[origin][destination] = 0;
+	if (origin != destination) {
+		ScopedTimer timer(m_stats != nullptr ? &m_stats->split_seconds : nullptr);
+		std::vector<size_t> orig_comm_ind = graph.CommunityIndices(origin);
+		if (!orig_comm_ind.empty()) {
+			std::vector<double> correction_vector = graph.GetCorrectionVector(orig_comm_ind, destination);
+			std::vector<int> to_be_moved(orig_comm_ind.size());
+			Submatrix Q = graph.GetModularitySubmatrix(orig_comm_ind);
+			if (m_stats != nullptr) {
+				size_t bytes = Q.MemoryBytes() + splits_communities.size() * (graph.Size() / 8 + sizeof(std::vector<bool>));
+				for (const std::vector<double>& row : move_gains)
+					bytes += row.capacity() * sizeof(double) + sizeof(row);
+				m_stats->peak_run_bytes = std::max(m_stats->peak_run_bytes, bytes);
+			}
+			move_gains[origin][destination] = Split(Q, correction_vector, to_be_moved);
+			for (size_t i = 0; i < to_be_moved.size(); ++i)
+				splits_communities[destination][orig_comm_ind[i]] = to_be_moved[i];
+		}
+	}
+}
+
+template<typename GraphT>
+double ComboEngine<GraphT>::BestGain(const MoveGains& move_gains, size_t& origin, size_t& destination)
+{
+	double best_gain = -1;
+	for (size_t i = 0; i < move_gains.size(); ++i)
+		for (size_t j = 0; j < move_gains[i].size(); ++j)
+			if (best_gain < move_gains[i][j]) {
+				best_gain = move_gains[i][j];
+				origin = i;
+				destination = j;
+			}
+	return best_gain;
+}
+
+template<typename GraphT>
+bool ComboEngine<GraphT>::DeleteCommunityIfEmpty(GraphT& graph, MoveGains& move_gains, SplitsCommunities& splits_communities,
+	size_t origin)
+{
+	ScopedTimer timer(m_stats != nullptr ? &m_stats->deletion_seconds : nullptr);
+	if (!graph.DeleteCommunityIfEmpty(origin))
+		return false;
+	for (size_t i = origin; i+1 < move_gains.size(); ++i)
+		move_gains[i] = move_gains[i+1];
+	move_gains.back().assign(move_gains.back().size(), 0);
+	for (size_t i = 0; i < move_gains.size(); ++i) {
+		for (size_t j = origin; j+1 < move_gains[i].size(); ++j)
+			move_gains[i][j] = move_gains[i][j+1];
+		move_gains[i].back() = 0;
+	}
+	for (size_t i = origin; i+1 < splits_communities.size(); ++i)
+		splits_communities[i] = splits_communities[i+1];
+	splits_communities.back().assign(splits_communities.back().size(), false);
+	return true;
+}
+
+template<typename GraphT>
+bool ComboEngine<GraphT>::Run(GraphT& graph, std::optional<size_t> max_communities, bool start_separate,
+	IntermediateResults* intermediate_results, const std::optional<std::vector<size_t>>& initial_communities)
+{
+	if (!max_communities.has_value())
+		max_communities = graph.Size();
+	if (initial_communities.has_value())
+		graph.SetCommunities(initial_communities.value());
+	else {
+		std::vector<size_t> initial_comm(graph.Size(), 0);
+		if (start_separate)
+			std::iota(initial_comm.begin(), initial_comm.end(), 0);
+		graph.SetCommunities(initial_comm);
+	}
+	m_iteration = 0;
+	m_number_of_communities = graph.NumberOfCommunities();
+	m_modularity = m_progress || m_partitions || m_stats != nullptr ? graph.Modularity() : 0;
+	if (m_stats != nullptr)
+		m_stats->modularity_trajectory.assign(1, m_modularity);
+	m_stopped = false;
+	if (intermediate_results != nullptr)
+		intermediate_results->Write(0, graph.Communities());
+	if (m_partitions && !m_partitions(m_iteration, graph.Communities(), m_modularity))
+		m_stopped = true;
+	if (m_output_info_level > 0) {
+		std::cout << "0. " << graph.NumberOfCommunities() << " communities, "
+			<< "initial modularity = " << graph.Modularity() << std::endl;
+	}
+	// number of destinations includes a new (empty) community while the limit is not reached
+	auto destinations = [&]() {return graph.NumberOfCommunities() + (graph.NumberOfCommunities() < max_communities);};
+	MoveGains move_gains(graph.NumberOfCommunities(), std::vector<double>(destinations(), 0)); //results of splitting communities
+	//vectors of boolean meaning that corresponding vertex should be moved to that destination
+	SplitsCommunities splits_communities(destinations(), std::vector<bool>(graph.Size(), false)); //best split vectors
+	m_current_best_gain = 1;
+	size_t origin = 0, destination = 0;
+	for (origin = 0; origin < graph.NumberOfCommunities() && !Stopped(); ++origin)
+		for (destination = 0; destination < destinations(); ++destination)
+			ReCalc(graph, move_gains, splits_communities, origin, destination);
+	m_current_best_gain = BestGain(move_gains, origin, destination);
+	bool converged = true;
+	while (m_current_best_gain > THRESHOLD) {
+		if (Stopped() || (m_max_iterations.has_value() && m_iteration >= m_max_iterations.value())) {
+			converged = false;
+			break;
+		}
+		++m_iteration;
+		bool community_added = destination >= graph.NumberOfCommunities();
+		if (destination > graph.NumberOfCommunities()) {
+			std::cerr << "WARNING: in Run, destination community is greater than number of communities." << std::endl;
+			destination = graph.NumberOfCommunities();
+		}
+		graph.PerformSplit(origin, destination, splits_communities[destination]);
+		bool origin_became_empty = DeleteCommunityIfEmpty(graph, move_gains, splits_communities, origin);
+		if (origin_became_empty) {
+			if (community_added)
+				std::cerr << "WARNING: moving ALL nodes to EMPTY community should not occur." << std::endl;
+			community_added = false;
+			if (origin < destination)
+				--destination;
+		}
+		m_number_of_communities = graph.NumberOfCommunities();
+		m_modularity += m_current_best_gain;
+		if (m_stats != nullptr) {
+			++m_stats->splits_accepted;
+			m_stats->modularity_trajectory.push_back(m_modularity);
+		}
+		if (m_output_info_level > 0) {
+			std::cout << m_iteration << ". " << graph.NumberOfCommunities() << " communities, "
+				<< "modularity = " << graph.Modularity() << ", last modularity gain = " << m_current_best_gain << std::endl;
+		}
+		if (intermediate_results != nullptr)
+			intermediate_results->Write(m_iteration, graph.Communities());
+		if (m_partitions && !m_partitions(m_iteration, graph.Communities(), m_modularity))
+			m_stopped = true;
+		if (community_added) {
+			if (destination + 1 < max_communities) {
+				for (auto& row : move_gains) {
+					if (destination + 1 >= row.size())
+						row.push_back(row[destination]);
+					else
+						row[destination + 1] = row[destination];
+				}
+				if (destination + 1 >= splits_communities.size())
+					splits_communities.push_back(splits_communities[destination]);
+				else
+					splits_communities[destination + 1] = splits_communities[destination];
+			}
+			if (destination >= move_gains.size())
+				move_gains.push_back(std::vector<double>(move_gains.back().size(), 0));
+		}
+		for (size_t i = 0; i < destinations() && !Stopped(); ++i) {
+			ReCalc(graph, move_gains, splits_communities, destination, i);
+			if (i < graph.NumberOfCommunities())
+				ReCalc(graph, move_gains, splits_communities, i, destination);
+			if (!origin_became_empty && i != destination) {
+				ReCalc(graph, move_gains, splits_communities, origin, i);
+				if (i < graph.NumberOfCommunities())
+					ReCalc(graph, move_gains, splits_communities, i, origin);
+			}
+		}
+		m_current_best_gain = BestGain(move_gains, origin, destination);
+	}
+	// gains computed after the run was stopped may be incomplete, so that best gain may seem to be below THRESHOLD
+	if (m_stopped)
+		converged = false;
+	if (intermediate_results != nullptr)
+		intermediate_results->Finish(m_iteration, graph.Communities());
+	if (m_output_info_level > 0 && !converged)
+		std::cout << "Stopped after " << m_iteration << " iterations" << std::endl;
+	if (m_output_info_level > 0) {
+		std::cout << "Finished with " << graph.NumberOfCommunities() << " communities, "
+			<< "achieved modularity = " << graph.Modularity() << std::endl;
+	}
+	return converged;
+}
+
+#endif //COMBO_ENGINE_H
@@ -0,0 +1,239 @@
+#ifndef COMBO_RUN_H
+#define COMBO_RUN_H
+
+#include "ComboEngine.h"
+
+#include <algorithm>
+#include <atomic>
+#include <chrono>
+#include <cstdint>
+#include <exception>
+#include <functional>
+#include <optional>
+#include <random>
+#include <stdexcept>
+#include <string>
+#include <thread>
+#include <unordered_map>
+#include <vector>
+
+// Called by runs with iteration, number of communities and modularity between Kernighan-Lin shifts
+// (that is often, and from several threads at once), returns false to stop the run
+typedef std::function<bool(size_t, size_t, double)> ProgressCallback;
+// Called by a run with iteration, partition (valid during the call only) and its modularity
+// before the first and after each iteration, returns false to stop the run
+typedef std::function<bool(size_t, const std::vector<size_t>&, double)> PartitionCallback;
+
+// Parameters of ComboEngine and its runs
+struct ComboSettings
+{
+	std::optional<size_t> max_communities;
+	int num_split_attempts = 0;
+	int fixed_split_step = 0;
+	bool start_separate = false;
+	int verbose = 0;
+	std::optional<std::string> intermediate_results_path;
+	IntermediateResultsFormat intermediate_results_format = IntermediateResultsFormat::TEXT;
+	// partitions of every stride-th iteration (and of the last one) are written, see IntermediateResults
+	size_t intermediate_results_stride = 1;
+	std::optional<uint_fast32_t> random_seed;
+	// number of independent runs with seeds derived from random_seed, the best one is returned
+	size_t n_restarts = 1;
+	// number of threads running restarts, 0 means number of hardware threads
+	size_t n_threads = 1;
+	// keep communities and modularity of every restart in ComboResult::restarts
+	bool return_restarts = false;
+	// partition every run starts from (any labels), instead of one community or start_separate
+	std::optional<std::vector<size_t>> initial_communities;
+	// graphs with more nodes are coarsened to about this many nodes before Combo runs, see RunMultilevel
+	std::optional<size_t> coarsen_to;
+	// runs (all restarts and components) stop at this time, keeping the best partition found so far
+	std::optional<std::chrono::steady_clock::time_point> deadline;
+	// maximum number of Combo iterations (applied splits) of each run
+	std::optional<size_t> max_iterations;
+	// progress of each run of Combo, see ComboEngine::SetProgress
+	ProgressCallback progress;
+	// collect counters and timings of runs in ComboResult::stats
+	bool collect_stats = false;
+	// partitions of iterations of a single run, see ComboEngine::SetPartitions
+	PartitionCallback partitions;
+
+	// partitions of iterations are written to a file or passed to a callback, which only a single run can do
+	bool TracesPartitions() const
+	{
+		return (intermediate_results_path.has_value() && !intermediate_results_path.value().empty()) || bool(partitions);
+	}
+};
+
+struct ComboResult
+{
+	std::vector<size_t> communities;
+	double modularity = 0;
+	// false if the run was stopped by deadline, max_iterations or progress before Combo converged
+	bool converged = true;
+	// results of all restarts in order of their seeds, if requested
+	std::vector<ComboResult> restarts;
+	// if requested: summed up over all restarts, with modularity trajectory of the returned one
+	RunStats stats;
+};
+
+// Result with the highest modularity (the earliest one among equal ones) with stats of all results,
+// keeping all results as restarts if requested
+inline ComboResult BestResult(std::vector<ComboResult>&& results, const ComboSettings& settings)
+{
+	size_t best = 0;
+	for (size_t restart = 1; restart < results.size(); ++restart)
+		if (results[restart].modularity > results[best].modularity)
+			best = restart;
+	ComboResult result = results[best];
+	if (settings.collect_stats) {
+		result.stats = RunStats();
+		for (const ComboResult& restart : results)
+			result.stats.Add(restart.stats);
+		result.stats.modularity_trajectory = results[best].stats.modularity_trajectory;
+	}
+	if (settings.return_restarts)
+		result.restarts = std::move(results);
+	return result;
+}
+
+// Seed of restart: random_seed for the first one, derived from random_seed and restart index for others
+inline uint_fast32_t RestartSeed(uint_fast32_t random_seed, size_t restart)
+{
+	if (restart == 0)
+		return random_seed;
+	std::seed_seq sequence{uint32_t(random_seed), uint32_t(restart)};
+	uint32_t seed;
+	sequence.generate(&seed, &seed + 1);
+	return seed;
+}
+
+// Calls func(index) for each index in [0, count) on n_threads threads (0 means number of hardware threads),
+// the calling thread being one of them, and rethrows the first exception after all threads are finished
+template<typename Func>
+void ParallelFor(size_t count, size_t n_threads, Func&& func)
+{
+	n_threads = n_threads > 0 ? n_threads : std::max(1u, std::thread::hardware_concurrency());
+	n_threads = std::min(n_threads, count);
+	if (n_threads <= 1) {
+		for (size_t index = 0; index < count; ++index)
+			func(index);
+		return;
+	}
+	std::atomic<size_t> next_index(0);
+	std::vector<std::exception_ptr> errors(n_threads);
+	auto work = [&](size_t t) {
+		try {
+			for (size_t index = next_index++; index < count; index = next_index++)
+				func(index);
+		} catch (...) {
+			errors[t] = std::current_exception();
+		}
+	};
+	std::vector<std::thread> threads;
+	for (size_t t = 1; t < n_threads; ++t)
+		threads.emplace_back(work, t);
+	work(0);
+	for (std::thread& thread : threads)
+		thread.join();
+	for (const std::exception_ptr& error : errors)
+		if (error)
+			std::rethrow_exception(error);
+}
+
+// Relabels communities to 0, 1, ... in order of their first occurrence
+inline std::vector<size_t> RelabelCommunities(const std::vector<size_t>& communities)
+{
+	std::unordered_map<size_t, size_t> labels;
+	std::vector<size_t> relabeled(communities.size());
+	for (size_t i = 0; i < communities.size(); ++i)
+		relabeled[i] = labels.emplace(communities[i], labels.size()).first->second;
+	return relabeled;
+}
+
+// Runs Combo on copies of graph (sharing modularity matrix) settings.n_restarts times
+// on settings.n_threads threads and returns the partition with the highest modularity
+// (the earliest restart among equal ones).
+template<typename GraphT>
+ComboResult RunCombo(const GraphT& graph, const ComboSettings& settings)
+{
+	if (settings.n_restarts == 0)
+		throw std::invalid_argument("n_restarts must be positive");
+	if (settings.n_restarts > 1 && settings.TracesPartitions())
+		throw std::invalid_argument("intermediate results can not be used with several restarts");
+	std::optional<std::vector<size_t>> initial_communities;
+	if (settings.initial_communities.has_value()) {
+		if (settings.initial_communities.value().size() != graph.Size())
+			throw std::invalid_argument("initial communities must be given for all " + std::to_string(graph.Size()) + " nodes");
+		if (settings.start_separate)
+			throw std::invalid_argument("start_separate can not be used with initial communities");
+		initial_communities = RelabelCommunities(settings.initial_communities.value());
+		size_t number = initial_communities.value().empty() ? 0 : 1 + *std::max_element(
+			initial_communities.value().begin(), initial_communities.value().end());
+		if (settings.max_communities.has_value() && number > settings.max_communities.value())
+			throw std::invalid_argument("initial communities exceed max_communities");
+	}
+	// default time based seed of engines coincides for runs started at the same time from different threads
+	uint_fast32_t random_seed = settings.random_seed.has_value() ? settings.random_seed.value() : std::random_device()();
+	std::vector<ComboResult> results(settings.n_restarts);
+	auto run = [&](size_t restart) {
+		GraphT restart_graph(graph);
+		ComboEngine<GraphT> combo(RestartSeed(random_seed, restart), settings.num_split_attempts,
+			settings.fixed_split_step, settings.verbose);
+		combo.SetLimits(settings.deadline, settings.max_iterations);
+		if (settings.progress)
+			combo.SetProgress(settings.progress);
+		if (settings.collect_stats)
+			combo.SetStats(&results[restart].stats);
+		if (settings.partitions)
+			combo.SetPartitions(settings.partitions);
+		std::optional<IntermediateResults> intermediate_results;
+		if (settings.intermediate_results_path.has_value() && !settings.intermediate_results_path.value().empty())
+			intermediate_results.emplace(settings.intermediate_results_path.value(), settings.intermediate_results_format,
+				settings.intermediate_results_stride, graph.Size());
+		results[restart].converged = combo.Run(restart_graph, settings.max_communities, settings.start_separate,
+			intermediate_results.has_value() ? &intermediate_results.value() : nullptr, initial_communities);
+		results[restart].communities = restart_graph.Communities();
+		results[restart].modularity = restart_graph.Modularity();
+	};
+	ParallelFor(settings.n_restarts, settings.n_threads, run);
+	return BestResult(std::move(results), settings);
+}
+
+// Partition with the highest modularity among all partitions of a small graph, enumerated as
+// restricted growth strings (Bell(n) of them); a split has to gain more than THRESHOLD, as in Combo.
+// Result is the same for all restarts.
+template<typename GraphT>
+ComboResult SolveExhaustively(const GraphT& graph, const ComboSettings& settings)
+{
+	size_t n = graph.Size();
+	GraphT partitioned(graph);
+	// labels[i] <= 1 + max(labels[0..i-1])
+	std::vector<size_t> labels(n, 0);
+	ComboResult result;
+	result.modularity = -INF;
+	while (true) {
+		partitioned.SetCommunities(labels);
+		double modularity = partitioned.Modularity();
+		if (result.communities.empty() || modularity > result.modularity + THRESHOLD) {
+			result.communities = labels;
+			result.modularity = modularity;
+		}
+		std::vector<size_t> prefix_maxima(n, 0);
+		for (size_t j = 0; j < n; ++j)
+			prefix_maxima[j] = std::max(j > 0 ? prefix_maxima[j - 1] : 0, labels[j]);
+		// increment the last label that may grow and reset labels after it
+		size_t i = n;
+		while (i > 1 && labels[i - 1] > prefix_maxima[i - 2])
+			--i;
+		if (i <= 1)
+			break;
+		++labels[i - 1];
+		std::fill(labels.begin() + i, labels.end(), 0);
+	}
+	if (settings.return_restarts)
+		result.restarts.assign(settings.n_restarts, ComboResult{result.communities, result.modularity, true, {}});
+	return result;
+}
+
+#endif //COMBO_RUN_H
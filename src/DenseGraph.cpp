@@ -0,0 +1,161 @@
+#include "DenseGraph.h"
+
+#include <algorithm>
+#include <cmath>
+#include <limits>
+#include <stdexcept>
+#include <utility>
+
+using std::vector;
+
+void DenseGraph::Submatrix::AddToDiagonal(const vector<double>& shift)
+{
+	for (size_t i = 0; i < Size(); ++i)
+		m_matrix[i][i] += shift[i];
+}
+
+double DenseGraph::Submatrix::ModularityGain(const vector<double>& correction_vector, const vector<int>& communities) const
+{
+	size_t n = Size();
+	double mod_gain = 0.0;
+	for (size_t i = 0; i < n; ++i) {
+		for (size_t j = 0; j < n; ++j)
+			if (communities[i] == communities[j])
+				mod_gain += m_matrix[i][j];
+			else
+				mod_gain -= m_matrix[i][j];
+	}
+	mod_gain *= 0.5;
+	for (size_t i = 0; i < n; ++i) {
+		if (communities[i])
+			mod_gain += correction_vector[i];
+		else
+			mod_gain -= correction_vector[i];
+	}
+	return mod_gain;
+}
+
+DenseGraph::Submatrix::ShiftGains DenseGraph::Submatrix::MoveGains(const vector<double>& correction_vector,
+	const vector<int>& communities) const
+{
+	size_t n = Size();
+	ShiftGains shift_gains;
+	shift_gains.m_matrix = &m_matrix;
+	shift_gains.m_communities = communities;
+	vector<double>& gains = shift_gains.m_gains;
+	gains.assign(n, 0.0);
+	for (size_t i = 0; i < n; ++i) {
+		for (size_t j = 0; j < n; ++j)
+			if (i != j) {
+				if (communities[i] == communities[j])
+					gains[i] -= m_matrix[i][j];
+				else
+					gains[i] += m_matrix[i][j];
+			}
+		if (communities[i])
+			gains[i] -= correction_vector[i];
+		else
+			gains[i] += correction_vector[i];
+		gains[i] *= 2;
+	}
+	return shift_gains;
+}
+
+size_t DenseGraph::Submatrix::ShiftGains::Best(double& gain) const
+{
+	vector<double>::const_iterator it = std::max_element(m_gains.begin(), m_gains.end());
+	gain = *it;
+	return size_t(it - m_gains.begin());
+}
+
+void DenseGraph::Submatrix::ShiftGains::Move(size_t moved)
+{
+	// gains of nodes moved before stay at -INF whatever their part is
+	const Matrix& matrix = *m_matrix;
+	for (size_t j = 0; j < m_gains.size(); ++j)
+		if (m_communities[moved] == m_communities[j])
+			m_gains[j] += 4 * matrix[moved][j];
+		else
+			m_gains[j] -= 4 * matrix[moved][j];
+	m_gains[moved] = -INF;
+}
+
+size_t DenseGraph::Submatrix::MemoryBytes() const
+{
+	size_t bytes = m_matrix.capacity() * sizeof(vector<double>);
+	for (const vector<double>& row : m_matrix)
+		bytes += row.capacity() * sizeof(double);
+	return bytes;
+}
+
+DenseGraph::DenseGraph(Matrix&& modularity_matrix) :
+	PartitionedGraph(modularity_matrix.size()),
+	m_matrix(std::make_shared<const Matrix>(std::move(modularity_matrix)))
+{
+	for (const vector<double>& row : *m_matrix)
+		if (row.size() != Size())
+			throw std::invalid_argument("matrix must be a square matrix");
+}
+
+DenseGraph::DenseGraph(Matrix&& modularity_matrix, NullModel&& null_model, double modularity_resolution) :
+	DenseGraph(std::move(modularity_matrix))
+{
+	if (null_model.out.size() != Size() || null_model.in.size() != Size())
+		throw std::invalid_argument("strengths must be given for all nodes");
+	m_null_model = std::make_shared<const NullModel>(std::move(null_model));
+	m_modularity_resolution = modularity_resolution;
+}
+
+// Q_ij = A_ij / T - resolution * out_i * in_j, symmetrized as (Q_ij + Q_ji) / 2 for directed graphs
+double DenseGraph::Adjacency(size_t i, size_t j) const
+{
+	const vector<double>& out = m_null_model->out;
+	const vector<double>& in = m_null_model->in;
+	double term = m_modularity_resolution * out[i]*in[j];
+	if (m_null_model->is_directed)
+		term = (term + m_modularity_resolution * out[j]*in[i]) / 2;
+	double value = (*m_matrix)[i][j] + term;
+	// rounding residue of the null model term (e.g. computed with fused multiply-add) where there is no edge
+	if (std::fabs(value) <= 4 * std::numeric_limits<double>::epsilon() * std::fabs(term))
+		return 0;
+	return value;
+}
+
+size_t DenseGraph::MemoryBytes() const
+{
+	size_t bytes = sizeof(Matrix) + m_matrix->capacity() * sizeof(vector<double>);
+	for (const vector<double>& row : *m_matrix)
+		bytes += row.capacity() * sizeof(double);
+	if (m_null_model)
+		bytes += (m_null_model->out.capacity() + m_null_model->in.capacity()) * sizeof(double);
+	return bytes;
+}
+
+double DenseGraph::Modularity() const
+{
+	if (m_communities.empty())
+		return 0;
+	const Matrix& matrix = *m_matrix;
+	double modularity = 0;
+	for (size_t i = 0; i < Size(); ++i)
+		for (size_t j = 0; j < Size(); ++j)
+			if (m_communities[i] == m_communities[j])
+				modularity += matrix[i][j];
+	return modularity;
+}
+
+DenseGraph::Submatrix DenseGraph::GetModularitySubmatrix(const vector<size_t>& indices) const
+{
+	return Submatrix(::Submatrix(*m_matrix, indices));
+}
+
+vector<double> DenseGraph::GetCorrectionVector(const vector<size_t>& indices, size_t community) const
+{
+	const Matrix& matrix = *m_matrix;
+	vector<size_t> community_indices = CommunityIndices(community);
+	vector<double> res(indices.size(), 0.0);
+	for (size_t i = 0; i < indices.size(); ++i)
+		for (size_t j : community_indices)
+			res[i] += matrix[j][indices[i]];
+	return res;
+}
@@ -0,0 +1,77 @@
+#ifndef DENSE_GRAPH_H
+#define DENSE_GRAPH_H
+
+#include "Combo/Matrix.h"
+#include "ModularityMatrix.h"
+#include "PartitionedGraph.h"
+
+#include <cstddef>
+#include <memory>
+#include <vector>
+
+// Graph storing dense modularity matrix, as Graph from src/Combo does,
+// with split kernels performing the same arithmetic as ComboAlgorithm,
+// so ComboEngine<DenseGraph> reproduces ComboAlgorithm results exactly.
+// Copies of the graph share the matrix and keep own communities.
+class DenseGraph : public PartitionedGraph
+{
+public:
+	// Modularity submatrix over a subset of nodes, see SparseGraph::Submatrix for the interface
+	class Submatrix
+	{
+	public:
+		explicit Submatrix(Matrix&& matrix) : m_matrix(std::move(matrix)) {}
+		size_t Size() const {return m_matrix.size();}
+		const std::vector<double>& Row(size_t i) const {return m_matrix[i];}
+		std::vector<double> RowSums() const {return Sum(m_matrix, 1);}
+		std::vector<double> PositiveRowSums() const {return Sum(m_matrix, 1, Positive);}
+		void AddToDiagonal(const std::vector<double>& shift);
+		double ModularityGain(const std::vector<double>& correction_vector, const std::vector<int>& communities) const;
+		class ShiftGains
+		{
+		public:
+			size_t Best(double& gain) const;
+			void Move(size_t moved);
+
+		private:
+			friend class Submatrix;
+			const Matrix* m_matrix;
+			// parts before the shift
+			std::vector<int> m_communities;
+			// -INF for moved nodes
+			std::vector<double> m_gains;
+		};
+		ShiftGains MoveGains(const std::vector<double>& correction_vector, const std::vector<int>& communities) const;
+		size_t MemoryBytes() const;
+
+	private:
+		Matrix m_matrix;
+	};
+
+	// matrix must be symmetric modularity matrix, e.g. built by ModularityMatrixFrom* functions
+	explicit DenseGraph(Matrix&& modularity_matrix);
+	// with null model and resolution the matrix was built with, so that adjacency matrix can be recovered from it
+	DenseGraph(Matrix&& modularity_matrix, NullModel&& null_model, double modularity_resolution);
+
+	const Matrix& ModularityMatrix() const {return *m_matrix;}
+	// null model the matrix was built with, nullptr if it is not known (e.g. for matrix read from file)
+	const NullModel* GetNullModel() const {return m_null_model.get();}
+	double ModularityResolution() const {return m_modularity_resolution;}
+	// entry of symmetric adjacency matrix B (divided by the total weight), Q plus the null model term computed as
+	// ModularityMatrixFrom* functions compute it, zero where there is no edge; requires null model
+	double Adjacency(size_t i, size_t j) const;
+	// bytes allocated for the matrix (shared by copies), communities are not counted
+	size_t MemoryBytes() const;
+
+	double Modularity() const;
+	Submatrix GetModularitySubmatrix(const std::vector<size_t>& indices) const;
+	// sum of Q_ji over j in `community` for each i in `indices`
+	std::vector<double> GetCorrectionVector(const std::vector<size_t>& indices, size_t community) const;
+
+private:
+	std::shared_ptr<const Matrix> m_matrix;
+	std::shared_ptr<const NullModel> m_null_model;
+	double m_modularity_resolution = 1;
+};
+
+#endif //DENSE_GRAPH_H
@@ -0,0 +1,245 @@
+#include "DynamicGraph.h"
+
+#include <algorithm>
+#include <cmath>
+#include <limits>
+#include <numeric>
+#include <set>
+#include <stdexcept>
+
+using std::vector;
+
+size_t DynamicGraph::NumberOfEdges() const
+{
+	size_t entries = 0, loops = 0;
+	for (size_t i = 0; i < Size(); ++i) {
+		entries += m_weights[i].size();
+		loops += m_weights[i].count(i);
+	}
+	return m_is_directed ? entries : (entries + loops) / 2;
+}
+
+void DynamicGraph::AddNodes(size_t size)
+{
+	for (size_t i = Size(); i < size; ++i) {
+		m_communities.push_back(m_next_label);
+		m_aggregates[m_next_label++].members.push_back(i);
+	}
+	m_weights.resize(size);
+	if (m_is_directed)
+		m_reverse_weights.resize(size);
+	m_out.resize(size, 0.0);
+	m_in.resize(size, 0.0);
+}
+
+double DynamicGraph::Weight(size_t source, size_t destination) const
+{
+	auto it = m_weights[source].find(destination);
+	return it == m_weights[source].end() ? 0.0 : it->second;
+}
+
+void DynamicGraph::SetWeight(size_t source, size_t destination, double weight)
+{
+	auto set = [weight](std::unordered_map<size_t, double>& weights, size_t node) {
+		if (weight == 0)
+			weights.erase(node);
+		else
+			weights[node] = weight;
+	};
+	double delta = weight - Weight(source, destination);
+	set(m_weights[source], destination);
+	if (m_is_directed)
+		set(m_reverse_weights[destination], source);
+	else if (source != destination)
+		set(m_weights[destination], source);
+	// undirected edge contributes to B_sd and B_ds (or twice to B_ss) and to strengths of both ends
+	double factor = m_is_directed ? 1 : 2;
+	m_total_weight += factor * delta;
+	m_changed_weight += factor * std::abs(delta);
+	Aggregate& source_community = m_aggregates[m_communities[source]];
+	Aggregate& destination_community = m_aggregates[m_communities[destination]];
+	m_out[source] += delta;
+	m_in[destination] += delta;
+	source_community.out += delta;
+	destination_community.in += delta;
+	if (!m_is_directed) {
+		m_out[destination] += delta;
+		m_in[source] += delta;
+		destination_community.out += delta;
+		source_community.in += delta;
+	}
+	if (m_communities[source] == m_communities[destination])
+		source_community.internal += factor * delta;
+	m_touched.insert(source);
+	m_touched.insert(destination);
+}
+
+void DynamicGraph::CheckEdges(const vector<size_t>& sources, const vector<size_t>& destinations, size_t num_weights) const
+{
+	if (destinations.size() != sources.size() || num_weights != sources.size())
+		throw std::invalid_argument("sources, destinations and weights must have the same length");
+	for (size_t k = 0; k < sources.size(); ++k)
+		if (sources[k] >= Size() || destinations[k] >= Size() || !m_weights[sources[k]].count(destinations[k]))
+			throw std::invalid_argument("edge (" + std::to_string(sources[k]) + ", " + std::to_string(destinations[k])
+				+ ") does not exist");
+}
+
+void DynamicGraph::AddEdges(const vector<size_t>& sources, const vector<size_t>& destinations, const vector<double>& weights)
+{
+	if (destinations.size() != sources.size() || weights.size() != sources.size())
+		throw std::invalid_argument("sources, destinations and weights must have the same length");
+	size_t size = Size();
+	for (size_t k = 0; k < sources.size(); ++k)
+		size = std::max(size, std::max(sources[k], destinations[k]) + 1);
+	AddNodes(size);
+	for (size_t k = 0; k < sources.size(); ++k)
+		SetWeight(sources[k], destinations[k], Weight(sources[k], destinations[k]) + weights[k]);
+}
+
+void DynamicGraph::RemoveEdges(const vector<size_t>& sources, const vector<size_t>& destinations)
+{
+	CheckEdges(sources, destinations, sources.size());
+	for (size_t k = 0; k < sources.size(); ++k)
+		SetWeight(sources[k], destinations[k], 0.0);
+}
+
+void DynamicGraph::UpdateWeights(const vector<size_t>& sources, const vector<size_t>& destinations, const vector<double>& weights)
+{
+	CheckEdges(sources, destinations, weights.size());
+	for (size_t k = 0; k < sources.size(); ++k)
+		SetWeight(sources[k], destinations[k], weights[k]);
+}
+
+double DynamicGraph::Drift() const
+{
+	if (m_total_weight_at_solve <= 0)
+		return m_changed_weight > 0 ? std::numeric_limits<double>::infinity() : 0.0;
+	return m_changed_weight / m_total_weight_at_solve;
+}
+
+double DynamicGraph::Modularity() const
+{
+	if (m_total_weight <= 0)
+		return 0;
+	double modularity = 0;
+	for (const auto& [label, aggregate] : m_aggregates)
+		modularity += aggregate.internal / m_total_weight
+			- m_modularity_resolution * aggregate.out * aggregate.in / (m_total_weight * m_total_weight);
+	return modularity;
+}
+
+SparseGraph DynamicGraph::Subgraph(const vector<size_t>& nodes) const
+{
+	std::unordered_map<size_t, size_t> local_indices;
+	local_indices.reserve(nodes.size());
+	for (size_t k = 0; k < nodes.size(); ++k)
+		local_indices[nodes[k]] = k;
+	double total_weight = m_total_weight > 0 ? m_total_weight : 1.0;
+	SparseGraphBuilder builder(nodes.size());
+	std::vector<double>& out = builder.OutStrengths();
+	std::vector<double>& in = builder.InStrengths();
+	for (size_t k = 0; k < nodes.size(); ++k) {
+		size_t i = nodes[k];
+		for (const auto& [j, weight] : m_weights[i]) {
+			auto local = local_indices.find(j);
+			if (local == local_indices.end())
+				continue;
+			double value = weight / total_weight;
+			// same entries as SparseGraphFromEdges adds for edge (i, j)
+			if (m_is_directed)
+				builder.AddSymmetric(k, local->second, i == j ? value : value / 2);
+			else if (i < j)
+				builder.AddSymmetric(k, local->second, value);
+			else if (i == j)
+				builder.AddSymmetric(k, k, 2 * value);
+		}
+		out[k] = m_out[i] / total_weight;
+		in[k] = m_in[i] / total_weight;
+	}
+	return builder.Build(m_modularity_resolution, m_is_directed || m_total_weight <= 0 ? total_weight : total_weight / 2,
+		m_is_directed);
+}
+
+SparseGraph DynamicGraph::GetSparseGraph() const
+{
+	vector<size_t> nodes(Size());
+	std::iota(nodes.begin(), nodes.end(), 0);
+	return Subgraph(nodes);
+}
+
+void DynamicGraph::SetCommunities(const vector<size_t>& nodes, const vector<size_t>& labels)
+{
+	for (size_t i : nodes)
+		m_aggregates.erase(m_communities[i]);
+	for (size_t k = 0; k < nodes.size(); ++k)
+		m_communities[nodes[k]] = labels[k];
+	for (size_t i : nodes) {
+		Aggregate& aggregate = m_aggregates[m_communities[i]];
+		aggregate.members.push_back(i);
+		aggregate.out += m_out[i];
+		aggregate.in += m_in[i];
+		for (const auto& [j, weight] : m_weights[i])
+			if (m_communities[j] == m_communities[i])
+				aggregate.internal += weight;
+		// B_ii of undirected graph is twice the loop weight
+		if (!m_is_directed)
+			aggregate.internal += Weight(i, i);
+	}
+}
+
+size_t DynamicGraph::Optimize(const ComboSettings& settings)
+{
+	if (m_touched.empty())
+		return 0;
+	std::set<size_t> labels;
+	for (size_t i : m_touched)
+		labels.insert(m_communities[i]);
+	vector<size_t> nodes;
+	for (size_t label : labels) {
+		const vector<size_t>& members = m_aggregates[label].members;
+		nodes.insert(nodes.end(), members.begin(), members.end());
+	}
+	std::sort(nodes.begin(), nodes.end());
+	ComboSettings local_settings = settings;
+	local_settings.start_separate = false;
+	local_settings.intermediate_results_path = std::nullopt;
+	local_settings.partitions = nullptr;
+	local_settings.return_restarts = false;
+	local_settings.initial_communities = vector<size_t>(nodes.size());
+	for (size_t k = 0; k < nodes.size(); ++k)
+		local_settings.initial_communities.value()[k] = m_communities[nodes[k]];
+	if (settings.max_communities.has_value()) {
+		size_t others = NumberOfCommunities() - labels.size();
+		size_t limit = settings.max_communities.value();
+		local_settings.max_communities = std::max(labels.size(), limit > others ? limit - others : 0);
+	}
+	ComboResult result = RunCombo(Subgraph(nodes), local_settings);
+	// labels of re-partitioned communities are reused, new communities get new labels
+	vector<size_t> reused(labels.begin(), labels.end());
+	size_t number = 1 + *std::max_element(result.communities.begin(), result.communities.end());
+	vector<size_t> new_labels(nodes.size());
+	for (size_t k = 0; k < nodes.size(); ++k) {
+		size_t community = result.communities[k];
+		new_labels[k] = community < reused.size() ? reused[community] : m_next_label + community - reused.size();
+	}
+	if (number > reused.size())
+		m_next_label += number - reused.size();
+	SetCommunities(nodes, new_labels);
+	m_touched.clear();
+	return nodes.size();
+}
+
+void DynamicGraph::Solve(const ComboSettings& settings)
+{
+	m_total_weight_at_solve = m_total_weight;
+	m_changed_weight = 0;
+	m_touched.clear();
+	if (Size() == 0)
+		return;
+	ComboResult result = RunCombo(GetSparseGraph(), settings);
+	vector<size_t> nodes(Size());
+	std::iota(nodes.begin(), nodes.end(), 0);
+	m_aggregates.clear();
+	m_next_label = 1 + *std::max_element(result.communities.begin(), result.communities.end());
+	SetCommunities(nodes, result.communities);
+}
@@ -0,0 +1,87 @@
+#ifndef DYNAMIC_GRAPH_H
+#define DYNAMIC_GRAPH_H
+
+#include "ComboRun.h"
+#include "SparseGraph.h"
+
+#include <cstddef>
+#include <unordered_map>
+#include <unordered_set>
+#include <vector>
+
+// Graph under a stream of edge updates together with its partition.
+// Edge weights, node strengths and per-community sums are updated in O(1) per changed edge,
+// so modularity of the partition is known at any time without touching the whole graph.
+// Optimize re-partitions only communities containing endpoints of changed edges:
+// Combo runs on the modularity submatrix over their nodes (a SparseGraph with the global
+// null model), so the other communities stay fixed and their contribution is unchanged.
+// Solve re-partitions the whole graph, e.g. when Drift shows the graph has changed a lot.
+class DynamicGraph
+{
+public:
+	DynamicGraph(bool is_directed, double modularity_resolution) :
+		m_is_directed(is_directed), m_modularity_resolution(modularity_resolution) {}
+
+	size_t Size() const {return m_communities.size();}
+	bool IsDirected() const {return m_is_directed;}
+	size_t NumberOfEdges() const;
+
+	// adds isolated nodes up to the given number of nodes, each in its own community
+	void AddNodes(size_t size);
+	// adds weights to edges, creating missing ones; new node indices add nodes, each in its own community
+	void AddEdges(const std::vector<size_t>& sources, const std::vector<size_t>& destinations, const std::vector<double>& weights);
+	void RemoveEdges(const std::vector<size_t>& sources, const std::vector<size_t>& destinations);
+	// sets weights of existing edges
+	void UpdateWeights(const std::vector<size_t>& sources, const std::vector<size_t>& destinations, const std::vector<double>& weights);
+
+	// absolute change of edge weights since the last Solve, relative to the total weight at that time
+	double Drift() const;
+	const std::vector<size_t>& Communities() const {return m_communities;}
+	size_t NumberOfCommunities() const {return m_aggregates.size();}
+	double Modularity() const;
+
+	// Re-partitions communities of nodes touched since the last Optimize or Solve,
+	// starting from their current partition; returns number of re-partitioned nodes
+	size_t Optimize(const ComboSettings& settings);
+	// Re-partitions the whole graph from scratch and resets drift
+	void Solve(const ComboSettings& settings);
+	// Whole graph with the same normalization as SparseGraphFromEdges
+	SparseGraph GetSparseGraph() const;
+
+private:
+	// sums over nodes of a community, not normalized by total weight
+	struct Aggregate
+	{
+		// sum of B_ij over i, j in the community
+		double internal = 0;
+		double out = 0;
+		double in = 0;
+		std::vector<size_t> members;
+	};
+
+	bool m_is_directed;
+	double m_modularity_resolution;
+	// W_ij (both W_ij and W_ji for undirected graphs) and, for directed graphs, W_ji stored at j
+	std::vector<std::unordered_map<size_t, double>> m_weights;
+	std::vector<std::unordered_map<size_t, double>> m_reverse_weights;
+	std::vector<double> m_out;
+	std::vector<double> m_in;
+	// normalization of B and strengths, same as total_weight in SparseGraphFromEdges
+	double m_total_weight = 0;
+	double m_total_weight_at_solve = 0;
+	double m_changed_weight = 0;
+
+	std::vector<size_t> m_communities;
+	std::unordered_map<size_t, Aggregate> m_aggregates;
+	size_t m_next_label = 0;
+	std::unordered_set<size_t> m_touched;
+
+	double Weight(size_t source, size_t destination) const;
+	void SetWeight(size_t source, size_t destination, double weight);
+	void CheckEdges(const std::vector<size_t>& sources, const std::vector<size_t>& destinations, size_t num_weights) const;
+	SparseGraph Subgraph(const std::vector<size_t>& nodes) const;
+	// sets communities of nodes (closed under communities) and recomputes their aggregates
+	void SetCommunities(const std::vector<size_t>& nodes, const std::vector<size_t>& labels);
+};
+
+#endif //DYNAMIC_GRAPH_H
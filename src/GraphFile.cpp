@@ -0,0 +1,147 @@
+#include "GraphFile.h"
+
+#include <algorithm>
+#include <climits>
+#include <fstream>
+#include <locale>
+#include <sstream>
+#include <stdexcept>
+#include <utility>
+
+using std::string;
+using std::vector;
+
+namespace
+{
+std::ifstream OpenFile(const string& file_name)
+{
+	std::ifstream file(file_name);
+	if (!file.is_open())
+		throw std::invalid_argument("file " + file_name + " can not be opened");
+	return file;
+}
+
+// lines "source destination [weight]" of .edgelist file or of edges of .net file, weight 1 by default
+bool ReadEdge(std::stringstream& stream, GraphFile& graph_file, int& min_node, int& max_node)
+{
+	int source = -1, destination = -1;
+	double weight = 1.0;
+	stream >> source >> destination;
+	if (!stream.eof())
+		stream >> weight;
+	if (stream.fail() || source < 0 || destination < 0)
+		return false;
+	min_node = std::min(min_node, std::min(source, destination));
+	max_node = std::max(max_node, std::max(source, destination));
+	graph_file.sources.push_back(source);
+	graph_file.destinations.push_back(destination);
+	graph_file.weights.push_back(weight);
+	return true;
+}
+
+void ShiftNodes(GraphFile& graph_file, int min_node, int max_node)
+{
+	graph_file.size = size_t(std::max(0, 1 + max_node - min_node));
+	for (size_t i = 0; i < graph_file.sources.size(); ++i) {
+		graph_file.sources[i] -= min_node;
+		graph_file.destinations[i] -= min_node;
+	}
+}
+
+GraphFile ReadEdgelist(const string& file_name)
+{
+	std::ifstream file = OpenFile(file_name);
+	GraphFile graph_file;
+	graph_file.is_directed = true;
+	int min_node = INT_MAX, max_node = 0;
+	while (file.good()) {
+		string line;
+		std::getline(file, line);
+		std::stringstream stream(line);
+		ReadEdge(stream, graph_file, min_node, max_node);
+	}
+	ShiftNodes(graph_file, min_node, max_node);
+	return graph_file;
+}
+
+GraphFile ReadPajek(const string& file_name)
+{
+	std::ifstream file = OpenFile(file_name);
+	std::locale locale;
+	GraphFile graph_file;
+	int min_node = INT_MAX, max_node = 0;
+	// lines before *edges or *arcs are vertices
+	bool vertices = true;
+	while (file.good()) {
+		string line;
+		std::getline(file, line);
+		std::stringstream stream(line);
+		string first;
+		stream >> first;
+		std::transform(first.begin(), first.end(), first.begin(), [&locale](char c) {return std::tolower(c, locale);});
+		if (first == "*edges" || first == "*arcs") {
+			vertices = false;
+			graph_file.is_directed = first == "*arcs";
+			continue;
+		}
+		stream.str(line);
+		if (!vertices) {
+			ReadEdge(stream, graph_file, min_node, max_node);
+			continue;
+		}
+		int node = -1;
+		stream >> node;
+		if (!stream.fail() && node > -1) {
+			min_node = std::min(min_node, node);
+			max_node = std::max(max_node, node);
+		}
+	}
+	ShiftNodes(graph_file, min_node, max_node);
+	return graph_file;
+}
+
+GraphFile ReadCSV(const string& file_name)
+{
+	std::ifstream file = OpenFile(file_name);
+	GraphFile graph_file;
+	graph_file.is_matrix = true;
+	vector<vector<double>>& matrix = graph_file.matrix;
+	while (file.good()) {
+		string line;
+		std::getline(file, line);
+		std::stringstream stream(line);
+		string first;
+		stream >> first;
+		if (first.empty())
+			break;
+		stream = std::stringstream(line);
+		vector<double>& row = matrix.emplace_back();
+		double weight = 1.0;
+		char separator;
+		while (stream.good()) {
+			stream >> weight;
+			stream >> separator;
+			row.push_back(weight);
+		}
+		if (matrix.size() > 1 && row.size() != matrix[matrix.size() - 2].size())
+			throw std::invalid_argument("matrix in file " + file_name + " is not square");
+	}
+	if (matrix.empty() || matrix.size() != matrix.back().size())
+		throw std::invalid_argument("matrix in file " + file_name + " is not square");
+	graph_file.size = matrix.size();
+	return graph_file;
+}
+}
+
+GraphFile ReadGraphFile(const string& file_name)
+{
+	size_t dot_position = file_name.rfind('.');
+	string extension = dot_position == string::npos ? "" : file_name.substr(dot_position);
+	if (extension == ".edgelist")
+		return ReadEdgelist(file_name);
+	if (extension == ".net")
+		return ReadPajek(file_name);
+	if (extension == ".csv")
+		return ReadCSV(file_name);
+	throw std::invalid_argument("unsupported file format of " + file_name + ", must be Pajek .net, .edgelist or .csv");
+}
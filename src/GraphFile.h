@@ -0,0 +1,26 @@
+#ifndef GRAPH_FILE_H
+#define GRAPH_FILE_H
+
+#include <cstddef>
+#include <string>
+#include <vector>
+
+// Contents of graph file read as ReadGraphFromFile of Combo reads it, so that sparse graph can be built from it:
+// edges of .edgelist (always directed) and Pajek .net files, with node numbers shifted to start from 0,
+// or adjacency matrix of .csv files.
+struct GraphFile
+{
+	size_t size = 0;
+	std::vector<int> sources;
+	std::vector<int> destinations;
+	std::vector<double> weights;
+	bool is_directed = false;
+	// rows of adjacency matrix of .csv file, edges are empty then
+	std::vector<std::vector<double>> matrix;
+	bool is_matrix = false;
+};
+
+// Throws std::invalid_argument if the file can not be read or its format is not supported
+GraphFile ReadGraphFile(const std::string& file_name);
+
+#endif //GRAPH_FILE_H
@@ -0,0 +1,67 @@
+#include "IntermediateResults.h"
+
+#include <iostream>
+#include <limits>
+#include <stdexcept>
+
+using std::string;
+using std::vector;
+
+namespace
+{
+const char MAGIC[8] = {'C', 'O', 'M', 'B', 'O', 'I', 'T', 'R'};
+// write buffer of binary file, holding many records of small graphs
+const size_t BUFFER_SIZE = 1 << 20;
+}
+
+IntermediateResults::IntermediateResults(const string& path, IntermediateResultsFormat format, size_t stride, size_t size) :
+	m_path(path), m_format(format), m_stride(stride > 0 ? stride : 1)
+{
+	if (m_format == IntermediateResultsFormat::TEXT)
+		return;
+	if (size > size_t(std::numeric_limits<int32_t>::max()))
+		throw std::invalid_argument("binary intermediate results are limited to 2^31 - 1 nodes");
+	m_buffer.resize(BUFFER_SIZE);
+	m_file.rdbuf()->pubsetbuf(m_buffer.data(), std::streamsize(m_buffer.size()));
+	m_file.open(path, std::ios::binary | std::ios::trunc);
+	if (!m_file.is_open())
+		throw std::runtime_error("File " + path + " can not be opened.");
+	uint64_t header[2] = {uint64_t(size), uint64_t(m_stride)};
+	m_file.write(MAGIC, sizeof(MAGIC));
+	m_file.write(reinterpret_cast<const char*>(header), sizeof(header));
+	m_record.resize(size + 1);
+}
+
+void IntermediateResults::Write(size_t iteration, const vector<size_t>& communities)
+{
+	if (iteration % m_stride == 0)
+		WriteRecord(iteration, communities);
+}
+
+void IntermediateResults::Finish(size_t iteration, const vector<size_t>& communities)
+{
+	if (!m_written || m_last_written != iteration)
+		WriteRecord(iteration, communities);
+	if (m_file.is_open())
+		m_file.flush();
+}
+
+void IntermediateResults::WriteRecord(size_t iteration, const vector<size_t>& communities)
+{
+	m_written = true;
+	m_last_written = iteration;
+	if (m_format == IntermediateResultsFormat::TEXT) {
+		std::ofstream file(m_path.c_str());
+		if (!file.is_open()) {
+			std::cerr << "File " << m_path << " can not be opened." << std::endl;
+			return;
+		}
+		for (size_t community : communities)
+			file << community << '\n';
+		return;
+	}
+	m_record[0] = int32_t(iteration);
+	for (size_t i = 0; i < communities.size(); ++i)
+		m_record[i + 1] = int32_t(communities[i]);
+	m_file.write(reinterpret_cast<const char*>(m_record.data()), std::streamsize(m_record.size() * sizeof(int32_t)));
+}
@@ -0,0 +1,46 @@
+#ifndef INTERMEDIATE_RESULTS_H
+#define INTERMEDIATE_RESULTS_H
+
+#include <cstddef>
+#include <cstdint>
+#include <fstream>
+#include <string>
+#include <vector>
+
+enum class IntermediateResultsFormat
+{
+	// labels of nodes, one per line, of the last written iteration (the file is rewritten every time)
+	TEXT,
+	// header followed by a record of each written iteration, see IntermediateResults
+	BINARY
+};
+
+// Writer of partitions of Combo iterations to a file.
+// Partitions of iterations 0 (the initial one), stride, 2 * stride, ... and of the last iteration are written.
+// Binary file is written through a buffer and only appended to, so it can be read while Combo runs:
+//   header: magic "COMBOITR", uint64 number of nodes, uint64 stride;
+//   records: int32 iteration followed by int32 labels of all nodes,
+// all numbers in native byte order.
+class IntermediateResults
+{
+public:
+	IntermediateResults(const std::string& path, IntermediateResultsFormat format, size_t stride, size_t size);
+
+	void Write(size_t iteration, const std::vector<size_t>& communities);
+	// writes the last iteration unless it is written already and flushes the file
+	void Finish(size_t iteration, const std::vector<size_t>& communities);
+
+private:
+	std::string m_path;
+	IntermediateResultsFormat m_format;
+	size_t m_stride;
+	std::ofstream m_file;
+	std::vector<char> m_buffer;
+	std::vector<int32_t> m_record;
+	bool m_written = false;
+	size_t m_last_written = 0;
+
+	void WriteRecord(size_t iteration, const std::vector<size_t>& communities);
+};
+
+#endif //INTERMEDIATE_RESULTS_H
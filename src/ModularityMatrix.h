@@ -0,0 +1,241 @@
+#ifndef MODULARITY_MATRIX_H
+#define MODULARITY_MATRIX_H
+
+#include "Combo/Matrix.h"
+
+#include <cstddef>
+#include <stdexcept>
+#include <string>
+#include <utility>
+#include <vector>
+
+// Builders of Combo modularity matrix reading edges, CSR or dense matrix in place from raw buffers.
+// Arithmetic follows Graph::CalcModMatrix and Graph::FillModMatrix,
+// so Graph(std::move(matrix), resolution, true) is equivalent to constructing Graph from edges or matrix.
+
+// Null model of modularity matrix: out- and in-strengths of nodes as fractions of the total weight (sums of rows
+// and columns of normalized adjacency matrix), total weight of edges (each undirected edge counted once) and
+// whether the matrix was symmetrized as of directed graph
+struct NullModel
+{
+	std::vector<double> out;
+	std::vector<double> in;
+	double total_weight = 1;
+	bool is_directed = false;
+};
+
+// modularity matrix given explicitly (treat_as_modularity) has no null model, its weights are not normalized
+inline NullModel ZeroNullModel(size_t size)
+{
+	return {std::vector<double>(size, 0.0), std::vector<double>(size, 0.0)};
+}
+
+inline void SymmetrizeModularityMatrix(Matrix& matrix)
+{
+	for (size_t i = 0; i < matrix.size(); ++i)
+		for (size_t j = i+1; j < matrix.size(); ++j)
+			matrix[i][j] = matrix[j][i] = (matrix[i][j] + matrix[j][i]) / 2;
+}
+
+template<typename Index>
+void CheckEdgeIndices(size_t size, const Index* sources, const Index* destinations, size_t num_edges)
+{
+	for (size_t i = 0; i < num_edges; ++i) {
+		if (sources[i] < 0 || destinations[i] < 0)
+			throw std::invalid_argument("vertices' index cannot be negative");
+		if (size_t(sources[i]) >= size || size_t(destinations[i]) >= size)
+			throw std::invalid_argument("vertices' index cannot be greater than size-1 = " + std::to_string(size - 1));
+	}
+}
+
+template<typename Index, typename Weight>
+Matrix ModularityMatrixFromEdges(size_t size, const Index* sources, const Index* destinations, const Weight* weights,
+	size_t num_edges, bool is_directed, double modularity_resolution, NullModel* null_model = nullptr)
+{
+	CheckEdgeIndices(size, sources, destinations, num_edges);
+	double total_weight = 0.0;
+	for (size_t i = 0; i < num_edges; ++i)
+		total_weight += double(weights[i]);
+	if (!is_directed)
+		total_weight *= 2;
+	Matrix matrix(size, std::vector<double>(size, 0));
+	std::vector<double> sumQ2(size, 0.0);
+	std::vector<double> sumQ1(size, 0.0);
+	for (size_t i = 0; i < num_edges; ++i) {
+		size_t source = size_t(sources[i]);
+		size_t destination = size_t(destinations[i]);
+		double weight = double(weights[i]);
+		matrix[source][destination] += weight / total_weight;
+		if (!is_directed)
+			matrix[destination][source] += weight / total_weight;
+		sumQ1[source] += weight / total_weight;
+		sumQ2[destination] += weight / total_weight;
+		if (!is_directed) {
+			sumQ1[destination] += weight / total_weight;
+			sumQ2[source] += weight / total_weight;
+		}
+	}
+	for (size_t i = 0; i < size; ++i)
+		for (size_t j = 0; j < size; ++j)
+			matrix[i][j] -= modularity_resolution * sumQ1[i]*sumQ2[j];
+	if (is_directed)
+		SymmetrizeModularityMatrix(matrix);
+	if (null_model != nullptr)
+		*null_model = {std::move(sumQ1), std::move(sumQ2), is_directed ? total_weight : total_weight / 2, is_directed};
+	return matrix;
+}
+
+template<typename Index, typename Weight>
+Matrix FillModularityMatrixFromEdges(size_t size, const Index* sources, const Index* destinations, const Weight* weights,
+	size_t num_edges, bool is_directed)
+{
+	CheckEdgeIndices(size, sources, destinations, num_edges);
+	Matrix matrix(size, std::vector<double>(size, 0));
+	for (size_t i = 0; i < num_edges; ++i) {
+		size_t source = size_t(sources[i]);
+		size_t destination = size_t(destinations[i]);
+		double weight = double(weights[i]);
+		if (is_directed)
+			matrix[source][destination] += weight;
+		else {
+			matrix[source][destination] += weight / 2;
+			matrix[destination][source] += weight / 2;
+		}
+	}
+	if (is_directed)
+		SymmetrizeModularityMatrix(matrix);
+	return matrix;
+}
+
+template<typename Index>
+void CheckCSRIndices(size_t size, const Index* indptr, const Index* indices)
+{
+	for (size_t i = 0; i < size; ++i)
+		if (indptr[i] < 0 || indptr[i] > indptr[i+1])
+			throw std::invalid_argument("indptr must be non-decreasing and non-negative");
+	for (Index k = indptr[0]; k < indptr[size]; ++k)
+		if (indices[k] < 0 || size_t(indices[k]) >= size)
+			throw std::invalid_argument("column index out of range [0, " + std::to_string(size) + ")");
+}
+
+// Matrix in CSR format is treated as adjacency matrix, same as in Graph::CalcModMatrix(matrix):
+// diagonal (loops) is counted twice for undirected (symmetric) matrices.
+template<typename Index, typename Weight>
+Matrix ModularityMatrixFromCSR(size_t size, const Index* indptr, const Index* indices, const Weight* data,
+	bool is_directed, double modularity_resolution, NullModel* null_model = nullptr)
+{
+	CheckCSRIndices(size, indptr, indices);
+	double total_weight = 0.0;
+	for (Index k = indptr[0]; k < indptr[size]; ++k)
+		total_weight += double(data[k]);
+	if (!is_directed)
+		for (size_t i = 0; i < size; ++i)
+			for (Index k = indptr[i]; k < indptr[i+1]; ++k)
+				if (size_t(indices[k]) == i)
+					total_weight += double(data[k]);
+	Matrix matrix(size, std::vector<double>(size, 0.0));
+	std::vector<double> sumQ2(size, 0.0);
+	std::vector<double> sumQ1(size, 0.0);
+	for (size_t i = 0; i < size; ++i)
+		for (Index k = indptr[i]; k < indptr[i+1]; ++k) {
+			size_t j = size_t(indices[k]);
+			double value = double(data[k]) / total_weight;
+			if (!is_directed && i == j)
+				value *= 2;
+			matrix[i][j] += value;
+			sumQ1[i] += value;
+			sumQ2[j] += value;
+		}
+	for (size_t i = 0; i < size; ++i)
+		for (size_t j = 0; j < size; ++j)
+			matrix[i][j] -= modularity_resolution * sumQ1[i]*sumQ2[j];
+	if (is_directed)
+		SymmetrizeModularityMatrix(matrix);
+	if (null_model != nullptr)
+		*null_model = {std::move(sumQ1), std::move(sumQ2), is_directed ? total_weight : total_weight / 2, is_directed};
+	return matrix;
+}
+
+template<typename Index, typename Weight>
+Matrix FillModularityMatrixFromCSR(size_t size, const Index* indptr, const Index* indices, const Weight* data, bool is_directed)
+{
+	CheckCSRIndices(size, indptr, indices);
+	Matrix matrix(size, std::vector<double>(size, 0.0));
+	for (size_t i = 0; i < size; ++i)
+		for (Index k = indptr[i]; k < indptr[i+1]; ++k)
+			matrix[i][size_t(indices[k])] += double(data[k]);
+	if (is_directed)
+		SymmetrizeModularityMatrix(matrix);
+	return matrix;
+}
+
+// Row-major view of contiguous square matrix, indexed as view[i][j]
+template<typename Weight>
+struct DenseMatrixView
+{
+	const Weight* data;
+	size_t size;
+	const Weight* operator[](size_t i) const {return data + i * size;}
+};
+
+template<typename Rows>
+bool IsDenseMatrixSymmetric(size_t size, const Rows& rows)
+{
+	for (size_t i = 0; i < size; ++i)
+		for (size_t j = i+1; j < size; ++j)
+			if (rows[i][j] != rows[j][i])
+				return false;
+	return true;
+}
+
+// Dense matrix is treated as adjacency matrix, same as in Graph::CalcModMatrix(matrix).
+// Rows is either DenseMatrixView or Matrix.
+template<typename Rows>
+Matrix ModularityMatrixFromDense(size_t size, const Rows& rows, bool is_directed, double modularity_resolution,
+	NullModel* null_model = nullptr)
+{
+	double total_weight = 0.0;
+	for (size_t i = 0; i < size; ++i)
+		for (size_t j = 0; j < size; ++j)
+			total_weight += double(rows[i][j]);
+	// double loop edges for undirected graphs
+	if (!is_directed)
+		for (size_t i = 0; i < size; ++i)
+			total_weight += double(rows[i][i]);
+	Matrix matrix(size, std::vector<double>(size, 0.0));
+	for (size_t i = 0; i < size; ++i) {
+		for (size_t j = 0; j < size; ++j)
+			matrix[i][j] = double(rows[i][j]) / total_weight;
+		if (!is_directed)
+			matrix[i][i] *= 2;
+	}
+	std::vector<double> sumQ2(size, 0.0);
+	std::vector<double> sumQ1(size, 0.0);
+	for (size_t i = 0; i < size; ++i)
+		for (size_t j = 0; j < size; ++j) {
+			sumQ1[i] += matrix[i][j];
+			sumQ2[j] += matrix[i][j];
+		}
+	for (size_t i = 0; i < size; ++i)
+		for (size_t j = 0; j < size; ++j)
+			matrix[i][j] -= modularity_resolution * sumQ1[i]*sumQ2[j];
+	if (is_directed)
+		SymmetrizeModularityMatrix(matrix);
+	if (null_model != nullptr)
+		*null_model = {std::move(sumQ1), std::move(sumQ2), is_directed ? total_weight : total_weight / 2, is_directed};
+	return matrix;
+}
+
+template<typename Rows>
+Matrix FillModularityMatrixFromDense(size_t size, const Rows& rows, bool is_directed)
+{
+	Matrix matrix(size, std::vector<double>(size));
+	for (size_t i = 0; i < size; ++i)
+		for (size_t j = 0; j < size; ++j)
+			matrix[i][j] = double(rows[i][j]);
+	if (is_directed)
+		SymmetrizeModularityMatrix(matrix);
+	return matrix;
+}
+
+#endif //MODULARITY_MATRIX_H
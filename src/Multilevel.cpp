@@ -0,0 +1,230 @@
+#include "Multilevel.h"
+
+#include <algorithm>
+#include <chrono>
+#include <iostream>
+#include <numeric>
+#include <optional>
+#include <utility>
+
+using std::vector;
+
+namespace
+{
+// passes over all nodes per level, moves usually converge in a few
+const size_t MAX_PASSES = 10;
+// coarsening stops when a level shrinks the graph by less than this fraction
+const double MIN_COARSENING = 0.1;
+
+// Moves of single nodes of sparse graph between communities, each node going to the neighboring
+// community (or staying) with the highest modularity gain, see SparseGraph for the matrix.
+// Gain of moving node i from community A to D is 2 * (Q_iD - Q_i(A - i)),
+// Q_iX = B_iX - c * (out_i * IN_X + in_i * OUT_X), IN_X and OUT_X being strengths of community X.
+class LocalMoves
+{
+public:
+	// communities are labels 0, 1, ..., groups (if not empty) are labels of nodes no move may mix
+	LocalMoves(const SparseGraph& graph, const vector<size_t>& communities, const vector<size_t>& groups) :
+		m_graph(graph), m_communities(communities), m_groups(groups),
+		m_rank_coefficient(graph.ModularityResolution() / 2),
+		m_community_out(graph.Size(), 0.0), m_community_in(graph.Size(), 0.0), m_community_sizes(graph.Size(), 0),
+		m_neighbor_weights(graph.Size(), 0.0)
+	{
+		for (size_t i = 0; i < graph.Size(); ++i) {
+			m_community_out[communities[i]] += graph.OutStrengths()[i];
+			m_community_in[communities[i]] += graph.InStrengths()[i];
+			m_number_of_communities += m_community_sizes[communities[i]]++ == 0;
+		}
+	}
+
+	// passes over nodes in random order until no node moves, or there are target_communities communities;
+	// returns false if stopped by deadline (checked between passes)
+	bool Run(std::mt19937& random_number_generator, size_t target_communities = 0,
+		std::optional<std::chrono::steady_clock::time_point> deadline = std::nullopt)
+	{
+		vector<size_t> order(m_graph.Size());
+		std::iota(order.begin(), order.end(), 0);
+		for (size_t pass = 0; pass < MAX_PASSES; ++pass) {
+			if (deadline.has_value() && std::chrono::steady_clock::now() >= deadline.value())
+				return false;
+			std::shuffle(order.begin(), order.end(), random_number_generator);
+			size_t moves = 0;
+			for (size_t node : order) {
+				if (m_number_of_communities <= target_communities)
+					return true;
+				moves += MoveNode(node);
+			}
+			if (moves == 0)
+				return true;
+		}
+		return true;
+	}
+
+	const vector<size_t>& Communities() const {return m_communities;}
+
+private:
+	const SparseGraph& m_graph;
+	vector<size_t> m_communities;
+	vector<size_t> m_groups;
+	double m_rank_coefficient;
+	vector<double> m_community_out;
+	vector<double> m_community_in;
+	vector<size_t> m_community_sizes;
+	size_t m_number_of_communities = 0;
+	// B_iX for neighboring communities X of the current node, zeroed after each node
+	vector<double> m_neighbor_weights;
+	vector<size_t> m_neighbor_communities;
+
+	bool MoveNode(size_t node)
+	{
+		const vector<size_t>& indptr = m_graph.Indptr();
+		const vector<size_t>& indices = m_graph.Indices();
+		const vector<double>& values = m_graph.Values();
+		double out = m_graph.OutStrengths()[node], in = m_graph.InStrengths()[node];
+		size_t origin = m_communities[node];
+		m_neighbor_communities.push_back(origin);
+		for (size_t k = indptr[node]; k < indptr[node + 1]; ++k) {
+			size_t community = m_communities[indices[k]];
+			if (indices[k] == node)
+				continue;
+			if (m_neighbor_weights[community] == 0)
+				m_neighbor_communities.push_back(community);
+			m_neighbor_weights[community] += values[k];
+		}
+		m_community_out[origin] -= out;
+		m_community_in[origin] -= in;
+		auto connection = [&](size_t community) {
+			return m_neighbor_weights[community]
+				- m_rank_coefficient * (out * m_community_in[community] + in * m_community_out[community]);
+		};
+		double origin_connection = connection(origin);
+		size_t best = origin;
+		double best_gain = 0;
+		for (size_t community : m_neighbor_communities) {
+			double gain = connection(community) - origin_connection;
+			if (gain > best_gain && (m_groups.empty() || m_groups[community] == m_groups[origin])) {
+				best = community;
+				best_gain = gain;
+			}
+		}
+		for (size_t community : m_neighbor_communities)
+			m_neighbor_weights[community] = 0;
+		m_neighbor_communities.clear();
+		m_community_out[best] += out;
+		m_community_in[best] += in;
+		if (best == origin)
+			return false;
+		m_communities[node] = best;
+		m_number_of_communities -= --m_community_sizes[origin] == 0;
+		++m_community_sizes[best];
+		return true;
+	}
+};
+
+size_t NumberOfCommunities(const vector<size_t>& communities)
+{
+	return communities.empty() ? 0 : 1 + *std::max_element(communities.begin(), communities.end());
+}
+}
+
+SparseGraph Aggregate(const SparseGraph& graph, const vector<size_t>& communities, size_t number_of_communities)
+{
+	const vector<size_t>& indptr = graph.Indptr();
+	const vector<size_t>& indices = graph.Indices();
+	const vector<double>& values = graph.Values();
+	SparseGraphBuilder builder(number_of_communities);
+	builder.Reserve(indices.size());
+	for (size_t i = 0; i < graph.Size(); ++i) {
+		size_t community = communities[i];
+		for (size_t k = indptr[i]; k < indptr[i + 1]; ++k) {
+			size_t other = communities[indices[k]];
+			// entries (i, j) and (j, i) contribute a half to both B_PQ and B_QP
+			builder.AddSymmetric(community, other, community == other ? values[k] : values[k] / 2);
+		}
+		builder.OutStrengths()[community] += graph.OutStrengths()[i];
+		builder.InStrengths()[community] += graph.InStrengths()[i];
+	}
+	return builder.Build(graph.ModularityResolution(), graph.TotalWeight(), graph.IsDirected());
+}
+
+ComboResult RunMultilevel(const SparseGraph& graph, const ComboSettings& settings)
+{
+	if (settings.n_restarts == 0)
+		throw std::invalid_argument("n_restarts must be positive");
+	if (settings.TracesPartitions())
+		throw std::invalid_argument("intermediate results can not be used with multilevel partitioning");
+	if (settings.initial_communities.has_value() && settings.initial_communities.value().size() != graph.Size())
+		throw std::invalid_argument("initial communities must be given for all " + std::to_string(graph.Size()) + " nodes");
+	size_t coarsen_to = std::max<size_t>(settings.coarsen_to.value(), 1);
+	uint_fast32_t random_seed = settings.random_seed.has_value() ? settings.random_seed.value() : std::random_device()();
+	std::mt19937 random_number_generator(random_seed);
+
+	// levels[0] is the graph itself, node i of level l is node maps[l][i] of level l + 1
+	vector<SparseGraph> levels{graph};
+	vector<vector<size_t>> maps;
+	vector<size_t> groups;
+	if (settings.initial_communities.has_value())
+		groups = RelabelCommunities(settings.initial_communities.value());
+	std::chrono::steady_clock::time_point coarsening_start = std::chrono::steady_clock::now();
+	while (levels.back().Size() > coarsen_to) {
+		const SparseGraph& level = levels.back();
+		vector<size_t> singletons(level.Size());
+		std::iota(singletons.begin(), singletons.end(), 0);
+		LocalMoves moves(level, singletons, groups);
+		moves.Run(random_number_generator, coarsen_to, settings.deadline);
+		vector<size_t> communities = RelabelCommunities(moves.Communities());
+		size_t number = NumberOfCommunities(communities);
+		if (number > (1 - MIN_COARSENING) * double(level.Size()))
+			break;
+		if (!groups.empty()) {
+			vector<size_t> coarse_groups(number);
+			for (size_t i = 0; i < level.Size(); ++i)
+				coarse_groups[communities[i]] = groups[i];
+			groups = std::move(coarse_groups);
+		}
+		SparseGraph coarse = Aggregate(level, communities, number);
+		if (settings.verbose > 0)
+			std::cout << "Level " << levels.size() << ": " << coarse.Size() << " nodes" << std::endl;
+		maps.push_back(std::move(communities));
+		levels.push_back(std::move(coarse));
+	}
+
+	double coarsening_seconds = std::chrono::duration<double>(std::chrono::steady_clock::now() - coarsening_start).count();
+
+	ComboSettings coarse_settings = settings;
+	coarse_settings.random_seed = random_seed;
+	coarse_settings.return_restarts = true;
+	coarse_settings.coarsen_to = std::nullopt;
+	if (settings.initial_communities.has_value())
+		coarse_settings.initial_communities = groups;
+	ComboResult coarse_result = RunCombo(levels.back(), coarse_settings);
+
+	// restarts are projected and refined on their own threads
+	vector<ComboResult> results(settings.n_restarts);
+	ParallelFor(settings.n_restarts, settings.n_threads, [&](size_t restart) {
+		std::mt19937 restart_random_number_generator(RestartSeed(random_seed, restart));
+		results[restart].converged = coarse_result.restarts[restart].converged;
+		results[restart].stats = coarse_result.restarts[restart].stats;
+		ScopedTimer timer(settings.collect_stats ? &results[restart].stats.refinement_seconds : nullptr);
+		vector<size_t> communities = coarse_result.restarts[restart].communities;
+		for (size_t l = maps.size(); l-- > 0;) {
+			vector<size_t> projected(levels[l].Size());
+			for (size_t i = 0; i < projected.size(); ++i)
+				projected[i] = communities[maps[l][i]];
+			LocalMoves moves(levels[l], projected, vector<size_t>());
+			results[restart].converged = moves.Run(restart_random_number_generator, 0, settings.deadline)
+				&& results[restart].converged;
+			communities = moves.Communities();
+		}
+		SparseGraph partitioned(graph);
+		partitioned.SetCommunities(RelabelCommunities(communities));
+		results[restart].communities = partitioned.Communities();
+		results[restart].modularity = partitioned.Modularity();
+		if (settings.collect_stats)
+			results[restart].stats.modularity_trajectory.push_back(results[restart].modularity);
+	});
+	ComboResult result = BestResult(std::move(results), settings);
+	if (settings.collect_stats)
+		result.stats.coarsening_seconds = coarsening_seconds;
+	return result;
+}
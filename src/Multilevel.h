@@ -0,0 +1,42 @@
+#ifndef MULTILEVEL_H
+#define MULTILEVEL_H
+
+#include "ComboRun.h"
+#include "DenseGraph.h"
+#include "SparseGraph.h"
+
+#include <cstddef>
+#include <random>
+#include <stdexcept>
+#include <type_traits>
+#include <vector>
+
+// Multilevel Combo for graphs too large for Combo to partition directly.
+// The graph is coarsened by local moves of nodes to neighboring communities with the best
+// modularity gain (as in Louvain) until settings.coarsen_to communities are left, communities
+// are aggregated into nodes of a coarser graph with the same modularity, and so on.
+// Combo partitions the coarsest graph, then the partition is projected back level by level and
+// refined at each level by moves of single nodes between communities (the moves Combo makes
+// between two communities in Kernighan-Lin shifts). Every restart is refined, the best one is returned.
+// Initial communities are kept apart while coarsening and used as initial partition of the coarsest graph.
+// Local moves stop at settings.deadline too, leaving partitions projected but not refined.
+ComboResult RunMultilevel(const SparseGraph& graph, const ComboSettings& settings);
+
+// Graph with communities (labels 0, 1, ..., number_of_communities - 1) of graph aggregated into nodes:
+// B, out and in are summed up over them, so modularity of any partition of the coarse graph
+// is that of the corresponding partition of graph
+SparseGraph Aggregate(const SparseGraph& graph, const std::vector<size_t>& communities, size_t number_of_communities);
+
+// Runs Combo on graph, multilevel if settings.coarsen_to is set and the graph is larger
+template<typename GraphT>
+ComboResult RunGraph(const GraphT& graph, const ComboSettings& settings)
+{
+	if (!settings.coarsen_to.has_value() || graph.Size() <= settings.coarsen_to.value())
+		return RunCombo(graph, settings);
+	if constexpr (std::is_same_v<GraphT, SparseGraph>)
+		return RunMultilevel(graph, settings);
+	else
+		throw std::invalid_argument("multilevel partitioning requires sparse graph");
+}
+
+#endif //MULTILEVEL_H
@@ -0,0 +1,81 @@
+#include "PartitionedGraph.h"
+
+#include <algorithm>
+#include <fstream>
+#include <iostream>
+#include <set>
+
+using std::string;
+using std::vector;
+
+void PartitionedGraph::SetCommunities(const vector<size_t>& new_communities, size_t number)
+{
+	if (Size() != new_communities.size()) {
+		std::cerr << "Error in SetCommunities: number of elements in new_communities must be equal to graph size." << std::endl;
+		return;
+	}
+	m_communities = new_communities;
+	if (number == 0)
+		m_number_of_communities = std::set<size_t>(m_communities.begin(), m_communities.end()).size();
+	else
+		m_number_of_communities = number;
+}
+
+vector<size_t> PartitionedGraph::CommunityIndices(size_t community) const
+{
+	vector<size_t> res;
+	for (size_t i = 0; i < Size(); ++i)
+		if (m_communities[i] == community)
+			res.push_back(i);
+	return res;
+}
+
+bool PartitionedGraph::IsCommunityEmpty(size_t community) const
+{
+	return std::find(m_communities.begin(), m_communities.end(), community) == m_communities.end();
+}
+
+void PartitionedGraph::PerformSplit(size_t origin, size_t destination, const vector<bool>& to_be_moved)
+{
+	if (destination > m_number_of_communities) {
+		std::cerr << "WARNING: in PerformSplit, destination community is greater than number of communities." << std::endl;
+		destination = m_number_of_communities;
+	}
+	if (destination == m_number_of_communities)
+		++m_number_of_communities;
+	for (size_t i = 0; i < Size(); ++i)
+		if (m_communities[i] == origin && to_be_moved[i])
+			m_communities[i] = destination;
+}
+
+bool PartitionedGraph::DeleteCommunityIfEmpty(size_t community)
+{
+	if (!IsCommunityEmpty(community))
+		return false;
+	std::set<size_t> community_labels;
+	for (size_t i = 0; i < Size(); ++i) {
+		if (m_communities[i] > community)
+			--m_communities[i];
+		community_labels.insert(m_communities[i]);
+	}
+	m_number_of_communities = community_labels.size();
+	return true;
+}
+
+void PartitionedGraph::PrintCommunity(const string& file_name) const
+{
+	if (file_name.empty()) {
+		std::cout << "Nodes\' communities:\n";
+		for (size_t i = 0; i < Size(); ++i)
+			std::cout << m_communities[i] + 1 << ' ';
+		std::cout << std::endl;
+	} else {
+		std::ofstream file(file_name.c_str());
+		if (!file.is_open()) {
+			std::cerr << "File " << file_name << " can not be opened." << std::endl;
+			return;
+		}
+		for (size_t i = 0; i < Size(); ++i)
+			file << m_communities[i] << std::endl;
+	}
+}
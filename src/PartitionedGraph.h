@@ -0,0 +1,33 @@
+#ifndef PARTITIONED_GRAPH_H
+#define PARTITIONED_GRAPH_H
+
+#include <cstddef>
+#include <string>
+#include <vector>
+
+// Assignment of graph nodes to communities, with the same operations as in Graph from src/Combo.
+// Graph models used by ComboEngine derive from it and add modularity computations.
+class PartitionedGraph
+{
+public:
+	explicit PartitionedGraph(size_t size) : m_size(size) {}
+
+	size_t Size() const {return m_size;}
+	size_t NumberOfCommunities() const {return m_number_of_communities;}
+
+	void SetCommunities(const std::vector<size_t>& new_communities, size_t number = 0);
+	const std::vector<size_t>& Communities() const {return m_communities;}
+	std::vector<size_t> CommunityIndices(size_t community) const;
+	bool IsCommunityEmpty(size_t community) const;
+
+	void PerformSplit(size_t origin, size_t destination, const std::vector<bool>& to_be_moved);
+	bool DeleteCommunityIfEmpty(size_t community);
+	void PrintCommunity(const std::string& file_name = "") const;
+
+protected:
+	size_t m_size;
+	size_t m_number_of_communities = 0;
+	std::vector<size_t> m_communities;
+};
+
+#endif //PARTITIONED_GRAPH_H
@@ -0,0 +1,924 @@
+#include "PreparedGraph.h"
+
+#include "Multilevel.h"
+
+#include <algorithm>
+#include <cstdint>
+#include <cstring>
+#include <limits>
+#include <random>
+#include <stdexcept>
+#include <type_traits>
+
+using std::string;
+using std::vector;
+
+namespace
+{
+// "CMBG" read as little-endian uint32, reads byte-swapped on machines of other byte order
+const uint32_t FORMAT_MAGIC = 0x47424D43;
+const uint8_t FORMAT_VERSION = 1;
+
+enum GraphKind : uint8_t {DENSE = 0, SPARSE = 1, COMPONENTS = 2, FOLDED = 3};
+enum Flags : uint8_t {
+	// dense: only upper triangle is stored
+	SYMMETRIC = 1,
+	// sparse: indptr and indices are stored as uint32; components and folded: nodes are stored as uint32
+	SHORT_INDICES = 2,
+	// sparse and dense: in-strengths are equal to out-strengths and not stored
+	SAME_STRENGTHS = 4,
+	// dense: resolution, total weight and strengths of the null model follow the matrix
+	NULL_MODEL = 8,
+	// sparse and dense: the null model is of directed graph
+	DIRECTED = 16,
+};
+
+class BinaryWriter
+{
+public:
+	template<typename T>
+	void Write(T value) {m_data.append(reinterpret_cast<const char*>(&value), sizeof(T));}
+
+	template<typename T, typename U>
+	void WriteArray(const vector<U>& values)
+	{
+		if constexpr (std::is_same_v<T, U>)
+			m_data.append(reinterpret_cast<const char*>(values.data()), values.size() * sizeof(T));
+		else
+			for (U value : values)
+				Write(T(value));
+	}
+
+	string& Data() {return m_data;}
+
+private:
+	string m_data;
+};
+
+class BinaryReader
+{
+public:
+	explicit BinaryReader(const string& data) : m_data(data) {}
+
+	template<typename T>
+	T Read()
+	{
+		T value;
+		Consume(&value, sizeof(T));
+		return value;
+	}
+
+	template<typename T, typename U>
+	vector<U> ReadArray(size_t size)
+	{
+		if (size > Remaining() / sizeof(T))
+			throw std::invalid_argument("serialized graph is truncated");
+		vector<U> values(size);
+		if constexpr (std::is_same_v<T, U>)
+			ReadInto(values.data(), size);
+		else
+			for (U& value : values)
+				value = U(Read<T>());
+		return values;
+	}
+
+	template<typename T>
+	void ReadInto(T* values, size_t size)
+	{
+		if (size > Remaining() / sizeof(T))
+			throw std::invalid_argument("serialized graph is truncated");
+		Consume(values, size * sizeof(T));
+	}
+
+	size_t Remaining() const {return m_data.size() - m_position;}
+	bool AtEnd() const {return m_position == m_data.size();}
+
+private:
+	void Consume(void* destination, size_t size)
+	{
+		if (size > m_data.size() - m_position)
+			throw std::invalid_argument("serialized graph is truncated");
+		std::memcpy(destination, m_data.data() + m_position, size);
+		m_position += size;
+	}
+
+	const string& m_data;
+	size_t m_position = 0;
+};
+
+void Serialize(const DenseGraph& graph, BinaryWriter& writer)
+{
+	const Matrix& matrix = graph.ModularityMatrix();
+	const NullModel* null_model = graph.GetNullModel();
+	size_t size = matrix.size();
+	bool symmetric = IsDenseMatrixSymmetric(size, matrix);
+	bool same_strengths = null_model != nullptr && null_model->out == null_model->in;
+	writer.Write<uint8_t>(DENSE);
+	writer.Write<uint8_t>((symmetric ? SYMMETRIC : 0) | (null_model != nullptr ? NULL_MODEL : 0)
+		| (same_strengths ? SAME_STRENGTHS : 0) | (null_model != nullptr && null_model->is_directed ? DIRECTED : 0));
+	writer.Write<uint64_t>(size);
+	for (size_t i = 0; i < size; ++i)
+		writer.Data().append(reinterpret_cast<const char*>(matrix[i].data() + (symmetric ? i : 0)),
+			(size - (symmetric ? i : 0)) * sizeof(double));
+	if (null_model == nullptr)
+		return;
+	writer.Write<double>(graph.ModularityResolution());
+	writer.Write<double>(null_model->total_weight);
+	writer.WriteArray<double>(null_model->out);
+	if (!same_strengths)
+		writer.WriteArray<double>(null_model->in);
+}
+
+DenseGraph DeserializeDense(BinaryReader& reader, uint8_t flags)
+{
+	size_t size = size_t(reader.Read<uint64_t>());
+	// check before allocating rows
+	if (size > reader.Remaining() / sizeof(double))
+		throw std::invalid_argument("serialized graph is truncated");
+	Matrix matrix(size);
+	for (size_t i = 0; i < size; ++i) {
+		size_t start = (flags & SYMMETRIC) ? i : 0;
+		matrix[i].resize(size);
+		reader.ReadInto(matrix[i].data() + start, size - start);
+		for (size_t j = 0; j < start; ++j)
+			matrix[i][j] = matrix[j][i];
+	}
+	if (!(flags & NULL_MODEL))
+		return DenseGraph(std::move(matrix));
+	double modularity_resolution = reader.Read<double>();
+	double total_weight = reader.Read<double>();
+	vector<double> out = reader.ReadArray<double, double>(size);
+	vector<double> in = (flags & SAME_STRENGTHS) ? out : reader.ReadArray<double, double>(size);
+	return DenseGraph(std::move(matrix), {std::move(out), std::move(in), total_weight, bool(flags & DIRECTED)},
+		modularity_resolution);
+}
+
+void Serialize(const SparseGraph& graph, BinaryWriter& writer)
+{
+	bool short_indices = graph.NumberOfEntries() <= std::numeric_limits<uint32_t>::max()
+		&& graph.Size() <= std::numeric_limits<uint32_t>::max();
+	bool same_strengths = graph.OutStrengths() == graph.InStrengths();
+	writer.Write<uint8_t>(SPARSE);
+	writer.Write<uint8_t>((short_indices ? SHORT_INDICES : 0) | (same_strengths ? SAME_STRENGTHS : 0)
+		| (graph.IsDirected() ? DIRECTED : 0));
+	writer.Write<uint64_t>(graph.Size());
+	writer.Write<uint64_t>(graph.NumberOfEntries());
+	writer.Write<double>(graph.ModularityResolution());
+	writer.Write<double>(graph.TotalWeight());
+	if (short_indices) {
+		writer.WriteArray<uint32_t>(graph.Indptr());
+		writer.WriteArray<uint32_t>(graph.Indices());
+	} else {
+		writer.WriteArray<uint64_t>(graph.Indptr());
+		writer.WriteArray<uint64_t>(graph.Indices());
+	}
+	writer.WriteArray<double>(graph.Values());
+	writer.WriteArray<double>(graph.OutStrengths());
+	if (!same_strengths)
+		writer.WriteArray<double>(graph.InStrengths());
+}
+
+SparseGraph DeserializeSparse(BinaryReader& reader, uint8_t flags)
+{
+	size_t size = size_t(reader.Read<uint64_t>());
+	size_t num_entries = size_t(reader.Read<uint64_t>());
+	double modularity_resolution = reader.Read<double>();
+	double total_weight = reader.Read<double>();
+	if (size == std::numeric_limits<size_t>::max())
+		throw std::invalid_argument("serialized graph is truncated");
+	vector<size_t> indptr, indices;
+	if (flags & SHORT_INDICES) {
+		indptr = reader.ReadArray<uint32_t, size_t>(size + 1);
+		indices = reader.ReadArray<uint32_t, size_t>(num_entries);
+	} else {
+		indptr = reader.ReadArray<uint64_t, size_t>(size + 1);
+		indices = reader.ReadArray<uint64_t, size_t>(num_entries);
+	}
+	if (indptr[0] != 0)
+		throw std::invalid_argument("serialized graph is corrupted");
+	for (size_t i = 0; i < size; ++i)
+		if (indptr[i + 1] < indptr[i] || indptr[i + 1] > num_entries)
+			throw std::invalid_argument("serialized graph is corrupted");
+	for (size_t j : indices)
+		if (j >= size)
+			throw std::invalid_argument("serialized graph is corrupted");
+	vector<double> values = reader.ReadArray<double, double>(num_entries);
+	vector<double> out = reader.ReadArray<double, double>(size);
+	vector<double> in = (flags & SAME_STRENGTHS) ? out : reader.ReadArray<double, double>(size);
+	return SparseGraph(size, std::move(indptr), std::move(indices), std::move(values),
+		std::move(out), std::move(in), modularity_resolution, total_weight, bool(flags & DIRECTED));
+}
+
+void Serialize(const PreparedGraph::Graph& graph, BinaryWriter& writer)
+{
+	std::visit([&](const auto& graph) {Serialize(graph, writer);}, graph);
+}
+
+PreparedGraph::Graph DeserializeGraph(BinaryReader& reader)
+{
+	uint8_t kind = reader.Read<uint8_t>();
+	uint8_t flags = reader.Read<uint8_t>();
+	if (kind == DENSE)
+		return DeserializeDense(reader, flags);
+	if (kind == SPARSE)
+		return DeserializeSparse(reader, flags);
+	throw std::invalid_argument("serialized graph is corrupted");
+}
+}
+
+PreparedGraph::PreparedGraph(size_t size, vector<Component>&& components) :
+	m_size(size), m_components(std::move(components))
+{
+	for (const Component& component : m_components)
+		if (std::visit([](const auto& graph) {return graph.Size();}, component.graph) != component.nodes.size())
+			throw std::invalid_argument("component graph must have a node for each of its nodes");
+}
+
+bool PreparedGraph::IsSparse() const
+{
+	if (m_graph.has_value())
+		return std::holds_alternative<SparseGraph>(m_graph.value());
+	return std::all_of(m_components.begin(), m_components.end(),
+		[](const Component& component) {return std::holds_alternative<SparseGraph>(component.graph);});
+}
+
+size_t PreparedGraph::MemoryBytes() const
+{
+	auto graph_bytes = [](const Graph& graph) {return std::visit([](const auto& graph) {return graph.MemoryBytes();}, graph);};
+	size_t bytes = m_node_map.size() * sizeof(size_t);
+	if (m_graph.has_value())
+		return bytes + graph_bytes(m_graph.value());
+	bytes += m_components.size() * sizeof(Component);
+	for (const Component& component : m_components)
+		bytes += graph_bytes(component.graph) + component.nodes.size() * sizeof(size_t);
+	return bytes;
+}
+
+void PreparedGraph::SetNodeMap(vector<size_t>&& node_map)
+{
+	for (size_t node : node_map)
+		if (node >= m_size)
+			throw std::invalid_argument("nodes can only be folded into nodes of the graph");
+	m_node_map = std::move(node_map);
+}
+
+ComboResult PreparedGraph::Run(const ComboSettings& settings) const
+{
+	if (!m_node_map.empty())
+		return RunReduced(settings);
+	return RunUnfolded(settings);
+}
+
+ComboResult PreparedGraph::RunUnfolded(const ComboSettings& settings) const
+{
+	if (m_graph.has_value())
+		return std::visit([&](const auto& graph) {return RunGraph(graph, settings);}, m_graph.value());
+	return RunComponents(settings);
+}
+
+ComboResult PreparedGraph::RunReduced(const ComboSettings& settings) const
+{
+	if (settings.TracesPartitions())
+		throw std::invalid_argument("intermediate results can not be used with folded nodes");
+	ComboSettings reduced_settings = settings;
+	if (settings.initial_communities.has_value()) {
+		const vector<size_t>& initial_communities = settings.initial_communities.value();
+		if (initial_communities.size() != m_node_map.size())
+			throw std::invalid_argument("initial communities must be given for all " + std::to_string(m_node_map.size()) + " nodes");
+		// folded node takes community of its first member
+		reduced_settings.initial_communities = vector<size_t>(m_size);
+		for (size_t i = m_node_map.size(); i-- > 0;)
+			reduced_settings.initial_communities.value()[m_node_map[i]] = initial_communities[i];
+	}
+	auto expand = [&](const ComboResult& reduced_result) {
+		ComboResult result{vector<size_t>(m_node_map.size()), reduced_result.modularity, reduced_result.converged, {},
+			reduced_result.stats};
+		for (size_t i = 0; i < m_node_map.size(); ++i)
+			result.communities[i] = reduced_result.communities[m_node_map[i]];
+		result.communities = RelabelCommunities(result.communities);
+		return result;
+	};
+	ComboResult reduced_result = RunUnfolded(reduced_settings);
+	ComboResult result = expand(reduced_result);
+	for (const ComboResult& restart : reduced_result.restarts)
+		result.restarts.push_back(expand(restart));
+	return result;
+}
+
+ComboResult PreparedGraph::RunComponents(const ComboSettings& settings) const
+{
+	if (settings.n_restarts == 0)
+		throw std::invalid_argument("n_restarts must be positive");
+	if (settings.max_communities.has_value())
+		throw std::invalid_argument("max_communities can not be used with graph split into components");
+	if (settings.TracesPartitions())
+		throw std::invalid_argument("intermediate results can not be used with graph split into components");
+	if (settings.initial_communities.has_value()) {
+		if (settings.initial_communities.value().size() != m_size)
+			throw std::invalid_argument("initial communities must be given for all " + std::to_string(m_size) + " nodes");
+		if (settings.start_separate)
+			throw std::invalid_argument("start_separate can not be used with initial communities");
+	}
+	ComboSettings component_settings = settings;
+	component_settings.n_threads = 1;
+	component_settings.intermediate_results_path = std::nullopt;
+	component_settings.partitions = nullptr;
+	if (!settings.random_seed.has_value())
+		component_settings.random_seed = std::random_device()();
+	// largest components first, so that threads finish at about the same time
+	vector<size_t> order(m_components.size());
+	for (size_t c = 0; c < order.size(); ++c)
+		order[c] = c;
+	std::stable_sort(order.begin(), order.end(),
+		[&](size_t a, size_t b) {return m_components[a].nodes.size() > m_components[b].nodes.size();});
+	vector<ComboResult> results(m_components.size());
+	ParallelFor(order.size(), settings.n_threads, [&](size_t k) {
+		const Component& component = m_components[order[k]];
+		ComboSettings local_settings = component_settings;
+		if (settings.initial_communities.has_value()) {
+			local_settings.initial_communities = vector<size_t>(component.nodes.size());
+			for (size_t i = 0; i < component.nodes.size(); ++i)
+				local_settings.initial_communities.value()[i] = settings.initial_communities.value()[component.nodes[i]];
+		}
+		results[order[k]] = std::visit([&](const auto& graph) {
+			if (graph.Size() <= SMALL_COMPONENT_SIZE)
+				return SolveExhaustively(graph, local_settings);
+			return RunGraph(graph, local_settings);
+		}, component.graph);
+	});
+	// communities of components get consecutive labels, modularity of component is W / W_k times its contribution
+	auto combine = [&](auto component_result) {
+		ComboResult result;
+		result.communities.resize(m_size);
+		size_t offset = 0;
+		for (size_t c = 0; c < m_components.size(); ++c) {
+			const ComboResult& local = component_result(c);
+			const vector<size_t>& nodes = m_components[c].nodes;
+			size_t number = 0;
+			for (size_t i = 0; i < nodes.size(); ++i) {
+				result.communities[nodes[i]] = offset + local.communities[i];
+				number = std::max(number, local.communities[i] + 1);
+			}
+			offset += number;
+			result.modularity += m_components[c].weight_share * local.modularity;
+			result.converged = result.converged && local.converged;
+			result.stats.Add(local.stats);
+		}
+		result.communities = RelabelCommunities(result.communities);
+		return result;
+	};
+	ComboResult result = combine([&](size_t c) -> const ComboResult& {return results[c];});
+	if (settings.return_restarts)
+		for (size_t restart = 0; restart < settings.n_restarts; ++restart)
+			result.restarts.push_back(combine([&](size_t c) -> const ComboResult& {return results[c].restarts[restart];}));
+	return result;
+}
+
+vector<double> PreparedGraph::Modularity(const vector<vector<size_t>>& partitions, size_t n_threads) const
+{
+	if (!m_graph.has_value() || !m_node_map.empty())
+		throw std::invalid_argument("modularity can not be evaluated for graph split into components or reduced");
+	for (const vector<size_t>& communities : partitions)
+		if (communities.size() != m_size)
+			throw std::invalid_argument("partition must give communities of all " + std::to_string(m_size) + " nodes");
+	vector<double> modularity(partitions.size());
+	ParallelFor(partitions.size(), n_threads, [&](size_t k) {
+		std::visit([&](const auto& graph) {
+			auto partitioned = graph;
+			partitioned.SetCommunities(RelabelCommunities(partitions[k]));
+			modularity[k] = partitioned.Modularity();
+		}, m_graph.value());
+	});
+	return modularity;
+}
+
+namespace
+{
+// Diagnostics with community sizes and per-community arrays allocated, other values left to graph models
+PartitionDiagnostics EmptyDiagnostics(const vector<size_t>& communities)
+{
+	size_t number = communities.empty() ? 0 : 1 + *std::max_element(communities.begin(), communities.end());
+	PartitionDiagnostics diagnostics;
+	diagnostics.community_sizes.assign(number, 0);
+	for (size_t community : communities)
+		++diagnostics.community_sizes[community];
+	diagnostics.internal_weights.assign(number, 0.0);
+	diagnostics.strengths.assign(number, 0.0);
+	diagnostics.modularity_contributions.assign(number, 0.0);
+	diagnostics.best_communities.assign(communities.size(), -1);
+	diagnostics.best_gains.assign(communities.size(), std::numeric_limits<double>::quiet_NaN());
+	return diagnostics;
+}
+
+// Gain of moving node i from community A to D is 2 * (Q_iD - Q_i(A - i)) for symmetric matrix Q.
+// Weights within communities are recovered from their terms of modularity and the null model:
+// Q_XX = B_XX - resolution * OUT_X * IN_X.
+PartitionDiagnostics GraphDiagnostics(const DenseGraph& graph, const vector<size_t>& communities)
+{
+	const Matrix& matrix = graph.ModularityMatrix();
+	PartitionDiagnostics diagnostics = EmptyDiagnostics(communities);
+	size_t number = diagnostics.community_sizes.size();
+	// Q_iX over j != i in community X
+	vector<double> connections(number);
+	for (size_t i = 0; i < communities.size(); ++i) {
+		std::fill(connections.begin(), connections.end(), 0.0);
+		for (size_t j = 0; j < communities.size(); ++j)
+			if (j != i)
+				connections[communities[j]] += matrix[i][j];
+		size_t origin = communities[i];
+		diagnostics.modularity_contributions[origin] += connections[origin] + matrix[i][i];
+		for (size_t community = 0; community < number; ++community) {
+			double gain = 2 * (connections[community] - connections[origin]);
+			if (community != origin && !(gain <= diagnostics.best_gains[i])) {
+				diagnostics.best_communities[i] = int64_t(community);
+				diagnostics.best_gains[i] = gain;
+			}
+		}
+	}
+	const NullModel* null_model = graph.GetNullModel();
+	if (null_model == nullptr) {
+		diagnostics.internal_weights.assign(number, std::numeric_limits<double>::quiet_NaN());
+		diagnostics.strengths.assign(number, std::numeric_limits<double>::quiet_NaN());
+		return diagnostics;
+	}
+	vector<double> community_out(number, 0.0), community_in(number, 0.0);
+	for (size_t i = 0; i < communities.size(); ++i) {
+		community_out[communities[i]] += null_model->out[i];
+		community_in[communities[i]] += null_model->in[i];
+	}
+	for (size_t community = 0; community < number; ++community) {
+		diagnostics.strengths[community] = (community_out[community] + community_in[community]) / 2;
+		diagnostics.internal_weights[community] = diagnostics.modularity_contributions[community]
+			+ graph.ModularityResolution() * community_out[community] * community_in[community];
+	}
+	return diagnostics;
+}
+
+// Q_iX = B_iX - c * (out_i * IN_X + in_i * OUT_X) with c = resolution / 2, as in local moves of RunMultilevel
+PartitionDiagnostics GraphDiagnostics(const SparseGraph& graph, const vector<size_t>& communities)
+{
+	const vector<size_t>& indptr = graph.Indptr();
+	const vector<size_t>& indices = graph.Indices();
+	const vector<double>& values = graph.Values();
+	const vector<double>& out = graph.OutStrengths();
+	const vector<double>& in = graph.InStrengths();
+	double rank_coefficient = graph.ModularityResolution() / 2;
+	PartitionDiagnostics diagnostics = EmptyDiagnostics(communities);
+	size_t number = diagnostics.community_sizes.size();
+	vector<double> community_out(number, 0.0), community_in(number, 0.0);
+	for (size_t i = 0; i < communities.size(); ++i) {
+		community_out[communities[i]] += out[i];
+		community_in[communities[i]] += in[i];
+	}
+	// B_iX for communities X of neighbors of the current node, zeroed after each node
+	vector<double> neighbor_weights(number, 0.0);
+	vector<size_t> neighbor_communities;
+	for (size_t i = 0; i < communities.size(); ++i) {
+		size_t origin = communities[i];
+		neighbor_communities.push_back(origin);
+		for (size_t k = indptr[i]; k < indptr[i + 1]; ++k) {
+			size_t community = communities[indices[k]];
+			if (community == origin)
+				diagnostics.internal_weights[origin] += values[k];
+			if (indices[k] == i)
+				continue;
+			if (neighbor_weights[community] == 0)
+				neighbor_communities.push_back(community);
+			neighbor_weights[community] += values[k];
+		}
+		auto connection = [&](size_t community) {
+			double other_out = community_out[community] - (community == origin ? out[i] : 0);
+			double other_in = community_in[community] - (community == origin ? in[i] : 0);
+			return neighbor_weights[community] - rank_coefficient * (out[i] * other_in + in[i] * other_out);
+		};
+		double origin_connection = connection(origin);
+		for (size_t community : neighbor_communities) {
+			double gain = 2 * (connection(community) - origin_connection);
+			if (community != origin && !(gain <= diagnostics.best_gains[i])) {
+				diagnostics.best_communities[i] = int64_t(community);
+				diagnostics.best_gains[i] = gain;
+			}
+		}
+		for (size_t community : neighbor_communities)
+			neighbor_weights[community] = 0;
+		neighbor_communities.clear();
+	}
+	for (size_t community = 0; community < number; ++community) {
+		diagnostics.strengths[community] = (community_out[community] + community_in[community]) / 2;
+		diagnostics.modularity_contributions[community] = diagnostics.internal_weights[community]
+			- 2 * rank_coefficient * community_out[community] * community_in[community];
+	}
+	return diagnostics;
+}
+}
+
+PartitionDiagnostics PreparedGraph::Diagnostics(const vector<size_t>& communities) const
+{
+	if (communities.size() != Size())
+		throw std::invalid_argument("partition must give communities of all " + std::to_string(Size()) + " nodes");
+	if (m_node_map.empty())
+		return DiagnosticsUnfolded(communities);
+	const size_t NONE = std::numeric_limits<size_t>::max();
+	vector<size_t> reduced(m_size, NONE);
+	for (size_t i = 0; i < m_node_map.size(); ++i) {
+		size_t& community = reduced[m_node_map[i]];
+		if (community != NONE && community != communities[i])
+			throw std::invalid_argument("communities must not split nodes folded together");
+		community = communities[i];
+	}
+	PartitionDiagnostics reduced_diagnostics = DiagnosticsUnfolded(reduced);
+	PartitionDiagnostics diagnostics = EmptyDiagnostics(communities);
+	diagnostics.internal_weights = std::move(reduced_diagnostics.internal_weights);
+	diagnostics.strengths = std::move(reduced_diagnostics.strengths);
+	diagnostics.modularity_contributions = std::move(reduced_diagnostics.modularity_contributions);
+	for (size_t i = 0; i < m_node_map.size(); ++i) {
+		diagnostics.best_communities[i] = reduced_diagnostics.best_communities[m_node_map[i]];
+		diagnostics.best_gains[i] = reduced_diagnostics.best_gains[m_node_map[i]];
+	}
+	return diagnostics;
+}
+
+// Diagnostics of components are scaled by their weight shares, as their modularity is
+PartitionDiagnostics PreparedGraph::DiagnosticsUnfolded(const vector<size_t>& communities) const
+{
+	if (m_graph.has_value())
+		return std::visit([&](const auto& graph) {return GraphDiagnostics(graph, communities);}, m_graph.value());
+	const size_t NONE = std::numeric_limits<size_t>::max();
+	PartitionDiagnostics diagnostics = EmptyDiagnostics(communities);
+	size_t number = diagnostics.community_sizes.size();
+	// component of each community, and its label within the component being processed
+	vector<size_t> owners(number, NONE), local_labels(number, NONE);
+	for (size_t c = 0; c < m_components.size(); ++c) {
+		const Component& component = m_components[c];
+		vector<size_t> labels(component.nodes.size());
+		vector<size_t> global_labels;
+		for (size_t a = 0; a < component.nodes.size(); ++a) {
+			size_t community = communities[component.nodes[a]];
+			if (local_labels[community] == NONE) {
+				if (owners[community] != NONE)
+					throw std::invalid_argument("communities must not span components");
+				owners[community] = c;
+				local_labels[community] = global_labels.size();
+				global_labels.push_back(community);
+			}
+			labels[a] = local_labels[community];
+		}
+		PartitionDiagnostics local = std::visit([&](const auto& graph) {return GraphDiagnostics(graph, labels);},
+			component.graph);
+		double share = component.weight_share;
+		for (size_t l = 0; l < global_labels.size(); ++l) {
+			size_t community = global_labels[l];
+			diagnostics.internal_weights[community] = share * local.internal_weights[l];
+			diagnostics.strengths[community] = share * local.strengths[l];
+			diagnostics.modularity_contributions[community] = share * local.modularity_contributions[l];
+			local_labels[community] = NONE;
+		}
+		for (size_t a = 0; a < component.nodes.size(); ++a) {
+			int64_t best = local.best_communities[a];
+			diagnostics.best_communities[component.nodes[a]] = best < 0 ? -1 : int64_t(global_labels[size_t(best)]);
+			diagnostics.best_gains[component.nodes[a]] = share * local.best_gains[a];
+		}
+	}
+	return diagnostics;
+}
+
+namespace
+{
+// Subgraph induced by nodes of community (of communities), local_index giving positions of nodes in the subgraph,
+// copied from rows of B of its nodes, since runs take own CSR arrays. Its B and strengths (row sums of B, i.e. strengths
+// within the subgraph of undirected graph) are divided by the weight of the subgraph, unless the graph has no null model
+// (treat_as_modularity)
+SparseGraph InducedSubgraph(const SparseGraph& graph, const vector<size_t>& nodes, size_t community,
+	const vector<size_t>& communities, const vector<size_t>& local_index, bool null_model)
+{
+	const vector<size_t>& indptr = graph.Indptr();
+	const vector<size_t>& indices = graph.Indices();
+	const vector<double>& values = graph.Values();
+	double total_weight = 0;
+	if (null_model)
+		for (size_t i : nodes)
+			for (size_t k = indptr[i]; k < indptr[i + 1]; ++k)
+				if (communities[indices[k]] == community)
+					total_weight += values[k];
+	double scale = total_weight > 0 ? 1 / total_weight : 1;
+	SparseGraphBuilder builder(nodes.size());
+	for (size_t a = 0; a < nodes.size(); ++a) {
+		size_t i = nodes[a];
+		for (size_t k = indptr[i]; k < indptr[i + 1]; ++k) {
+			size_t j = indices[k];
+			if (communities[j] != community)
+				continue;
+			// B is symmetric, each pair of nodes is added once
+			if (local_index[j] >= a)
+				builder.AddSymmetric(a, local_index[j], values[k] * scale);
+			if (null_model && total_weight > 0) {
+				builder.OutStrengths()[a] += values[k] * scale;
+				builder.InStrengths()[a] += values[k] * scale;
+			}
+		}
+	}
+	return builder.Build(graph.ModularityResolution(), total_weight > 0 ? total_weight * graph.TotalWeight() : 1);
+}
+
+// Sparse form of dense graph, B recovered with the null model as in GetCommunityGraph, in O(n^2) time
+SparseGraph ToSparseGraph(const DenseGraph& graph)
+{
+	const NullModel& null_model = *graph.GetNullModel();
+	SparseGraphBuilder builder(graph.Size());
+	for (size_t i = 0; i < graph.Size(); ++i)
+		for (size_t j = i; j < graph.Size(); ++j) {
+			double value = graph.Adjacency(i, j);
+			if (value != 0)
+				builder.AddSymmetric(i, j, value);
+		}
+	builder.OutStrengths() = null_model.out;
+	builder.InStrengths() = null_model.in;
+	return builder.Build(graph.ModularityResolution(), null_model.total_weight, null_model.is_directed);
+}
+}
+
+Dendrogram PreparedGraph::RunHierarchical(const ComboSettings& settings, size_t levels, size_t min_size) const
+{
+	if (!m_graph.has_value() || !m_node_map.empty())
+		throw std::invalid_argument("hierarchical partitioning can not be used with graph split into components or reduced");
+	if (!IsSparse() && std::get<DenseGraph>(m_graph.value()).GetNullModel() == nullptr)
+		throw std::invalid_argument("hierarchical partitioning of modularity matrix read from file requires sparse graph");
+	if (levels == 0)
+		throw std::invalid_argument("levels must be positive");
+	if (settings.TracesPartitions())
+		throw std::invalid_argument("intermediate results can not be used with hierarchical partitioning");
+	// subgraphs are taken from sparse matrix, built from dense one if needed
+	SparseGraph graph = IsSparse() ? std::get<SparseGraph>(m_graph.value())
+		: ToSparseGraph(std::get<DenseGraph>(m_graph.value()));
+	// B of subgraphs of directed graph keeps no directions, so their strengths within the subgraph are not known
+	if (levels > 1 && graph.IsDirected())
+		throw std::invalid_argument("hierarchical partitioning of directed graph can only have one level");
+	ComboSettings level_settings = settings;
+	level_settings.return_restarts = false;
+	level_settings.intermediate_results_path = std::nullopt;
+	level_settings.partitions = nullptr;
+	if (!settings.random_seed.has_value())
+		level_settings.random_seed = std::random_device()();
+
+	ComboResult first = std::visit([&](const auto& graph) {return RunGraph(graph, level_settings);}, m_graph.value());
+	Dendrogram dendrogram;
+	dendrogram.modularity = first.modularity;
+	dendrogram.communities = std::move(first.communities);
+	// members of communities of the last level, the first of them being community `offset` of the dendrogram
+	vector<vector<size_t>> members;
+	for (size_t i = 0; i < m_size; ++i) {
+		size_t community = dendrogram.communities[i];
+		if (community >= members.size()) {
+			members.resize(community + 1);
+			dendrogram.parents.resize(community + 1, -1);
+			dendrogram.levels.resize(community + 1, 0);
+			dendrogram.sizes.resize(community + 1, 0);
+		}
+		members[community].push_back(i);
+		++dendrogram.sizes[community];
+	}
+	size_t offset = 0;
+	bool null_model = std::any_of(graph.OutStrengths().begin(), graph.OutStrengths().end(), [](double s) {return s != 0;});
+	vector<size_t> local_index(m_size);
+
+	level_settings.initial_communities = std::nullopt;
+	level_settings.n_threads = 1;
+	for (size_t level = 1; level < levels && !members.empty(); ++level) {
+		for (const vector<size_t>& nodes : members)
+			for (size_t a = 0; a < nodes.size(); ++a)
+				local_index[nodes[a]] = a;
+		// largest communities first, so that threads finish at about the same time
+		vector<size_t> order(members.size());
+		for (size_t c = 0; c < order.size(); ++c)
+			order[c] = c;
+		std::stable_sort(order.begin(), order.end(),
+			[&](size_t a, size_t b) {return members[a].size() > members[b].size();});
+		vector<ComboResult> results(members.size());
+		ParallelFor(order.size(), settings.n_threads, [&](size_t k) {
+			const vector<size_t>& nodes = members[order[k]];
+			if (nodes.size() < std::max<size_t>(min_size, 2))
+				return;
+			size_t community = offset + order[k];
+			SparseGraph subgraph = InducedSubgraph(graph, nodes, community, dendrogram.communities, local_index, null_model);
+			// siblings (e.g. communities of equal subgraphs) are run with seeds of their own
+			ComboSettings subgraph_settings = level_settings;
+			subgraph_settings.random_seed = RestartSeed(level_settings.random_seed.value(), community);
+			results[order[k]] = subgraph.Size() <= SMALL_COMPONENT_SIZE ? SolveExhaustively(subgraph, subgraph_settings)
+				: RunGraph(subgraph, subgraph_settings);
+		});
+		// communities split into several get children of the next level
+		size_t next_offset = dendrogram.parents.size();
+		vector<vector<size_t>> next_members;
+		for (size_t c = 0; c < members.size(); ++c) {
+			const vector<size_t>& local = results[c].communities;
+			size_t number = local.empty() ? 0 : 1 + *std::max_element(local.begin(), local.end());
+			if (number <= 1)
+				continue;
+			size_t first_child = dendrogram.parents.size();
+			dendrogram.parents.resize(first_child + number, int64_t(offset + c));
+			dendrogram.levels.resize(first_child + number, level);
+			dendrogram.sizes.resize(first_child + number, 0);
+			next_members.resize(next_members.size() + number);
+			for (size_t a = 0; a < local.size(); ++a) {
+				size_t child = first_child + local[a];
+				dendrogram.communities[members[c][a]] = child;
+				++dendrogram.sizes[child];
+				next_members[child - next_offset].push_back(members[c][a]);
+			}
+		}
+		offset = next_offset;
+		members = std::move(next_members);
+	}
+	return dendrogram;
+}
+
+CommunityGraph PreparedGraph::GetCommunityGraph(const vector<size_t>& communities) const
+{
+	if (!m_graph.has_value() || !m_node_map.empty())
+		throw std::invalid_argument("community graph can not be built for graph split into components or reduced");
+	if (!IsSparse() && std::get<DenseGraph>(m_graph.value()).GetNullModel() == nullptr)
+		throw std::invalid_argument("community graph can not be built for modularity matrix read from file");
+	if (communities.size() != m_size)
+		throw std::invalid_argument("partition must give communities of all " + std::to_string(m_size) + " nodes");
+	vector<size_t> relabeled = RelabelCommunities(communities);
+	CommunityGraph community_graph;
+	for (size_t i = 0; i < m_size; ++i) {
+		if (relabeled[i] == community_graph.sizes.size()) {
+			community_graph.sizes.push_back(0);
+			community_graph.first_nodes.push_back(i);
+		}
+		++community_graph.sizes[relabeled[i]];
+	}
+	size_t number = community_graph.sizes.size();
+	double total_weight;
+	if (IsSparse()) {
+		const SparseGraph& graph = std::get<SparseGraph>(m_graph.value());
+		SparseGraph aggregated = Aggregate(graph, relabeled, number);
+		community_graph.indptr = aggregated.Indptr();
+		community_graph.indices = aggregated.Indices();
+		community_graph.weights = aggregated.Values();
+		total_weight = graph.TotalWeight();
+	} else {
+		// B_PQ summed up over rows of each community, O(n^2) as the dense matrix itself
+		const DenseGraph& graph = std::get<DenseGraph>(m_graph.value());
+		vector<vector<size_t>> members(number);
+		for (size_t i = 0; i < m_size; ++i)
+			members[relabeled[i]].push_back(i);
+		vector<double> row(number, 0.0);
+		vector<bool> touched(number, false);
+		vector<size_t> columns;
+		community_graph.indptr.push_back(0);
+		for (size_t p = 0; p < number; ++p) {
+			for (size_t i : members[p])
+				for (size_t j = 0; j < m_size; ++j) {
+					double value = graph.Adjacency(i, j);
+					if (value == 0)
+						continue;
+					size_t q = relabeled[j];
+					if (!touched[q]) {
+						touched[q] = true;
+						columns.push_back(q);
+					}
+					row[q] += value;
+				}
+			std::sort(columns.begin(), columns.end());
+			for (size_t q : columns) {
+				community_graph.indices.push_back(q);
+				community_graph.weights.push_back(row[q]);
+				row[q] = 0;
+				touched[q] = false;
+			}
+			columns.clear();
+			community_graph.indptr.push_back(community_graph.indices.size());
+		}
+		total_weight = graph.GetNullModel()->total_weight;
+	}
+	// B_PQ holds a half of weight between communities P and Q (the other half is B_QP), B_PP all weight within P,
+	// as fractions of the total weight
+	for (size_t p = 0; p < number; ++p)
+		for (size_t k = community_graph.indptr[p]; k < community_graph.indptr[p + 1]; ++k)
+			community_graph.weights[k] *= community_graph.indices[k] != p ? 2 * total_weight : total_weight;
+	return community_graph;
+}
+
+PreparedGraph PreparedGraph::WithResolution(double modularity_resolution) const
+{
+	if (!IsSparse())
+		throw std::invalid_argument("modularity resolution of dense graph can not be changed, use sparse graph");
+	auto with_resolution = [&]() {
+		if (m_graph.has_value())
+			return PreparedGraph(std::get<SparseGraph>(m_graph.value()).WithResolution(modularity_resolution));
+		vector<Component> components;
+		components.reserve(m_components.size());
+		for (const Component& component : m_components)
+			components.push_back({component.nodes,
+				std::get<SparseGraph>(component.graph).WithResolution(modularity_resolution * component.weight_share),
+				component.weight_share});
+		return PreparedGraph(m_size, std::move(components));
+	};
+	PreparedGraph graph = with_resolution();
+	graph.m_node_map = m_node_map;
+	return graph;
+}
+
+string PreparedGraph::Serialize() const
+{
+	BinaryWriter writer;
+	writer.Write<uint32_t>(FORMAT_MAGIC);
+	writer.Write<uint8_t>(FORMAT_VERSION);
+	if (!m_node_map.empty()) {
+		// node map goes first, followed by the graph nodes are folded into
+		bool short_indices = m_size <= std::numeric_limits<uint32_t>::max();
+		writer.Write<uint8_t>(FOLDED);
+		writer.Write<uint8_t>(short_indices ? SHORT_INDICES : 0);
+		writer.Write<uint64_t>(m_node_map.size());
+		if (short_indices)
+			writer.WriteArray<uint32_t>(m_node_map);
+		else
+			writer.WriteArray<uint64_t>(m_node_map);
+	}
+	if (m_graph.has_value()) {
+		::Serialize(m_graph.value(), writer);
+		return std::move(writer.Data());
+	}
+	bool short_indices = m_size <= std::numeric_limits<uint32_t>::max();
+	writer.Write<uint8_t>(COMPONENTS);
+	writer.Write<uint8_t>(short_indices ? SHORT_INDICES : 0);
+	writer.Write<uint64_t>(m_size);
+	writer.Write<uint64_t>(m_components.size());
+	for (const Component& component : m_components) {
+		writer.Write<double>(component.weight_share);
+		writer.Write<uint64_t>(component.nodes.size());
+		if (short_indices)
+			writer.WriteArray<uint32_t>(component.nodes);
+		else
+			writer.WriteArray<uint64_t>(component.nodes);
+		::Serialize(component.graph, writer);
+	}
+	return std::move(writer.Data());
+}
+
+PreparedGraph PreparedGraph::Deserialize(const string& data)
+{
+	BinaryReader reader(data);
+	if (reader.Read<uint32_t>() != FORMAT_MAGIC)
+		throw std::invalid_argument("data is not a serialized graph or has different byte order");
+	if (reader.Read<uint8_t>() != FORMAT_VERSION)
+		throw std::invalid_argument("unsupported version of serialized graph");
+	uint8_t kind = reader.Read<uint8_t>();
+	uint8_t flags = reader.Read<uint8_t>();
+	vector<size_t> node_map;
+	if (kind == FOLDED) {
+		size_t size = size_t(reader.Read<uint64_t>());
+		node_map = (flags & SHORT_INDICES) ? reader.ReadArray<uint32_t, size_t>(size) : reader.ReadArray<uint64_t, size_t>(size);
+		if (node_map.empty())
+			throw std::invalid_argument("serialized graph is corrupted");
+		kind = reader.Read<uint8_t>();
+		flags = reader.Read<uint8_t>();
+	}
+	if (kind != DENSE && kind != SPARSE && kind != COMPONENTS)
+		throw std::invalid_argument("serialized graph is corrupted");
+	auto read_graph = [&]() -> PreparedGraph {
+		if (kind == DENSE)
+			return PreparedGraph(DeserializeDense(reader, flags));
+		if (kind == SPARSE)
+			return PreparedGraph(DeserializeSparse(reader, flags));
+		size_t size = size_t(reader.Read<uint64_t>());
+		size_t num_components = size_t(reader.Read<uint64_t>());
+		if (size > reader.Remaining() / sizeof(uint32_t))
+			throw std::invalid_argument("serialized graph is truncated");
+		// each component takes at least its share, size of nodes and graph header
+		if (num_components > reader.Remaining() / (sizeof(double) + sizeof(uint64_t) + 2))
+			throw std::invalid_argument("serialized graph is truncated");
+		vector<Component> components;
+		components.reserve(num_components);
+		vector<bool> seen(size, false);
+		for (size_t c = 0; c < num_components; ++c) {
+			double weight_share = reader.Read<double>();
+			size_t num_nodes = size_t(reader.Read<uint64_t>());
+			vector<size_t> nodes = (flags & SHORT_INDICES) ? reader.ReadArray<uint32_t, size_t>(num_nodes)
+				: reader.ReadArray<uint64_t, size_t>(num_nodes);
+			for (size_t i : nodes) {
+				if (i >= size || seen[i])
+					throw std::invalid_argument("serialized graph is corrupted");
+				seen[i] = true;
+			}
+			Graph graph = DeserializeGraph(reader);
+			if (std::visit([](const auto& graph) {return graph.Size();}, graph) != num_nodes)
+				throw std::invalid_argument("serialized graph is corrupted");
+			components.push_back({std::move(nodes), std::move(graph), weight_share});
+		}
+		if (std::find(seen.begin(), seen.end(), false) != seen.end())
+			throw std::invalid_argument("serialized graph is corrupted");
+		return PreparedGraph(size, std::move(components));
+	};
+	PreparedGraph graph = read_graph();
+	if (!reader.AtEnd())
+		throw std::invalid_argument("serialized graph is corrupted");
+	try {
+		graph.SetNodeMap(std::move(node_map));
+	} catch (const std::invalid_argument&) {
+		throw std::invalid_argument("serialized graph is corrupted");
+	}
+	return graph;
+}
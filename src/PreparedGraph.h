@@ -0,0 +1,316 @@
+#ifndef PREPARED_GRAPH_H
+#define PREPARED_GRAPH_H
+
+#include "ComboRun.h"
+#include "DenseGraph.h"
+#include "SparseGraph.h"
+
+#include <algorithm>
+#include <cstddef>
+#include <optional>
+#include <stdexcept>
+#include <string>
+#include <utility>
+#include <variant>
+#include <vector>
+
+// Sparse representation is used by default when (treat_as_modularity is false and)
+// fraction of non-zero entries of adjacency matrix is below this value
+const double SPARSE_MAX_DENSITY = 0.05;
+
+inline bool UseSparse(std::optional<bool> sparse, size_t num_entries, size_t size, bool treat_as_modularity)
+{
+	if (sparse.has_value())
+		return sparse.value();
+	return !treat_as_modularity && double(num_entries) < SPARSE_MAX_DENSITY * double(size) * double(size);
+}
+
+// Components of at most this many nodes are partitioned exactly, by enumeration of all partitions
+const size_t SMALL_COMPONENT_SIZE = 5;
+
+// Quality of communities of a partition and of assignment of nodes to them, see PreparedGraph::Diagnostics
+struct PartitionDiagnostics
+{
+	// per community: number of nodes, weight of edges within it and strength of its nodes (average of out and in)
+	// as fractions of the total, NaN for dense graphs read from files, whose null model is not known
+	std::vector<size_t> community_sizes;
+	std::vector<double> internal_weights;
+	std::vector<double> strengths;
+	// per community: its term of modularity, the terms sum up to modularity of the partition
+	std::vector<double> modularity_contributions;
+	// per node: other community with the highest modularity gain of moving the node there (among communities
+	// of its neighbors for sparse graphs), -1 and NaN gain if there is none
+	std::vector<int64_t> best_communities;
+	std::vector<double> best_gains;
+};
+
+// Graph of communities of a partition, see PreparedGraph::GetCommunityGraph.
+// Communities are numbered in order of their first nodes.
+struct CommunityGraph
+{
+	// per community: number of nodes and index of its first node
+	std::vector<size_t> sizes;
+	std::vector<size_t> first_nodes;
+	// symmetric CSR matrix of summed weights of edges between communities (in both directions for directed graphs)
+	// and within them (on the diagonal), in units of weights of the graph (as given for treat_as_modularity)
+	std::vector<size_t> indptr;
+	std::vector<size_t> indices;
+	std::vector<double> weights;
+};
+
+// Communities of several levels found by PreparedGraph::RunHierarchical: communities of the first level,
+// then communities they are split into, and so on, numbered level by level (children of a community consecutively)
+struct Dendrogram
+{
+	// per community: parent community (-1 for the first level), its level (0 for the first) and number of nodes
+	std::vector<int64_t> parents;
+	std::vector<size_t> levels;
+	std::vector<size_t> sizes;
+	// per node: community of the deepest level the node belongs to
+	std::vector<size_t> communities;
+	// modularity of the first level partition
+	double modularity = 0;
+};
+
+// Dense or sparse graph with modularity matrix built once, to be partitioned by many runs of Combo.
+// Runs work on copies sharing the matrix, so the graph itself is never modified.
+// The graph may be split into connected components: communities of a partition with the highest
+// modularity never span several components, so they are partitioned independently. Each component
+// has own normalization (total weight W_k of its edges) and resolution scaled by W_k / W, so that
+// its modularity is W / W_k times its contribution to modularity of the whole graph.
+class PreparedGraph
+{
+public:
+	typedef std::variant<DenseGraph, SparseGraph> Graph;
+
+	struct Component
+	{
+		// indices of nodes of the component in the whole graph
+		std::vector<size_t> nodes;
+		Graph graph;
+		// W_k / W (0 for isolated nodes), 1 for modularity matrices given explicitly (treat_as_modularity)
+		double weight_share;
+	};
+
+	explicit PreparedGraph(DenseGraph&& graph) : m_size(graph.Size()), m_graph(std::move(graph)) {}
+	explicit PreparedGraph(SparseGraph&& graph) : m_size(graph.Size()), m_graph(std::move(graph)) {}
+	PreparedGraph(size_t size, std::vector<Component>&& components);
+
+	size_t Size() const {return m_node_map.empty() ? m_size : m_node_map.size();}
+	// number of nodes partitioned by Combo, smaller than Size if nodes are folded
+	size_t ReducedSize() const {return m_size;}
+	// 0 if the graph is not split into components
+	size_t NumberOfComponents() const {return m_components.size();}
+	bool IsSparse() const;
+	size_t MemoryBytes() const;
+	// time spent building the graph from input, set by the builder; not serialized
+	double BuildSeconds() const {return m_build_seconds;}
+	void SetBuildSeconds(double seconds) {m_build_seconds = seconds;}
+
+	// Components are run in parallel on settings.n_threads threads, largest first, restarts of each
+	// component run on its thread; the best partitions of components are combined.
+	// max_communities and intermediate results can not be used with components.
+	ComboResult Run(const ComboSettings& settings) const;
+	// Modularity of partitions given as community labels (any values) of all nodes, computed on n_threads threads
+	// (0 means number of hardware threads) on copies sharing the matrix. Partitions of graphs split into components
+	// or reduced can not be evaluated, since their matrices do not hold modularity of communities spanning them.
+	std::vector<double> Modularity(const std::vector<std::vector<size_t>>& partitions, size_t n_threads = 1) const;
+	// Diagnostics of partition given as community labels 0, 1, ..., k - 1 of all nodes (e.g. of ComboResult),
+	// computed in a pass over the matrix. Communities must not span components, nor split nodes folded together,
+	// as communities found by runs never do; folded nodes get per-node values of the node they are folded into.
+	PartitionDiagnostics Diagnostics(const std::vector<size_t>& communities) const;
+	// Graph of communities of partition given as community labels (any values) of all nodes, aggregated from the matrix
+	// as multilevel partitioning aggregates levels (dense: from B recovered with the null model, in O(n^2) time);
+	// requires graph not split into components or reduced, nor modularity matrix read from file.
+	CommunityGraph GetCommunityGraph(const std::vector<size_t>& communities) const;
+	// Partitions the graph, then splits each community of at least min_size nodes by Combo run on its induced
+	// subgraph, normalized by its own weight as if it were a separate graph, and so on up to the given number
+	// of levels. Subgraphs are copied from the sparse matrix (built from dense one with the null model),
+	// subgraphs of a level are run in parallel on settings.n_threads threads, largest first, each with seed
+	// RestartSeed(random_seed, its community). The sparse matrix keeps directed graphs symmetrized, so they
+	// can only have one level. Requires graph not split into components or reduced, nor dense matrix read from file.
+	Dendrogram RunHierarchical(const ComboSettings& settings, size_t levels, size_t min_size) const;
+	// copy of sparse graph sharing its matrix arrays, dense modularity matrix can not be changed
+	PreparedGraph WithResolution(double modularity_resolution) const;
+	// Makes the graph a reduced form of a larger one: node i of the larger graph is folded into node node_map[i].
+	// Runs take and return communities of the larger graph.
+	void SetNodeMap(std::vector<size_t>&& node_map);
+
+	// Compact binary form: header, then upper triangle of dense (symmetric) matrix,
+	// or CSR arrays and strengths of sparse one with 32-bit indices where they fit
+	std::string Serialize() const;
+	static PreparedGraph Deserialize(const std::string& data);
+
+private:
+	size_t m_size;
+	// whole graph, if it is not split into components
+	std::optional<Graph> m_graph;
+	std::vector<Component> m_components;
+	// node of this graph each node of the original graph is folded into, empty if nodes are not folded
+	std::vector<size_t> m_node_map;
+	double m_build_seconds = 0;
+
+	// runs the graph itself, ignoring node map
+	ComboResult RunUnfolded(const ComboSettings& settings) const;
+	ComboResult RunReduced(const ComboSettings& settings) const;
+	ComboResult RunComponents(const ComboSettings& settings) const;
+	// diagnostics of the graph itself, ignoring node map
+	PartitionDiagnostics DiagnosticsUnfolded(const std::vector<size_t>& communities) const;
+};
+
+// Union-find over edges with non-zero weights; returns component index of each node,
+// components are numbered in order of their first nodes
+template<typename Index, typename Weight>
+std::vector<size_t> ConnectedComponents(size_t size, const Index* sources, const Index* destinations,
+	const Weight* weights, size_t num_edges, size_t& num_components)
+{
+	std::vector<size_t> parents(size);
+	for (size_t i = 0; i < size; ++i)
+		parents[i] = i;
+	auto find = [&](size_t i) {
+		while (parents[i] != i)
+			i = parents[i] = parents[parents[i]];
+		return i;
+	};
+	for (size_t k = 0; k < num_edges; ++k)
+		if (weights[k] != 0) {
+			size_t a = find(size_t(sources[k])), b = find(size_t(destinations[k]));
+			if (a != b)
+				parents[std::max(a, b)] = std::min(a, b);
+		}
+	// roots are the smallest nodes of components
+	std::vector<size_t> components(size);
+	num_components = 0;
+	for (size_t i = 0; i < size; ++i)
+		components[i] = find(i) == i ? num_components++ : components[find(i)];
+	return components;
+}
+
+// Dense graph with its null model, built by ModularityMatrixFromEdges (or FillModularityMatrixFromEdges)
+template<typename Index, typename Weight>
+DenseGraph DenseGraphFromEdges(size_t size, const Index* sources, const Index* destinations, const Weight* weights,
+	size_t num_edges, bool is_directed, double modularity_resolution, bool treat_as_modularity)
+{
+	if (treat_as_modularity)
+		return DenseGraph(FillModularityMatrixFromEdges(size, sources, destinations, weights, num_edges, is_directed),
+			ZeroNullModel(size), modularity_resolution);
+	NullModel null_model;
+	Matrix matrix = ModularityMatrixFromEdges(size, sources, destinations, weights, num_edges, is_directed,
+		modularity_resolution, &null_model);
+	return DenseGraph(std::move(matrix), std::move(null_model), modularity_resolution);
+}
+
+// Graph split into connected components, each built as SparseGraphFromEdges (or dense
+// ModularityMatrixFromEdges) would build it for its own edges, with resolution scaled by its weight share
+template<typename Index, typename Weight>
+PreparedGraph ComponentGraphFromEdges(size_t size, const Index* sources, const Index* destinations, const Weight* weights,
+	size_t num_edges, bool is_directed, double modularity_resolution, bool treat_as_modularity, std::optional<bool> sparse)
+{
+	CheckEdgeIndices(size, sources, destinations, num_edges);
+	size_t num_components = 0;
+	std::vector<size_t> component_of = ConnectedComponents(size, sources, destinations, weights, num_edges, num_components);
+	std::vector<std::vector<size_t>> nodes(num_components);
+	std::vector<size_t> local_index(size);
+	for (size_t i = 0; i < size; ++i) {
+		local_index[i] = nodes[component_of[i]].size();
+		nodes[component_of[i]].push_back(i);
+	}
+	std::vector<std::vector<size_t>> component_sources(num_components), component_destinations(num_components);
+	std::vector<std::vector<double>> component_weights(num_components);
+	std::vector<double> component_total(num_components, 0.0);
+	double total_weight = 0.0;
+	for (size_t k = 0; k < num_edges; ++k) {
+		if (weights[k] == 0)
+			continue;
+		size_t source = size_t(sources[k]), destination = size_t(destinations[k]);
+		size_t component = component_of[source];
+		component_sources[component].push_back(local_index[source]);
+		component_destinations[component].push_back(local_index[destination]);
+		component_weights[component].push_back(double(weights[k]));
+		component_total[component] += double(weights[k]);
+		total_weight += double(weights[k]);
+	}
+	std::vector<PreparedGraph::Component> components;
+	components.reserve(num_components);
+	for (size_t c = 0; c < num_components; ++c) {
+		size_t component_size = nodes[c].size();
+		size_t num_component_edges = component_weights[c].size();
+		const size_t* src = component_sources[c].data();
+		const size_t* dst = component_destinations[c].data();
+		const double* wgt = component_weights[c].data();
+		double weight_share = treat_as_modularity ? 1.0 : 0.0;
+		if (!treat_as_modularity && num_component_edges > 0) {
+			if (component_total[c] <= 0 || total_weight <= 0)
+				throw std::invalid_argument("components with non-positive total weight can not be partitioned separately");
+			weight_share = component_total[c] / total_weight;
+		}
+		double resolution = modularity_resolution * weight_share;
+		PreparedGraph::Graph graph = [&]() -> PreparedGraph::Graph {
+			// isolated nodes have no normalization, their matrix is zero
+			if (num_component_edges == 0 || UseSparse(sparse, 2 * num_component_edges, component_size, treat_as_modularity))
+				return SparseGraphFromEdges(component_size, src, dst, wgt, num_component_edges, is_directed, resolution,
+					treat_as_modularity);
+			return DenseGraphFromEdges(component_size, src, dst, wgt, num_component_edges, is_directed, resolution,
+				treat_as_modularity);
+		}();
+		components.push_back({std::move(nodes[c]), std::move(graph), weight_share});
+	}
+	return PreparedGraph(size, std::move(components));
+}
+
+// Whole graph (or its components) built from edges, stored sparsely if UseSparse
+template<typename Index, typename Weight>
+PreparedGraph PreparedGraphFromEdges(size_t size, const Index* sources, const Index* destinations, const Weight* weights,
+	size_t num_edges, bool is_directed, double modularity_resolution, bool treat_as_modularity, std::optional<bool> sparse,
+	bool components)
+{
+	if (components)
+		return ComponentGraphFromEdges(size, sources, destinations, weights, num_edges, is_directed, modularity_resolution,
+			treat_as_modularity, sparse);
+	if (UseSparse(sparse, 2 * num_edges, size, treat_as_modularity))
+		return PreparedGraph(SparseGraphFromEdges(size, sources, destinations, weights, num_edges, is_directed,
+			modularity_resolution, treat_as_modularity));
+	return PreparedGraph(DenseGraphFromEdges(size, sources, destinations, weights, num_edges, is_directed,
+		modularity_resolution, treat_as_modularity));
+}
+
+// Entries of a square adjacency matrix as directed edges, normalized as ModularityMatrixFromCSR
+// (and FromDense) would normalize the matrix: loops of undirected graphs are counted twice
+struct EdgeList
+{
+	std::vector<size_t> sources;
+	std::vector<size_t> destinations;
+	std::vector<double> weights;
+
+	void Add(size_t source, size_t destination, double weight, bool double_loops)
+	{
+		sources.push_back(source);
+		destinations.push_back(destination);
+		weights.push_back(double_loops && source == destination ? 2 * weight : weight);
+	}
+};
+
+template<typename Index, typename Weight>
+EdgeList EdgesFromCSR(size_t size, const Index* indptr, const Index* indices, const Weight* data, bool double_loops)
+{
+	CheckCSRIndices(size, indptr, indices);
+	EdgeList edges;
+	for (size_t i = 0; i < size; ++i)
+		for (Index k = indptr[i]; k < indptr[i+1]; ++k)
+			if (data[k] != 0)
+				edges.Add(i, size_t(indices[k]), double(data[k]), double_loops);
+	return edges;
+}
+
+template<typename Rows>
+EdgeList EdgesFromDense(size_t size, const Rows& rows, bool double_loops)
+{
+	EdgeList edges;
+	for (size_t i = 0; i < size; ++i)
+		for (size_t j = 0; j < size; ++j)
+			if (rows[i][j] != 0)
+				edges.Add(i, j, double(rows[i][j]), double_loops);
+	return edges;
+}
+
+#endif //PREPARED_GRAPH_H
@@ -0,0 +1,138 @@
+#ifndef REDUCTION_H
+#define REDUCTION_H
+
+#include "ModularityMatrix.h"
+#include "PreparedGraph.h"
+
+#include <algorithm>
+#include <cmath>
+#include <cstddef>
+#include <optional>
+#include <stdexcept>
+#include <utility>
+#include <vector>
+
+// Graph with pendant trees and chains folded into their attachment nodes
+struct FoldedGraph
+{
+	size_t size = 0;
+	// node of the folded graph each original node is folded into
+	std::vector<size_t> node_map;
+	EdgeList edges;
+};
+
+// Folds pendant nodes (a single neighbor, loops aside) into their neighbors, repeatedly, so that
+// trees and chains hanging off the graph become weighted supernodes. Edges inside a supernode become
+// its loops, so total weight and strengths are kept and every partition of the folded graph has
+// the same modularity as its expansion.
+// A single pendant node is always in the community of its neighbor in the best partition (for
+// resolution <= 1), while a larger fringe S joined by an edge of weight w is better off in the community
+// of its attachment while that community's strength is below W * w / (resolution * k_S), W being the
+// total strength and k_S the strength of S. Folding stops at fringes for which that bound drops below
+// sqrt(W), below which modularity does not resolve communities anyway, so that e.g. large tree
+// components are not collapsed into a single community.
+template<typename Index, typename Weight>
+FoldedGraph FoldFringes(size_t size, const Index* sources, const Index* destinations, const Weight* weights,
+	size_t num_edges, double modularity_resolution)
+{
+	CheckEdgeIndices(size, sources, destinations, num_edges);
+	std::vector<double> strengths(size, 0.0);
+	double total_strength = 0.0;
+	// adjacency without loops in CSR form, parallel edges (and both directions) are merged below
+	std::vector<size_t> indptr(size + 1, 0);
+	for (size_t k = 0; k < num_edges; ++k) {
+		if (weights[k] < 0)
+			throw std::invalid_argument("graphs with negative weights can not be reduced");
+		size_t source = size_t(sources[k]), destination = size_t(destinations[k]);
+		strengths[source] += double(weights[k]);
+		strengths[destination] += double(weights[k]);
+		total_strength += 2 * double(weights[k]);
+		if (source != destination && weights[k] != 0) {
+			++indptr[source + 1];
+			++indptr[destination + 1];
+		}
+	}
+	for (size_t i = 0; i < size; ++i)
+		indptr[i + 1] += indptr[i];
+	std::vector<std::pair<size_t, double>> neighbors(indptr[size]);
+	std::vector<size_t> positions(indptr.begin(), indptr.end() - 1);
+	for (size_t k = 0; k < num_edges; ++k) {
+		size_t source = size_t(sources[k]), destination = size_t(destinations[k]);
+		if (source != destination && weights[k] != 0) {
+			neighbors[positions[source]++] = {destination, double(weights[k])};
+			neighbors[positions[destination]++] = {source, double(weights[k])};
+		}
+	}
+	std::vector<size_t> degrees(size);
+	for (size_t i = 0; i < size; ++i) {
+		auto begin = neighbors.begin() + indptr[i], end = neighbors.begin() + indptr[i + 1];
+		std::sort(begin, end);
+		size_t degree = 0;
+		for (auto it = begin; it != end; ++it)
+			degree += it == begin || it->first != (it - 1)->first;
+		degrees[i] = degree;
+	}
+
+	double max_fringe_strength = std::sqrt(total_strength) / modularity_resolution;
+	std::vector<size_t> parents(size);
+	std::vector<size_t> pendant;
+	for (size_t i = 0; i < size; ++i) {
+		parents[i] = i;
+		if (degrees[i] == 1)
+			pendant.push_back(i);
+	}
+	std::vector<bool> folded(size, false);
+	std::vector<size_t> folding_order;
+	while (!pendant.empty()) {
+		size_t node = pendant.back();
+		pendant.pop_back();
+		if (folded[node] || degrees[node] != 1)
+			continue;
+		// the only neighbor left and total weight of edges to it
+		size_t neighbor = size;
+		double weight = 0;
+		for (size_t k = indptr[node]; k < indptr[node + 1]; ++k)
+			if (!folded[neighbors[k].first]) {
+				neighbor = neighbors[k].first;
+				weight += neighbors[k].second;
+			}
+		if (strengths[node] > weight * max_fringe_strength)
+			continue;
+		folded[node] = true;
+		folding_order.push_back(node);
+		parents[node] = neighbor;
+		strengths[neighbor] += strengths[node];
+		if (--degrees[neighbor] == 1)
+			pendant.push_back(neighbor);
+	}
+
+	FoldedGraph graph;
+	graph.node_map.resize(size);
+	for (size_t i = 0; i < size; ++i)
+		if (!folded[i])
+			graph.node_map[i] = graph.size++;
+	// parent of a node is folded after it, if at all
+	for (auto it = folding_order.rbegin(); it != folding_order.rend(); ++it)
+		graph.node_map[*it] = graph.node_map[parents[*it]];
+	for (size_t k = 0; k < num_edges; ++k)
+		if (weights[k] != 0) {
+			graph.edges.sources.push_back(graph.node_map[size_t(sources[k])]);
+			graph.edges.destinations.push_back(graph.node_map[size_t(destinations[k])]);
+			graph.edges.weights.push_back(double(weights[k]));
+		}
+	return graph;
+}
+
+// PreparedGraphFromEdges of the graph with folded fringes, taking and returning communities of all nodes
+template<typename Index, typename Weight>
+PreparedGraph ReducedGraphFromEdges(size_t size, const Index* sources, const Index* destinations, const Weight* weights,
+	size_t num_edges, bool is_directed, double modularity_resolution, std::optional<bool> sparse, bool components)
+{
+	FoldedGraph folded = FoldFringes(size, sources, destinations, weights, num_edges, modularity_resolution);
+	PreparedGraph graph = PreparedGraphFromEdges(folded.size, folded.edges.sources.data(), folded.edges.destinations.data(),
+		folded.edges.weights.data(), folded.edges.weights.size(), is_directed, modularity_resolution, false, sparse, components);
+	graph.SetNodeMap(std::move(folded.node_map));
+	return graph;
+}
+
+#endif //REDUCTION_H
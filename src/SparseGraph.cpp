@@ -0,0 +1,374 @@
+#include "SparseGraph.h"
+
+#include <algorithm>
+#include <cmath>
+#include <fstream>
+#include <iostream>
+#include <limits>
+#include <numeric>
+#include <set>
+#include <utility>
+
+using std::string;
+using std::vector;
+
+void SparseGraphBuilder::Reserve(size_t num_entries)
+{
+	m_rows.reserve(2 * num_entries);
+	m_columns.reserve(2 * num_entries);
+	m_values.reserve(2 * num_entries);
+}
+
+void SparseGraphBuilder::AddSymmetric(size_t i, size_t j, double value)
+{
+	m_rows.push_back(i);
+	m_columns.push_back(j);
+	m_values.push_back(value);
+	if (i != j) {
+		m_rows.push_back(j);
+		m_columns.push_back(i);
+		m_values.push_back(value);
+	}
+}
+
+SparseGraph SparseGraphBuilder::Build(double modularity_resolution, double total_weight, bool is_directed)
+{
+	vector<size_t> indptr(m_size + 1, 0);
+	for (size_t row : m_rows)
+		++indptr[row + 1];
+	for (size_t i = 0; i < m_size; ++i)
+		indptr[i + 1] += indptr[i];
+	vector<std::pair<size_t, double>> entries(m_rows.size());
+	vector<size_t> position(indptr.begin(), indptr.end() - 1);
+	for (size_t k = 0; k < m_rows.size(); ++k)
+		entries[position[m_rows[k]]++] = {m_columns[k], m_values[k]};
+	vector<size_t>().swap(m_rows);
+	vector<size_t>().swap(m_columns);
+	vector<double>().swap(m_values);
+	// sort columns within rows and sum up duplicates
+	vector<size_t> indices;
+	vector<double> values;
+	indices.reserve(entries.size());
+	values.reserve(entries.size());
+	size_t row_start = 0;
+	for (size_t i = 0; i < m_size; ++i) {
+		std::sort(entries.begin() + indptr[i], entries.begin() + indptr[i + 1],
+			[](const std::pair<size_t, double>& a, const std::pair<size_t, double>& b) {return a.first < b.first;});
+		for (size_t k = indptr[i]; k < indptr[i + 1]; ++k) {
+			if (indices.size() > row_start && indices.back() == entries[k].first)
+				values.back() += entries[k].second;
+			else {
+				indices.push_back(entries[k].first);
+				values.push_back(entries[k].second);
+			}
+		}
+		indptr[i] = row_start;
+		row_start = indices.size();
+	}
+	indptr[m_size] = row_start;
+	// summed up duplicates (e.g. parallel edges of folded nodes) leave unused capacity
+	indices.shrink_to_fit();
+	values.shrink_to_fit();
+	return SparseGraph(m_size, std::move(indptr), std::move(indices), std::move(values),
+		std::move(m_out), std::move(m_in), modularity_resolution, total_weight, is_directed);
+}
+
+SparseGraph::SparseGraph(size_t size, vector<size_t>&& indptr, vector<size_t>&& indices, vector<double>&& values,
+	vector<double>&& out_strengths, vector<double>&& in_strengths, double modularity_resolution, double total_weight,
+	bool is_directed) :
+	PartitionedGraph(size),
+	m_matrix(std::make_shared<const Data>(Data{std::move(indptr), std::move(indices), std::move(values),
+		std::move(out_strengths), std::move(in_strengths), total_weight, is_directed})),
+	m_modularity_resolution(modularity_resolution)
+{
+	if (m_matrix->indptr.size() != size + 1 || m_matrix->out.size() != size || m_matrix->in.size() != size
+		|| m_matrix->indices.size() != m_matrix->values.size() || m_matrix->indptr.back() != m_matrix->indices.size())
+		throw std::invalid_argument("inconsistent sizes of sparse graph arrays");
+}
+
+SparseGraph SparseGraph::WithResolution(double modularity_resolution) const
+{
+	SparseGraph graph(*this);
+	graph.m_modularity_resolution = modularity_resolution;
+	return graph;
+}
+
+size_t SparseGraph::MemoryBytes() const
+{
+	const Data& matrix = *m_matrix;
+	return sizeof(Data) + (matrix.indptr.capacity() + matrix.indices.capacity()) * sizeof(size_t)
+		+ (matrix.values.capacity() + matrix.out.capacity() + matrix.in.capacity()) * sizeof(double);
+}
+
+double SparseGraph::Modularity() const
+{
+	const Data& matrix = *m_matrix;
+	if (m_communities.empty())
+		return 0;
+	double modularity = 0;
+	for (size_t i = 0; i < Size(); ++i)
+		for (size_t k = matrix.indptr[i]; k < matrix.indptr[i + 1]; ++k)
+			if (m_communities[i] == m_communities[matrix.indices[k]])
+				modularity += matrix.values[k];
+	vector<double> community_out(m_number_of_communities, 0.0);
+	vector<double> community_in(m_number_of_communities, 0.0);
+	for (size_t i = 0; i < Size(); ++i) {
+		community_out[m_communities[i]] += matrix.out[i];
+		community_in[m_communities[i]] += matrix.in[i];
+	}
+	for (size_t c = 0; c < m_number_of_communities; ++c)
+		modularity -= m_modularity_resolution * community_out[c] * community_in[c];
+	return modularity;
+}
+
+SparseGraph::Submatrix SparseGraph::GetModularitySubmatrix(const vector<size_t>& indices) const
+{
+	const Data& matrix = *m_matrix;
+	const size_t none = std::numeric_limits<size_t>::max();
+	vector<size_t>& local_index = m_local_index;
+	if (local_index.size() != Size())
+		local_index.assign(Size(), none);
+	for (size_t i = 0; i < indices.size(); ++i)
+		local_index[indices[i]] = i;
+	Submatrix submatrix;
+	submatrix.m_rank_coefficient = m_modularity_resolution / 2;
+	submatrix.m_indptr.reserve(indices.size() + 1);
+	submatrix.m_indptr.push_back(0);
+	submatrix.m_out.reserve(indices.size());
+	submatrix.m_in.reserve(indices.size());
+	submatrix.m_diagonal_shift.assign(indices.size(), 0.0);
+	for (size_t i = 0; i < indices.size(); ++i) {
+		size_t node = indices[i];
+		for (size_t k = matrix.indptr[node]; k < matrix.indptr[node + 1]; ++k) {
+			size_t j = local_index[matrix.indices[k]];
+			if (j == i)
+				submatrix.m_diagonal_shift[i] += matrix.values[k];
+			else if (j != none) {
+				submatrix.m_indices.push_back(j);
+				submatrix.m_values.push_back(matrix.values[k]);
+			}
+		}
+		submatrix.m_indptr.push_back(submatrix.m_indices.size());
+		submatrix.m_out.push_back(matrix.out[node]);
+		submatrix.m_in.push_back(matrix.in[node]);
+	}
+	for (size_t node : indices)
+		local_index[node] = none;
+	return submatrix;
+}
+
+vector<double> SparseGraph::GetCorrectionVector(const vector<size_t>& indices, size_t community) const
+{
+	const Data& matrix = *m_matrix;
+	double community_out = 0, community_in = 0;
+	for (size_t j = 0; j < Size(); ++j)
+		if (m_communities[j] == community) {
+			community_out += matrix.out[j];
+			community_in += matrix.in[j];
+		}
+	double rank_coefficient = m_modularity_resolution / 2;
+	vector<double> res(indices.size(), 0.0);
+	for (size_t i = 0; i < indices.size(); ++i) {
+		size_t node = indices[i];
+		for (size_t k = matrix.indptr[node]; k < matrix.indptr[node + 1]; ++k)
+			if (m_communities[matrix.indices[k]] == community)
+				res[i] += matrix.values[k];
+		res[i] -= rank_coefficient * (matrix.out[node] * community_in + matrix.in[node] * community_out);
+	}
+	return res;
+}
+
+vector<double> SparseGraph::Submatrix::Row(size_t i) const
+{
+	vector<double> row(Size());
+	for (size_t j = 0; j < Size(); ++j)
+		row[j] = -m_rank_coefficient * (m_out[i] * m_in[j] + m_in[i] * m_out[j]);
+	for (size_t k = m_indptr[i]; k < m_indptr[i + 1]; ++k)
+		row[m_indices[k]] += m_values[k];
+	row[i] += m_diagonal_shift[i];
+	return row;
+}
+
+vector<double> SparseGraph::Submatrix::SignedRowSums(const vector<int>& communities) const
+{
+	size_t n = Size();
+	double signed_out = 0, signed_in = 0;
+	for (size_t j = 0; j < n; ++j) {
+		double sign = communities[j] ? 1.0 : -1.0;
+		signed_out += sign * m_out[j];
+		signed_in += sign * m_in[j];
+	}
+	vector<double> res(n, 0.0);
+	for (size_t i = 0; i < n; ++i) {
+		for (size_t k = m_indptr[i]; k < m_indptr[i + 1]; ++k)
+			res[i] += communities[m_indices[k]] ? m_values[k] : -m_values[k];
+		res[i] += (communities[i] ? 1.0 : -1.0) * m_diagonal_shift[i];
+		res[i] -= m_rank_coefficient * (m_out[i] * signed_in + m_in[i] * signed_out);
+	}
+	return res;
+}
+
+vector<double> SparseGraph::Submatrix::RowSums() const
+{
+	return SignedRowSums(vector<int>(Size(), 1));
+}
+
+vector<double> SparseGraph::Submatrix::PositiveRowSums() const
+{
+	vector<double> res(Size(), 0.0);
+	for (size_t i = 0; i < Size(); ++i)
+		for (double value : Row(i))
+			if (value > 0.0)
+				res[i] += value;
+	return res;
+}
+
+void SparseGraph::Submatrix::AddToDiagonal(const vector<double>& shift)
+{
+	for (size_t i = 0; i < Size(); ++i)
+		m_diagonal_shift[i] += shift[i];
+}
+
+double SparseGraph::Submatrix::ModularityGain(const vector<double>& correction_vector, const vector<int>& communities) const
+{
+	vector<double> signed_sums = SignedRowSums(communities);
+	double mod_gain = 0.0;
+	for (size_t i = 0; i < Size(); ++i)
+		mod_gain += communities[i] ? signed_sums[i] : -signed_sums[i];
+	mod_gain *= 0.5;
+	for (size_t i = 0; i < Size(); ++i)
+		mod_gain += communities[i] ? correction_vector[i] : -correction_vector[i];
+	return mod_gain;
+}
+
+SparseGraph::Submatrix::ShiftGains SparseGraph::Submatrix::MoveGains(const vector<double>& correction_vector,
+	const vector<int>& communities) const
+{
+	size_t n = Size();
+	ShiftGains gains;
+	gains.m_submatrix = this;
+	gains.m_communities = communities;
+	gains.m_base.assign(n, 0.0);
+	for (size_t i = 0; i < n; ++i) {
+		double sign = communities[i] ? 1.0 : -1.0;
+		gains.m_signed_out += sign * m_out[i];
+		gains.m_signed_in += sign * m_in[i];
+		// sum over j != i of sign_j * B_ij, diagonal terms of B and of the rank-two part cancel out
+		double sparse_sum = 0;
+		for (size_t k = m_indptr[i]; k < m_indptr[i + 1]; ++k)
+			sparse_sum += communities[m_indices[k]] ? m_values[k] : -m_values[k];
+		gains.m_base[i] = -2 * sign * (sparse_sum + correction_vector[i]) - 4 * m_rank_coefficient * m_out[i] * m_in[i];
+	}
+	while (gains.m_leaves < n)
+		gains.m_leaves *= 2;
+	const double infinity = std::numeric_limits<double>::infinity();
+	gains.m_tree.assign(2 * gains.m_leaves, ShiftGains::Bounds{-infinity, 0, 0, 0, 0});
+	gains.m_order.resize(n);
+	std::iota(gains.m_order.begin(), gains.m_order.end(), 0);
+	std::sort(gains.m_order.begin(), gains.m_order.end(), [&](size_t i, size_t j) {
+		if (communities[i] != communities[j])
+			return communities[i] < communities[j];
+		return m_out[i] < m_out[j] || (m_out[i] == m_out[j] && m_in[i] < m_in[j]);
+	});
+	gains.m_position.resize(n);
+	for (size_t position = 0; position < n; ++position) {
+		size_t i = gains.m_order[position];
+		gains.m_position[i] = position;
+		double coefficient = (communities[i] ? 2.0 : -2.0) * m_rank_coefficient;
+		double out = coefficient * m_out[i], in = coefficient * m_in[i];
+		gains.m_tree[gains.m_leaves + position] = ShiftGains::Bounds{gains.m_base[i], out, out, in, in};
+	}
+	for (size_t node = gains.m_leaves - 1; node > 0; --node) {
+		const ShiftGains::Bounds& left = gains.m_tree[2 * node];
+		const ShiftGains::Bounds& right = gains.m_tree[2 * node + 1];
+		gains.m_tree[node] = ShiftGains::Bounds{std::max(left.base, right.base),
+			std::min(left.out_min, right.out_min), std::max(left.out_max, right.out_max),
+			std::min(left.in_min, right.in_min), std::max(left.in_max, right.in_max)};
+	}
+	return gains;
+}
+
+double SparseGraph::Submatrix::ShiftGains::Gain(size_t i) const
+{
+	const Bounds& leaf = m_tree[m_leaves + m_position[i]];
+	return m_base[i] + leaf.out_min * m_signed_in + leaf.in_min * m_signed_out;
+}
+
+double SparseGraph::Submatrix::ShiftGains::Bound(size_t node) const
+{
+	const Bounds& bounds = m_tree[node];
+	if (bounds.base == -std::numeric_limits<double>::infinity())
+		return bounds.base;
+	double out_term = std::max(bounds.out_min * m_signed_in, bounds.out_max * m_signed_in);
+	double in_term = std::max(bounds.in_min * m_signed_out, bounds.in_max * m_signed_out);
+	// slack for rounding, so that the bound holds however gains of leaves are rounded (e.g. with fused multiply-add)
+	double slack = 4 * std::numeric_limits<double>::epsilon()
+		* (std::fabs(bounds.base) + std::fabs(out_term) + std::fabs(in_term));
+	return bounds.base + out_term + in_term + slack;
+}
+
+void SparseGraph::Submatrix::ShiftGains::Search(size_t node, size_t& best, double& best_gain) const
+{
+	if (node >= m_leaves) {
+		size_t i = m_order[node - m_leaves];
+		double gain = Gain(i);
+		if (gain > best_gain || (gain == best_gain && i < best)) {
+			best = i;
+			best_gain = gain;
+		}
+		return;
+	}
+	size_t first = 2 * node, second = 2 * node + 1;
+	double first_bound = Bound(first), second_bound = Bound(second);
+	if (second_bound > first_bound) {
+		std::swap(first, second);
+		std::swap(first_bound, second_bound);
+	}
+	const double infinity = std::numeric_limits<double>::infinity();
+	if (first_bound > -infinity && first_bound >= best_gain)
+		Search(first, best, best_gain);
+	if (second_bound > -infinity && second_bound >= best_gain)
+		Search(second, best, best_gain);
+}
+
+size_t SparseGraph::Submatrix::ShiftGains::Best(double& gain) const
+{
+	size_t best = m_base.size();
+	gain = -std::numeric_limits<double>::infinity();
+	Search(1, best, gain);
+	return best;
+}
+
+void SparseGraph::Submatrix::ShiftGains::SetBase(size_t i, double base)
+{
+	m_base[i] = base;
+	size_t node = m_leaves + m_position[i];
+	m_tree[node].base = base;
+	for (node /= 2; node > 0; node /= 2)
+		m_tree[node].base = std::max(m_tree[2 * node].base, m_tree[2 * node + 1].base);
+}
+
+void SparseGraph::Submatrix::ShiftGains::Move(size_t moved)
+{
+	const Submatrix& Q = *m_submatrix;
+	double sign = m_communities[moved] ? 1.0 : -1.0;
+	m_signed_out -= 2 * sign * Q.m_out[moved];
+	m_signed_in -= 2 * sign * Q.m_in[moved];
+	SetBase(moved, -std::numeric_limits<double>::infinity());
+	// base_j += 4 * B_moved,j for j in the same part as moved and -= otherwise
+	for (size_t k = Q.m_indptr[moved]; k < Q.m_indptr[moved + 1]; ++k) {
+		size_t j = Q.m_indices[k];
+		if (m_base[j] == -std::numeric_limits<double>::infinity())
+			continue;
+		if (m_communities[j] == m_communities[moved])
+			SetBase(j, m_base[j] + 4 * Q.m_values[k]);
+		else
+			SetBase(j, m_base[j] - 4 * Q.m_values[k]);
+	}
+}
+
+size_t SparseGraph::Submatrix::MemoryBytes() const
+{
+	return (m_indptr.capacity() + m_indices.capacity()) * sizeof(size_t)
+		+ (m_values.capacity() + m_out.capacity() + m_in.capacity() + m_diagonal_shift.capacity()) * sizeof(double);
+}
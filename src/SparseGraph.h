@@ -0,0 +1,283 @@
+#ifndef SPARSE_GRAPH_H
+#define SPARSE_GRAPH_H
+
+#include "ModularityMatrix.h"
+#include "PartitionedGraph.h"
+
+#include <cstddef>
+#include <memory>
+#include <stdexcept>
+#include <string>
+#include <vector>
+
+// Graph storing modularity matrix as "sparse plus rank-two":
+//   Q = B - c * (out * in^T + in * out^T),  c = modularity_resolution / 2,
+// where B is symmetric sparse (normalized and symmetrized adjacency matrix),
+// out and in are normalized out- and in-strengths of nodes (equal for undirected graphs).
+// This is the same matrix Graph::CalcModMatrix computes densely, but memory is O(n + nnz).
+// With zero out and in (treat_as_modularity) Q = B, i.e. missing entries have zero modularity.
+// Copies of the graph share the matrix and keep own communities and resolution.
+class SparseGraph : public PartitionedGraph
+{
+public:
+	// Modularity submatrix over a subset of nodes, with optional diagonal shift.
+	// Provides kernels used by ComboEngine to search for a split of a community.
+	class Submatrix
+	{
+	public:
+		size_t Size() const {return m_out.size();}
+		std::vector<double> Row(size_t i) const;
+		std::vector<double> RowSums() const;
+		std::vector<double> PositiveRowSums() const;
+		void AddToDiagonal(const std::vector<double>& shift);
+		// sum over i, j of (+/-) Q_ij / 2 for nodes in the same / different parts plus correction
+		double ModularityGain(const std::vector<double>& correction_vector, const std::vector<int>& communities) const;
+
+		// Gains of moving each node to another part during a Kernighan-Lin shift, kept as
+		//   gain_i = base_i + sign_i * resolution * (out_i * signed_in + in_i * signed_out),
+		// where base_i holds the sparse part and signed_in, signed_out are sums of sign_j * in_j, sign_j * out_j
+		// (sign_j = +1 for part 1 and -1 for part 0). A move changes base of neighbors of the moved node and
+		// the two sums only, and nodes with the highest gain are found in a tree of bounds of gains,
+		// so a shift takes O((k + nnz) log k) time for typical graphs instead of O(k^2).
+		class ShiftGains
+		{
+		public:
+			// not moved node with the highest gain (the first one of equal ones), gain is set to its gain
+			size_t Best(double& gain) const;
+			// updates gains after node `moved` changes its part, it can not be moved again during the shift
+			void Move(size_t moved);
+
+		private:
+			friend class Submatrix;
+			// maximum of base and ranges of coefficients of signed_in and signed_out over a subtree
+			struct Bounds
+			{
+				double base;
+				double out_min, out_max;
+				double in_min, in_max;
+			};
+			const Submatrix* m_submatrix;
+			// parts before the shift
+			std::vector<int> m_communities;
+			// -infinity for moved nodes
+			std::vector<double> m_base;
+			double m_signed_out = 0;
+			double m_signed_in = 0;
+			// leaves of the tree are nodes ordered by part and strengths, so that coefficients of signed_in
+			// and signed_out vary little within subtrees: m_tree[m_leaves + m_position[i]] is the leaf of node i,
+			// m_order[position] is its node, node k of the tree has children 2k and 2k + 1
+			size_t m_leaves = 1;
+			std::vector<size_t> m_order;
+			std::vector<size_t> m_position;
+			std::vector<Bounds> m_tree;
+
+			double Gain(size_t i) const;
+			double Bound(size_t node) const;
+			void Search(size_t node, size_t& best, double& best_gain) const;
+			void SetBase(size_t i, double base);
+		};
+
+		// gains of moving each node to another part, as in Kernighan-Lin shift
+		ShiftGains MoveGains(const std::vector<double>& correction_vector, const std::vector<int>& communities) const;
+		// bytes allocated for the submatrix
+		size_t MemoryBytes() const;
+
+	private:
+		friend class SparseGraph;
+		std::vector<size_t> m_indptr;
+		std::vector<size_t> m_indices;
+		std::vector<double> m_values;
+		std::vector<double> m_out;
+		std::vector<double> m_in;
+		// diagonal of B plus shifts added by AddToDiagonal; B of submatrix excludes diagonal
+		std::vector<double> m_diagonal_shift;
+		double m_rank_coefficient = 0;
+		// sum over j of sign_j * Q_ij for each i, sign_j = +1 for part 1 and -1 for part 0
+		std::vector<double> SignedRowSums(const std::vector<int>& communities) const;
+	};
+
+	SparseGraph(size_t size, std::vector<size_t>&& indptr, std::vector<size_t>&& indices, std::vector<double>&& values,
+		std::vector<double>&& out_strengths, std::vector<double>&& in_strengths, double modularity_resolution = 1,
+		double total_weight = 1, bool is_directed = false);
+
+	size_t NumberOfEntries() const {return m_matrix->indices.size();}
+	double ModularityResolution() const {return m_modularity_resolution;}
+	// copy of the graph (sharing the matrix arrays) with another resolution, i.e. another rank-two term
+	SparseGraph WithResolution(double modularity_resolution) const;
+	// arrays of the matrix, e.g. for serialization; B includes diagonal entries
+	const std::vector<size_t>& Indptr() const {return m_matrix->indptr;}
+	const std::vector<size_t>& Indices() const {return m_matrix->indices;}
+	const std::vector<double>& Values() const {return m_matrix->values;}
+	const std::vector<double>& OutStrengths() const {return m_matrix->out;}
+	const std::vector<double>& InStrengths() const {return m_matrix->in;}
+	// total weight of edges (each undirected edge counted once) B and strengths are divided by,
+	// 1 for modularity matrix given explicitly (treat_as_modularity)
+	double TotalWeight() const {return m_matrix->total_weight;}
+	// whether the null model is of directed graph, i.e. B is symmetrized and strengths are not its row sums
+	bool IsDirected() const {return m_matrix->is_directed;}
+	// bytes allocated for the matrix (shared by copies), communities are not counted
+	size_t MemoryBytes() const;
+
+	double Modularity() const;
+	Submatrix GetModularitySubmatrix(const std::vector<size_t>& indices) const;
+	// sum of Q_ji over j in `community` for each i in `indices`
+	std::vector<double> GetCorrectionVector(const std::vector<size_t>& indices, size_t community) const;
+
+private:
+	struct Data
+	{
+		std::vector<size_t> indptr;
+		std::vector<size_t> indices;
+		std::vector<double> values;
+		std::vector<double> out;
+		std::vector<double> in;
+		double total_weight;
+		bool is_directed;
+	};
+	// immutable, shared by copies of the graph (e.g. running on several threads or with other resolutions)
+	std::shared_ptr<const Data> m_matrix;
+	double m_modularity_resolution;
+	// local indices of nodes reused by GetModularitySubmatrix, so that building a submatrix of k nodes
+	// takes O(k + entries of their rows) time; allocated by the first call, a copy of the graph
+	// (e.g. of a run on its own thread) keeps its own buffer
+	mutable std::vector<size_t> m_local_index;
+};
+
+// Collects entries of symmetric matrix B (with duplicates) and strengths, then builds SparseGraph.
+class SparseGraphBuilder
+{
+public:
+	explicit SparseGraphBuilder(size_t size) :
+		m_size(size), m_out(size, 0.0), m_in(size, 0.0) {}
+	void Reserve(size_t num_entries);
+	// adds value to B_ij and B_ji (once if i == j)
+	void AddSymmetric(size_t i, size_t j, double value);
+	std::vector<double>& OutStrengths() {return m_out;}
+	std::vector<double>& InStrengths() {return m_in;}
+	SparseGraph Build(double modularity_resolution, double total_weight = 1, bool is_directed = false);
+
+private:
+	size_t m_size;
+	std::vector<size_t> m_rows;
+	std::vector<size_t> m_columns;
+	std::vector<double> m_values;
+	std::vector<double> m_out;
+	std::vector<double> m_in;
+};
+
+// Same normalization as ModularityMatrixFromEdges (Graph::CalcModMatrix)
+template<typename Index, typename Weight>
+SparseGraph SparseGraphFromEdges(size_t size, const Index* sources, const Index* destinations, const Weight* weights,
+	size_t num_edges, bool is_directed, double modularity_resolution, bool treat_as_modularity)
+{
+	CheckEdgeIndices(size, sources, destinations, num_edges);
+	double total_weight = 1.0;
+	if (!treat_as_modularity) {
+		total_weight = 0.0;
+		for (size_t i = 0; i < num_edges; ++i)
+			total_weight += double(weights[i]);
+		if (!is_directed)
+			total_weight *= 2;
+	}
+	SparseGraphBuilder builder(size);
+	builder.Reserve(num_edges);
+	std::vector<double>& out = builder.OutStrengths();
+	std::vector<double>& in = builder.InStrengths();
+	for (size_t i = 0; i < num_edges; ++i) {
+		size_t source = size_t(sources[i]);
+		size_t destination = size_t(destinations[i]);
+		double value = double(weights[i]) / total_weight;
+		// directed graphs are symmetrized as (M + M^T) / 2,
+		// Graph::FillModMatrix puts halves to M_sd and M_ds for undirected graphs
+		if (is_directed || treat_as_modularity)
+			builder.AddSymmetric(source, destination, source == destination ? value : value / 2);
+		else
+			builder.AddSymmetric(source, destination, source == destination ? 2 * value : value);
+		if (!treat_as_modularity) {
+			out[source] += value;
+			in[destination] += value;
+			if (!is_directed) {
+				out[destination] += value;
+				in[source] += value;
+			}
+		}
+	}
+	return builder.Build(modularity_resolution, treat_as_modularity || is_directed ? total_weight : total_weight / 2,
+		is_directed && !treat_as_modularity);
+}
+
+// Same normalization as ModularityMatrixFromCSR (Graph::CalcModMatrix(matrix))
+template<typename Index, typename Weight>
+SparseGraph SparseGraphFromCSR(size_t size, const Index* indptr, const Index* indices, const Weight* data,
+	bool is_directed, double modularity_resolution, bool treat_as_modularity)
+{
+	CheckCSRIndices(size, indptr, indices);
+	double total_weight = 1.0;
+	if (!treat_as_modularity) {
+		total_weight = 0.0;
+		for (Index k = indptr[0]; k < indptr[size]; ++k)
+			total_weight += double(data[k]);
+		if (!is_directed)
+			for (size_t i = 0; i < size; ++i)
+				for (Index k = indptr[i]; k < indptr[i+1]; ++k)
+					if (size_t(indices[k]) == i)
+						total_weight += double(data[k]);
+	}
+	SparseGraphBuilder builder(size);
+	builder.Reserve(size_t(indptr[size] - indptr[0]));
+	std::vector<double>& out = builder.OutStrengths();
+	std::vector<double>& in = builder.InStrengths();
+	for (size_t i = 0; i < size; ++i)
+		for (Index k = indptr[i]; k < indptr[i+1]; ++k) {
+			size_t j = size_t(indices[k]);
+			double value = double(data[k]) / total_weight;
+			if (!is_directed && !treat_as_modularity && i == j)
+				value *= 2;
+			// each entry of the matrix contributes half to B_ij and B_ji
+			builder.AddSymmetric(i, j, i == j ? value : value / 2);
+			if (!treat_as_modularity) {
+				out[i] += value;
+				in[j] += value;
+			}
+		}
+	return builder.Build(modularity_resolution, treat_as_modularity || is_directed ? total_weight : total_weight / 2,
+		is_directed && !treat_as_modularity);
+}
+
+// Same normalization as ModularityMatrixFromDense (Graph::CalcModMatrix(matrix)), zero entries are skipped
+template<typename Rows>
+SparseGraph SparseGraphFromDense(size_t size, const Rows& rows, bool is_directed, double modularity_resolution,
+	bool treat_as_modularity)
+{
+	double total_weight = 1.0;
+	if (!treat_as_modularity) {
+		total_weight = 0.0;
+		for (size_t i = 0; i < size; ++i)
+			for (size_t j = 0; j < size; ++j)
+				total_weight += double(rows[i][j]);
+		if (!is_directed)
+			for (size_t i = 0; i < size; ++i)
+				total_weight += double(rows[i][i]);
+	}
+	SparseGraphBuilder builder(size);
+	std::vector<double>& out = builder.OutStrengths();
+	std::vector<double>& in = builder.InStrengths();
+	for (size_t i = 0; i < size; ++i)
+		for (size_t j = 0; j < size; ++j) {
+			if (rows[i][j] == 0)
+				continue;
+			double value = double(rows[i][j]) / total_weight;
+			if (!is_directed && !treat_as_modularity && i == j)
+				value *= 2;
+			// each entry of the matrix contributes half to B_ij and B_ji
+			builder.AddSymmetric(i, j, i == j ? value : value / 2);
+			if (!treat_as_modularity) {
+				out[i] += value;
+				in[j] += value;
+			}
+		}
+	return builder.Build(modularity_resolution, treat_as_modularity || is_directed ? total_weight : total_weight / 2,
+		is_directed && !treat_as_modularity);
+}
+
+#endif //SPARSE_GRAPH_H
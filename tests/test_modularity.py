@@ -57,6 +57,45 @@ def test_relaxed_caveman(relaxed_caveman, benchmark):
     )
 
 
+@pytest.mark.parametrize("graph_name, resolution", [("karate", 1.0), ("karate", 0.5), ("block_model", 1.0)])
+def test_modularity_api(graph_name, resolution, request):
+    import networkx as nx
+    import networkx.algorithms.community as nx_comm
+    import numpy as np
+    import pycombo
+
+    graph = request.getfixturevalue(graph_name)
+    partition, _ = pycombo.execute(graph, modularity_resolution=resolution, random_seed=42)
+    expected = nx_comm.modularity(graph, _comm_groups(partition), resolution=resolution)
+    assert pycombo.modularity(graph, partition, modularity_resolution=resolution) == pytest.approx(expected)
+
+    # batch of partitions given as rows of 2-D array, scored on sparse and dense matrices
+    labels = np.array([list(partition.values()), np.zeros(len(graph)), np.arange(len(graph))], dtype=np.int64)
+    matrix = nx.to_scipy_sparse_array(graph)
+    for sparse in [True, False]:
+        scores = pycombo.modularity(matrix, labels, modularity_resolution=resolution, sparse=sparse, n_threads=2)
+        assert scores == pytest.approx(pycombo.modularity(graph, list(labels), modularity_resolution=resolution))
+    assert scores[0] == pytest.approx(expected) and scores[1] == pytest.approx(1 - resolution, abs=1e-12)
+
+
+def test_modularity_api_directed(block_model):
+    import networkx as nx
+    import networkx.algorithms.community as nx_comm
+    import pycombo
+
+    partition = {node: node % 3 for node in block_model}
+    undirected = nx.Graph()
+    undirected.add_nodes_from(block_model)
+    for u, v in block_model.edges():
+        undirected.add_edge(u, v, weight=undirected.get_edge_data(u, v, {"weight": 0})["weight"] + 1)
+    expected = nx_comm.modularity(undirected, _comm_groups(partition))
+    assert pycombo.modularity(block_model, partition, directed=False) == pytest.approx(expected)
+    with pytest.raises(ValueError):
+        pycombo.modularity(undirected, partition, directed=True)
+    with pytest.raises(ValueError):
+        pycombo.ComboGraph(block_model, components=True).modularity(partition)
+
+
 # def test_modularity_test_graph(test_graph, benchmark):
 #     from pyCombo.pyCombo import get_combo_partition
 
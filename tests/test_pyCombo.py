@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import json
 import networkx as nx
 import pytest
 import os
+import time
 from typing import Iterable
 
 
@@ -46,6 +48,74 @@ def test_deconstruct_graph(karate):
     assert len(edges) == karate.size()
 
 
+@pytest.mark.parametrize("weight", ["weight", None])
+def test_edge_arrays(weight):
+    from pycombo.misc import deconstruct_graph, edge_arrays
+
+    lesmis = nx.les_miserables_graph()
+    nodes, edges = deconstruct_graph(lesmis, weight=weight)
+    nodes_a, sources, destinations, weights = edge_arrays(lesmis, weight=weight)
+    assert nodes_a == [nodes[i] for i in range(len(nodes))]
+    assert list(zip(sources, destinations, weights)) == edges
+    assert sources.itemsize == destinations.itemsize == 4
+    assert weights.typecode == "d"
+
+
+def test_edge_arrays_partially_weighted(test_graph):
+    from pycombo.misc import edge_arrays
+
+    test_graph.edges[0, 1]["weight"] = 2
+    test_graph.add_edge(1, 3)
+    _, sources, destinations, weights = edge_arrays(test_graph, weight="weight")
+    weights = dict(zip(zip(sources, destinations), weights))
+    assert weights[0, 1] == 2
+    assert weights[1, 3] == 1
+
+
+@pytest.mark.parametrize("index_dtype, weight_dtype", [("int32", "float64"), ("int64", "float32")])
+def test_execute_arrays(index_dtype, weight_dtype):
+    import numpy as np
+    import pycombo
+
+    seed = 42
+    lesmis = nx.convert_node_labels_to_integers(nx.les_miserables_graph())
+    partition_g, modularity_g = pycombo.execute(lesmis, random_seed=seed)
+    sources, destinations, weights = np.array(list(lesmis.edges(data="weight"))).T
+    partition_a, modularity_a = pycombo.execute_arrays(
+        sources.astype(index_dtype), destinations.astype(index_dtype), weights.astype(weight_dtype), random_seed=seed
+    )
+    assert modularity_a == pytest.approx(modularity_g, 0.000001), (modularity_a, modularity_g)
+    assert _partitionGroup(partition_a) == _partitionGroup(partition_g)
+
+
+def test_execute_arrays_unweighted(karate):
+    from array import array
+    import pycombo
+
+    seed = 42
+    karate = nx.convert_node_labels_to_integers(karate)
+    partition_g, modularity_g = pycombo.execute(karate, random_seed=seed)
+    sources, destinations = map(array, "ll", zip(*karate.edges()))
+    partition_a, modularity_a = pycombo.execute_arrays(sources, destinations, size=len(karate), random_seed=seed)
+    assert modularity_a == modularity_g
+    assert _partitionGroup(partition_a) == _partitionGroup(partition_g)
+
+
+def test_execute_arrays_errors():
+    import numpy as np
+    from pycombo import execute_arrays
+
+    edges = np.array([[0, 1], [1, 2], [2, 0]])
+    with pytest.raises(ValueError):
+        execute_arrays(edges[:, 0], edges[:, 1])  # not contiguous
+    with pytest.raises(ValueError):
+        execute_arrays(edges[:, 0].copy(), edges[:, 1].copy(), size=2)
+    with pytest.raises(TypeError):
+        execute_arrays(edges[:, 0].astype("int32"), edges[:, 1].copy())
+    with pytest.raises(TypeError):
+        execute_arrays(edges[:, 0].copy(), edges[:, 1].copy(), weights=np.ones(3, dtype=int))
+
+
 def test_execute_from_file(karate):
     import pycombo
 
@@ -61,6 +131,28 @@ def test_execute_from_file(karate):
     os.remove(path)
 
 
+def test_file_sparse(tmp_path):
+    import numpy as np
+    from pycombo import ComboGraph
+
+    graph = nx.les_miserables_graph()
+    partition = [i * 5 // len(graph) for i in range(len(graph))]
+    nx.write_pajek(graph, tmp_path / "graph.net")
+    nx.write_weighted_edgelist(nx.convert_node_labels_to_integers(graph), tmp_path / "graph.edgelist")
+    np.savetxt(tmp_path / "graph.csv", nx.to_numpy_array(graph), delimiter=",")
+    # sparse graphs read edges (or matrix) of files as Combo reads them, .edgelist being directed
+    for name in ["graph.net", "graph.edgelist", "graph.csv"]:
+        path = str(tmp_path / name)
+        sparse = ComboGraph(path, sparse=True)
+        assert sparse.sparse and not ComboGraph(path).sparse
+        assert sparse.modularity(partition) == pytest.approx(ComboGraph(path).modularity(partition))
+        assert sparse.run(random_seed=42)[1] == pytest.approx(ComboGraph(path).run(random_seed=42)[1], abs=1e-3)
+    with pytest.raises(ValueError):
+        ComboGraph(str(tmp_path / "missing.net"), sparse=True)
+    with pytest.raises(ValueError):
+        ComboGraph(str(tmp_path / "graph.txt"), sparse=True)
+
+
 def test_weighted_graph():
     import networkx as nx
     lesmis = nx.les_miserables_graph()
@@ -122,6 +214,87 @@ def test_mod_matrix_as_numpy(karate):
     assert _partitionGroup(partition_g) == _partitionGroup(partition_m)
 
 
+@pytest.mark.parametrize("dtype, order", [("float32", "C"), ("int64", "C"), ("float64", "F")])
+def test_matrix_layouts(karate, dtype, order):
+    import numpy as np
+    from pycombo import execute
+
+    seed = 42
+    matrix = nx.to_numpy_array(karate)
+    partition, modularity = execute(matrix, random_seed=seed)
+    partition_l, modularity_l = execute(np.array(matrix, dtype=dtype, order=order), random_seed=seed)
+    assert modularity_l == pytest.approx(modularity, 0.000001), (modularity_l, modularity)
+    assert _partitionGroup(partition_l) == _partitionGroup(partition)
+
+
+def test_matrix_directed(block_model):
+    from pycombo import execute
+
+    seed = 42
+    _, modularity_g = execute(block_model, random_seed=seed)
+    _, modularity_m = execute(nx.to_numpy_array(block_model), random_seed=seed)
+    _, modularity_l = execute(nx.to_numpy_array(block_model).tolist(), random_seed=seed)
+    assert modularity_m == pytest.approx(modularity_g, 0.000001), (modularity_m, modularity_g)
+    assert modularity_l == modularity_m
+
+
+@pytest.mark.parametrize("matrix", [[[0, 1], [1, 0], [0, 0]], [[0, 1], [1]]])
+def test_matrix_errors(matrix):
+    import numpy as np
+    from pycombo import execute
+
+    with pytest.raises(ValueError):
+        execute(matrix)
+    if len(set(map(len, matrix))) == 1:
+        with pytest.raises(ValueError):
+            execute(np.array(matrix, dtype=float))
+
+
+@pytest.mark.parametrize("fmt", ["csr_array", "csr_matrix", "coo_array"])
+def test_sparse_matrix(karate, fmt):
+    import scipy.sparse
+    from pycombo import execute
+
+    seed = 42
+    partition_d, modularity_d = execute(nx.to_numpy_array(karate), random_seed=seed)
+    matrix = getattr(scipy.sparse, fmt)(nx.to_scipy_sparse_array(karate))
+    partition_s, modularity_s = execute(matrix, random_seed=seed)
+    assert modularity_s == pytest.approx(modularity_d, 0.000001), (modularity_s, modularity_d)
+    assert _partitionGroup(partition_s) == _partitionGroup(partition_d)
+
+
+def test_sparse_matrix_directed(block_model):
+    from pycombo import execute
+
+    seed = 42
+    _, modularity_g = execute(block_model, random_seed=seed)
+    _, modularity_s = execute(nx.to_scipy_sparse_array(block_model), random_seed=seed)
+    assert modularity_s == pytest.approx(modularity_g, 0.000001), (modularity_s, modularity_g)
+
+
+def test_sparse_mod_matrix(karate):
+    import scipy.sparse
+    from pycombo import execute
+
+    seed = 42
+    partition_g, modularity_g = execute(karate, random_seed=seed)
+    mod_matrix = scipy.sparse.csr_array(_get_modularity_matrix(karate))
+    partition_m, modularity_m = execute(mod_matrix, treat_as_modularity=True, random_seed=seed)
+    partition_m = {n: partition_m[i] for i, n in enumerate(karate.nodes)}
+    assert modularity_m == pytest.approx(modularity_g, 0.000001), (modularity_m, modularity_g)
+    assert _partitionGroup(partition_g) == _partitionGroup(partition_m)
+
+
+def test_sparse_matrix_errors():
+    import scipy.sparse
+    from pycombo import execute
+
+    with pytest.raises(ValueError):
+        execute(scipy.sparse.csr_array((3, 2)))
+    with pytest.raises(ValueError):
+        execute(scipy.sparse.csr_array((0, 0)))
+
+
 def test_mod_graph(karate):
     from pycombo import execute
 
@@ -206,6 +379,31 @@ def test_intermediate_results(karate, tmp_path):
     assert file.read_text().strip() == "\n".join(map(str, list(zip(*partition.items()))[1]))
 
 
+@pytest.mark.parametrize("stride", [1, 2])
+def test_intermediate_results_binary(karate, tmp_path, stride):
+    import numpy as np
+    import pycombo
+
+    file = tmp_path / 'communities.bin'
+    partition, _, stats = pycombo.execute(
+        karate, intermediate_results_path=str(file), intermediate_results_format="binary",
+        intermediate_results_stride=stride, random_seed=17, return_stats=True,
+    )
+    iterations, partitions, saved_stride = pycombo.read_intermediate(file)
+    last = stats.splits_accepted
+    assert saved_stride == stride
+    assert list(iterations) == sorted(set(range(0, last + 1, stride)) | {last})
+    assert partitions.shape == (len(iterations), len(karate))
+    assert not partitions[0].any()
+    assert list(partitions[-1]) == list(partition.values())
+    assert isinstance(partitions.base, np.memmap)
+
+    with pytest.raises(ValueError):
+        pycombo.execute(karate, intermediate_results_path=str(file), intermediate_results_format="npy")
+    with pytest.raises(ValueError):
+        pycombo.read_intermediate(__file__)
+
+
 def test_01_2022_crash(test_crash_01_2022_graph):
     import pycombo
 
@@ -215,3 +413,944 @@ def test_01_2022_crash(test_crash_01_2022_graph):
         _, modularity = pycombo.execute(test_crash_01_2022_graph, random_seed=i)
         mods.append(modularity)
     assert len(mods) == num_runs
+
+
+def _baseline_cases() -> list:
+    with open(os.path.join(os.path.dirname(__file__), "combo_baseline.json")) as f:
+        return json.load(f)
+
+
+# labels and modularity of seeded runs on fixture graphs recorded with pycombo built from upstream ComboAlgorithm
+# (src/Combo/Combo.cpp), before runs moved to ComboEngine: dense runs must reproduce them bit for bit
+@pytest.mark.parametrize(
+    "case", _baseline_cases(), ids=lambda case: "-".join([case["graph"]] + [f"{k}={v}" for k, v in case["kwargs"].items()])
+)
+def test_upstream_baseline(request, case):
+    from pycombo import execute
+
+    graph = request.getfixturevalue(case["graph"])
+    partition, modularity = execute(graph, sparse=False, **case["kwargs"])
+    assert [partition[node] for node in graph.nodes] == case["labels"]
+    assert modularity == case["modularity"]
+
+
+# entry points of versions before Graph are kept as wrappers, with the same results
+@pytest.mark.parametrize(
+    "case", _baseline_cases(), ids=lambda case: "-".join([case["graph"]] + [f"{k}={v}" for k, v in case["kwargs"].items()])
+)
+def test_legacy_entry_points(request, case):
+    from pycombo import _combo, execute
+    from pycombo.misc import deconstruct_graph
+
+    graph = request.getfixturevalue(case["graph"])
+    nodes, edges = deconstruct_graph(graph, weight="weight")
+    labels, modularity = _combo.execute(len(nodes), edges, graph.is_directed(), **case["kwargs"])
+    assert labels == case["labels"]
+    assert modularity == case["modularity"]
+    matrix = nx.to_numpy_array(graph, weight="weight")
+    partition, modularity = execute(matrix, **case["kwargs"])
+    assert _combo.execute_from_matrix(matrix.tolist(), **case["kwargs"]) == (list(partition.values()), modularity)
+
+
+# lesmis has nodes with equal rows of modularity matrix, fixed splits break such ties
+# depending on rounding, so only random splits are expected to match exactly there
+@pytest.mark.parametrize(
+    "graph_name, fixed_split_step",
+    [("karate", 0), ("karate", 1), ("block_model", 0), ("block_model", 1), ("lesmis", 0)],
+)
+def test_sparse_engine(request, graph_name, fixed_split_step):
+    from pycombo import execute
+
+    if graph_name == "lesmis":
+        graph = nx.les_miserables_graph()
+        graph.add_edge("Valjean", "Valjean", weight=3)
+    else:
+        graph = request.getfixturevalue(graph_name)
+    seed = 42
+    partition_d, modularity_d = execute(graph, fixed_split_step=fixed_split_step, random_seed=seed, sparse=False)
+    partition_s, modularity_s = execute(graph, fixed_split_step=fixed_split_step, random_seed=seed, sparse=True)
+    assert modularity_s == pytest.approx(modularity_d, 0.000001), (modularity_s, modularity_d)
+    assert _partitionGroup(partition_s) == _partitionGroup(partition_d)
+
+    networkx_modularity = nx.community.modularity(graph, _partitionGroup(partition_s))
+    assert modularity_s == pytest.approx(networkx_modularity, 0.000001), (modularity_s, networkx_modularity)
+
+
+def test_sparse_engine_matrix(karate, block_model):
+    import scipy.sparse
+    from pycombo import execute
+
+    seed = 42
+    for graph in (karate, block_model):
+        matrix = nx.to_scipy_sparse_array(graph)
+        partition_d, modularity_d = execute(matrix, random_seed=seed, sparse=False)
+        partition_s, modularity_s = execute(matrix, random_seed=seed, sparse=True)
+        assert modularity_s == pytest.approx(modularity_d, 0.000001), (modularity_s, modularity_d)
+        assert _partitionGroup(partition_s) == _partitionGroup(partition_d)
+
+    mod_matrix = scipy.sparse.csr_array(_get_modularity_matrix(karate))
+    partition_d, modularity_d = execute(mod_matrix, treat_as_modularity=True, random_seed=seed)
+    partition_s, modularity_s = execute(mod_matrix, treat_as_modularity=True, random_seed=seed, sparse=True)
+    assert modularity_s == pytest.approx(modularity_d, 0.000001), (modularity_s, modularity_d)
+    assert _partitionGroup(partition_s) == _partitionGroup(partition_d)
+
+
+def test_sparse_engine_auto(relaxed_caveman):
+    from pycombo import execute
+
+    seed = 42
+    # 1000 nodes, density below threshold
+    partition_a, modularity_a = execute(relaxed_caveman, random_seed=seed)
+    partition_s, modularity_s = execute(relaxed_caveman, random_seed=seed, sparse=True)
+    assert modularity_a == modularity_s
+    assert partition_a == partition_s
+
+
+def test_gil_released(relaxed_caveman):
+    import threading
+    from pycombo import execute
+
+    thread = threading.Thread(target=execute, args=(relaxed_caveman,), kwargs={"random_seed": 42})
+    iterations = 0
+    thread.start()
+    while thread.is_alive():
+        iterations += 1
+        time.sleep(0.001)
+    # main thread would be blocked for the whole run if GIL was held by C++ code
+    assert iterations > 100, iterations
+
+
+def test_threads():
+    from concurrent.futures import ThreadPoolExecutor
+    import scipy.sparse
+    from pycombo import execute
+
+    graph = nx.relaxed_caveman_graph(30, 10, p=0.1, seed=42)
+    inputs = [graph, nx.to_numpy_array(graph), scipy.sparse.csr_array(nx.to_numpy_array(graph))]
+    tasks = [(g, seed) for g in inputs for seed in range(4)]
+    sequential = [execute(g, random_seed=seed) for g, seed in tasks]
+    with ThreadPoolExecutor(4) as pool:
+        concurrent = list(pool.map(lambda task: execute(task[0], random_seed=task[1]), tasks))
+    assert concurrent == sequential
+
+
+def test_gil_released_concurrently():
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from pycombo import ComboGraph, execute
+
+    graph = nx.relaxed_caveman_graph(60, 10, p=0.1, seed=42)
+    prepared = ComboGraph(graph)
+    tasks = [lambda: execute(graph, random_seed=0), lambda: prepared.run(random_seed=1)]
+    expected = [task() for task in tasks]
+
+    # runs start together, and main thread is not blocked while they run
+    barrier = threading.Barrier(len(tasks))
+
+    def run(task):
+        barrier.wait()
+        return task()
+
+    with ThreadPoolExecutor(len(tasks)) as pool:
+        futures = [pool.submit(run, task) for task in tasks]
+        iterations = 0
+        while not all(future.done() for future in futures):
+            iterations += 1
+            time.sleep(0.001)
+    assert [future.result() for future in futures] == expected
+    assert iterations > 100, iterations
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+@pytest.mark.parametrize("ordered", [True, False])
+@pytest.mark.parametrize("chunksize", [None, 3])
+def test_execute_many(karate, backend, ordered, chunksize):
+    import pycombo
+
+    graphs = [nx.relaxed_caveman_graph(5 + i % 4, 5, p=0.2, seed=i) for i in range(20)]
+    graphs += [karate, nx.to_numpy_array(karate)]
+    expected = [pycombo.execute(graph, random_seed=42) for graph in graphs]
+    results = pycombo.execute_many(
+        iter(graphs), n_jobs=2, backend=backend, ordered=ordered, chunksize=chunksize, random_seed=42
+    )
+    if ordered:
+        assert list(results) == expected
+    else:
+        results = list(results)
+        assert sorted(i for i, _ in results) == list(range(len(graphs)))
+        assert [result for _, result in sorted(results, key=lambda item: item[0])] == expected
+
+
+def test_execute_many_errors(karate):
+    import pycombo
+
+    with pytest.raises(ValueError):
+        pycombo.execute_many([karate], backend="mpi")
+    with pytest.raises(ValueError):
+        pycombo.execute_many([karate], chunksize=0)
+    with pytest.raises(ValueError):
+        list(pycombo.execute_many([karate, nx.Graph()]))
+    assert list(pycombo.execute_many([])) == []
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_restarts(sparse):
+    from pycombo import execute
+
+    graph = nx.relaxed_caveman_graph(20, 6, p=0.3, seed=42)
+    seed = 42
+    partition, modularity, restarts = execute(
+        graph, random_seed=seed, sparse=sparse, n_restarts=6, return_restarts=True
+    )
+    assert len(restarts) == 6
+    assert restarts[0] == execute(graph, random_seed=seed, sparse=sparse)
+    assert modularity == max(m for _, m in restarts)
+    assert (partition, modularity) == next(r for r in restarts if r[1] == modularity)
+
+    threaded = execute(graph, random_seed=seed, sparse=sparse, n_restarts=6, n_threads=4, return_restarts=True)
+    assert threaded == (partition, modularity, restarts)
+    assert execute(graph, random_seed=seed, sparse=sparse, n_restarts=6, n_threads=0) == (partition, modularity)
+
+
+def test_restarts_errors(karate, tmp_path):
+    from pycombo import execute
+
+    with pytest.raises(ValueError):
+        execute(karate, n_restarts=0)
+    with pytest.raises(ValueError):
+        execute(karate, n_restarts=2, intermediate_results_path=str(tmp_path / "results.txt"))
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_combo_graph(karate, sparse):
+    import pickle
+    from pycombo import ComboGraph, execute
+
+    graph = ComboGraph(karate, sparse=sparse)
+    assert len(graph) == 34 and graph.sparse == sparse
+    assert graph.nodes == list(karate.nodes)
+    for seed in (1, 2):
+        assert graph.run(random_seed=seed) == execute(karate, random_seed=seed, sparse=sparse)
+
+    data = pickle.dumps(graph)
+    # no per-entry Python objects: dense keeps a triangle of the matrix, sparse keeps CSR with 32-bit indices
+    assert len(data) < (34 * 35 * 4 if sparse else 34 * 35 * 8) + 1000
+    restored = pickle.loads(data)
+    assert restored.nodes == graph.nodes and restored.memory_bytes == graph.memory_bytes
+    assert restored.run(random_seed=1, return_restarts=True, n_restarts=3) == graph.run(
+        random_seed=1, return_restarts=True, n_restarts=3
+    )
+
+
+def test_combo_graph_inputs(block_model, relaxed_caveman):
+    import pickle
+    import numpy as np
+    from scipy.sparse import csr_array
+    from pycombo import ComboGraph, execute, execute_arrays
+
+    matrix = nx.to_numpy_array(block_model)
+    for graph in (matrix, matrix.tolist(), csr_array(matrix)):
+        assert ComboGraph(graph).run(random_seed=42) == execute(graph, random_seed=42)
+        restored = pickle.loads(pickle.dumps(ComboGraph(graph)))
+        assert restored.run(random_seed=42) == execute(graph, random_seed=42)
+
+    sources, destinations = map(np.ascontiguousarray, np.nonzero(matrix))
+    graph = ComboGraph.from_arrays(sources, destinations, directed=True)
+    assert graph.run(random_seed=42) == execute_arrays(sources, destinations, directed=True, random_seed=42)
+
+    assert ComboGraph(relaxed_caveman, sparse=True).memory_bytes < ComboGraph(relaxed_caveman, sparse=False).memory_bytes / 10
+
+    # dense graphs keep strengths of nodes for diagnostics, also when restored
+    labels = list(execute(block_model, random_seed=42)[0].values())
+    expected = ComboGraph(block_model, sparse=True).run(initial_partition=labels, max_iterations=0, return_diagnostics=True)[-1]
+    for graph in (ComboGraph(matrix), pickle.loads(pickle.dumps(ComboGraph(matrix))), ComboGraph(csr_array(matrix), sparse=False)):
+        diagnostics = graph.run(initial_partition=labels, max_iterations=0, return_diagnostics=True)[-1]
+        for name in ["internal_weights", "strengths", "modularity_contributions"]:
+            assert getattr(diagnostics, name) == pytest.approx(getattr(expected, name)), name
+
+
+def test_combo_graph_errors(karate):
+    import pycombo._combo as comboCPP
+    from pycombo import ComboGraph
+
+    for sparse in (False, True):
+        state = ComboGraph(karate, sparse=sparse)._graph.__getstate__()
+        for corrupted in (b"", state[:-1], state + b"\0", b"GBMC" + state[4:]):
+            with pytest.raises(ValueError):
+                comboCPP.Graph.__new__(comboCPP.Graph).__setstate__(corrupted)
+
+
+@pytest.mark.parametrize("warm_start", [False, True])
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_resolution_sweep(karate, warm_start, n_jobs):
+    from pycombo import execute, resolution_sweep
+
+    resolutions = [1.5, 0.5, 1.0, 2.0]
+    results = resolution_sweep(karate, resolutions, warm_start=warm_start, n_jobs=n_jobs, random_seed=42)
+    assert [r.resolution for r in results] == resolutions
+    for resolution, modularity, n_communities, partition in results:
+        assert set(partition) == set(karate.nodes)
+        assert n_communities == len(set(partition.values()))
+        communities = _partitionGroup(partition)
+        assert modularity == pytest.approx(nx.community.modularity(karate, communities, resolution=resolution))
+        if not warm_start:
+            assert (partition, modularity) == execute(
+                karate, modularity_resolution=resolution, sparse=True, random_seed=42
+            )
+
+
+def test_resolution_sweep_inputs(karate):
+    from pycombo import ComboGraph, execute, resolution_sweep
+
+    matrix = nx.to_numpy_array(karate).tolist()
+    results = resolution_sweep(matrix, [0.5, 1.0], warm_start=False, random_seed=42)
+    assert [(r.partition, r.modularity) for r in results] == [
+        execute(matrix, modularity_resolution=resolution, random_seed=42) for resolution in (0.5, 1.0)
+    ]
+    assert resolution_sweep(karate, []) == []
+
+    graph = ComboGraph(karate, sparse=True)
+    assert resolution_sweep(graph, [1.0], random_seed=42)[0].partition == graph.run(random_seed=42)[0]
+    with pytest.raises(ValueError):
+        resolution_sweep(ComboGraph(karate, sparse=False), [1.0])
+
+
+def test_initial_partition(karate):
+    import numpy as np
+    from pycombo import execute, execute_arrays
+
+    graph = nx.relabel_nodes(karate, {node: f"n{node}" for node in karate})
+    partition, modularity = execute(graph, random_seed=42)
+    assert execute(graph, initial_partition=partition, random_seed=1)[1] >= modularity
+
+    # labels of any type, the partition is only improved
+    halves = {node: "a" if i < 17 else "b" for i, node in enumerate(graph)}
+    halves_modularity = nx.community.modularity(graph, _partitionGroup(halves))
+    assert execute(graph, initial_partition=halves, random_seed=42)[1] >= halves_modularity
+
+    communities = [partition[node] for node in graph]
+    matrix = nx.to_numpy_array(graph)
+    sources, destinations = map(np.ascontiguousarray, np.nonzero(np.triu(matrix)))
+    for initial in (communities, np.array(communities, dtype="int32"), np.array(communities, dtype="int64")):
+        assert execute(matrix, initial_partition=initial, random_seed=1)[1] == pytest.approx(modularity)
+        assert execute_arrays(sources, destinations, initial_partition=initial, random_seed=1)[1] == pytest.approx(
+            modularity
+        )
+    assert execute(matrix, initial_partition=dict(enumerate(communities)))[1] == pytest.approx(modularity)
+
+
+def test_initial_partition_errors(karate):
+    import numpy as np
+    from pycombo import execute
+
+    partition = {node: node % 3 for node in karate}
+    with pytest.raises(ValueError):
+        execute(karate, initial_partition={node: 0 for node in list(karate)[1:]})
+    with pytest.raises(ValueError):
+        execute(karate, initial_partition=[0, 1, 2])
+    with pytest.raises(ValueError):
+        execute(karate, initial_partition=partition, start_separate=True)
+    with pytest.raises(ValueError):
+        execute(karate, initial_partition=partition, max_communities=2)
+    with pytest.raises(TypeError):
+        execute(karate, initial_partition=np.zeros(34))
+
+
+def _assert_dynamic_modularity(dynamic, graph):
+    assert set(dynamic.partition) == set(graph.nodes)
+    communities = _partitionGroup(dynamic.partition)
+    assert dynamic.modularity == pytest.approx(nx.community.modularity(graph, communities))
+
+
+@pytest.mark.parametrize("directed", [False, True])
+def test_dynamic_combo(directed):
+    import random
+    from pycombo import DynamicCombo
+
+    rng = random.Random(42)
+    graph = nx.relaxed_caveman_graph(20, 6, p=0.1, seed=42)
+    if directed:
+        graph = nx.DiGraph((u, v) if rng.random() < 0.5 else (v, u) for u, v in graph.edges)
+    nx.set_edge_attributes(graph, 1.0, "weight")
+    dynamic = DynamicCombo(graph, drift_threshold=0.5, random_seed=42)
+    _assert_dynamic_modularity(dynamic, graph)
+    labels = dict(dynamic.partition)
+
+    nodes = list(graph)
+    added = [(u, v) for u, v in (rng.sample(nodes, 2) for _ in range(10)) if not graph.has_edge(u, v)]
+    added = list(dict.fromkeys(added)) + [(1000, nodes[0])]
+    dynamic.add_edges(added)
+    graph.add_edges_from(added, weight=1.0)
+    _assert_dynamic_modularity(dynamic, graph)
+    # communities without changed edges are kept with their labels
+    touched = {labels[node] for edge in added for node in edge if node in labels}
+    assert all(dynamic.partition[node] == label for node, label in labels.items() if label not in touched)
+
+    removed = rng.sample(list(graph.edges), 10)
+    dynamic.remove_edges(removed)
+    graph.remove_edges_from(removed)
+    _assert_dynamic_modularity(dynamic, graph)
+
+    updated = [(u, v, 3.0) for u, v in rng.sample(list(graph.edges), 10)]
+    dynamic.update_weights(updated)
+    graph.add_weighted_edges_from(updated)
+    _assert_dynamic_modularity(dynamic, graph)
+    assert 0 < dynamic.drift < 0.5
+
+    dynamic.drift_threshold = 0
+    dynamic.add_edges([(nodes[0], nodes[1], 2.0)], optimize=False)
+    graph.add_edge(nodes[0], nodes[1], weight=graph.get_edge_data(nodes[0], nodes[1], {"weight": 0})["weight"] + 2.0)
+    assert dynamic.update()
+    assert dynamic.drift == 0
+    _assert_dynamic_modularity(dynamic, graph)
+
+
+def test_dynamic_combo_errors(karate):
+    from pycombo import DynamicCombo
+
+    dynamic = DynamicCombo(karate, random_seed=42)
+    with pytest.raises(ValueError):
+        dynamic.remove_edges([(0, 9)])
+    with pytest.raises(ValueError):
+        dynamic.update_weights([(0, "unknown", 1.0)])
+    with pytest.raises(ValueError):
+        DynamicCombo(nx.to_numpy_array(karate))
+    assert DynamicCombo().partition == {}
+
+
+def _disconnected_graph(directed=False):
+    graph = nx.DiGraph() if directed else nx.Graph()
+    graph.add_edges_from(nx.relaxed_caveman_graph(10, 8, p=0.1, seed=42).edges(), weight=1.0)
+    graph.add_edges_from(((100 + u, 100 + v) for u, v in nx.karate_club_graph().edges()), weight=2.0)
+    # small components and isolated nodes
+    graph.add_weighted_edges_from([(200, 201, 1.0), (202, 203, 1.0), (203, 204, 1.0), (204, 202, 1.0), (205, 205, 3.0)])
+    graph.add_nodes_from([300, 301])
+    return graph
+
+
+@pytest.mark.parametrize("directed", [False, True])
+@pytest.mark.parametrize("sparse", [None, False])
+def test_components(directed, sparse):
+    from pycombo import ComboGraph, execute
+
+    graph = _disconnected_graph(directed)
+    components = list(nx.weakly_connected_components(graph) if directed else nx.connected_components(graph))
+    component_of = {node: k for k, component in enumerate(components) for node in component}
+    assert ComboGraph(graph, sparse=sparse, components=True).n_components == len(components)
+    for resolution in (1.0, 1.5):
+        partition, modularity = execute(
+            graph, components=True, sparse=sparse, modularity_resolution=resolution, random_seed=42, n_threads=2
+        )
+        communities = _partitionGroup(partition)
+        assert modularity == pytest.approx(nx.community.modularity(graph, communities, resolution=resolution))
+        assert all(len({component_of[node] for node in community}) == 1 for community in communities)
+        assert partition[300] != partition[301]
+        assert modularity >= execute(graph, modularity_resolution=resolution, random_seed=42)[1] - 1e-3
+
+    # components are solved independently of thread scheduling
+    assert execute(graph, components=True, random_seed=1, n_threads=1) == execute(
+        graph, components=True, random_seed=1, n_threads=3
+    )
+
+
+def test_components_inputs():
+    import pickle
+    import numpy as np
+    from scipy.sparse import csr_array
+    from pycombo import ComboGraph, execute, execute_arrays
+
+    graph = _disconnected_graph()
+    matrix = nx.to_numpy_array(graph)
+    expected = execute(graph, components=True, random_seed=42)
+    for data in (matrix, matrix.tolist(), csr_array(matrix)):
+        partition, modularity = execute(data, components=True, random_seed=42)
+        assert modularity == pytest.approx(expected[1])
+        communities = [{list(graph)[i] for i in community} for community in _partitionGroup(partition)]
+        assert modularity == pytest.approx(nx.community.modularity(graph, communities))
+
+    sources, destinations = map(np.ascontiguousarray, np.nonzero(np.triu(matrix)))
+    weights = matrix[sources, destinations]
+    assert execute_arrays(sources, destinations, weights, size=len(graph), components=True, random_seed=42)[1] == pytest.approx(
+        expected[1]
+    )
+
+    # exact partitions of components no larger than 5 nodes
+    small = nx.disjoint_union_all([nx.path_graph(5), nx.star_graph(4), nx.complete_graph(3)] * 4)
+    assert execute(small, components=True)[1] >= max(execute(small, random_seed=seed)[1] for seed in range(5)) - 1e-9
+
+    combo_graph = ComboGraph(graph, sparse=True, components=True)
+    restored = pickle.loads(pickle.dumps(combo_graph))
+    assert restored.n_components == combo_graph.n_components and restored.memory_bytes == combo_graph.memory_bytes
+    assert restored.run(random_seed=3, n_restarts=2, return_restarts=True) == combo_graph.run(
+        random_seed=3, n_restarts=2, return_restarts=True
+    )
+    partition, modularity = combo_graph.with_resolution(0.5).run(random_seed=3)
+    assert modularity == pytest.approx(nx.community.modularity(graph, _partitionGroup(partition), resolution=0.5))
+
+
+def test_components_errors(karate, tmp_path):
+    from pycombo import execute
+
+    with pytest.raises(ValueError):
+        execute(karate, components=True, max_communities=2)
+    with pytest.raises(ValueError):
+        execute(karate, components=True, intermediate_results_path=str(tmp_path / "results.txt"))
+    with pytest.raises(ValueError):
+        execute(str(tmp_path / "graph.net"), components=True)
+    partition = {node: 0 for node in karate}
+    assert _partitionGroup(execute(karate, components=True, initial_partition=partition, random_seed=1)[0]) == (
+        _partitionGroup(execute(karate, initial_partition=partition, random_seed=1)[0])
+    )
+
+
+def _fringed_graph():
+    import random
+
+    rng = random.Random(42)
+    graph = nx.relaxed_caveman_graph(10, 8, p=0.1, seed=42)
+    for node in range(80, 200):
+        graph.add_edge(node, rng.randrange(node))
+    return graph
+
+
+@pytest.mark.parametrize("components", [False, True])
+def test_reduce(components):
+    import pickle
+    from pycombo import ComboGraph, execute
+
+    graph = _fringed_graph()
+    combo_graph = ComboGraph(graph, reduce=True, components=components, sparse=True)
+    assert len(combo_graph) == 200 and combo_graph.reduced_size < 140
+    partition, modularity = combo_graph.run(random_seed=42)
+    assert set(partition) == set(graph)
+    assert modularity == pytest.approx(nx.community.modularity(graph, _partitionGroup(partition)))
+    assert modularity >= execute(graph, random_seed=42)[1] - 0.01
+    leaves = [node for node in graph if graph.degree(node) == 1]
+    assert all(partition[leaf] == partition[next(iter(graph[leaf]))] for leaf in leaves)
+
+    restored = pickle.loads(pickle.dumps(combo_graph))
+    assert restored.reduced_size == combo_graph.reduced_size and restored.memory_bytes == combo_graph.memory_bytes
+    assert restored.run(random_seed=1, n_restarts=2, return_restarts=True) == combo_graph.run(
+        random_seed=1, n_restarts=2, return_restarts=True
+    )
+    partition, modularity = combo_graph.with_resolution(0.5).run(random_seed=1, initial_partition=partition)
+    assert modularity == pytest.approx(nx.community.modularity(graph, _partitionGroup(partition), resolution=0.5))
+
+
+def test_reduce_inputs(tmp_path):
+    from scipy.sparse import csr_array
+    from pycombo import ComboGraph, execute
+
+    graph = _fringed_graph()
+    graph.add_edge(0, 0)
+    reduced_size = ComboGraph(graph, reduce=True).reduced_size
+    matrix = nx.to_numpy_array(graph)
+    for data in (matrix, csr_array(matrix)):
+        combo_graph = ComboGraph(data, reduce=True)
+        assert combo_graph.reduced_size == reduced_size
+        partition, modularity = combo_graph.run(random_seed=42)
+        communities = [{list(graph)[i] for i in community} for community in _partitionGroup(partition)]
+        assert modularity == pytest.approx(nx.community.modularity(graph, communities))
+
+    # large trees are not collapsed into a single community
+    tree = nx.balanced_tree(3, 5)
+    assert 1 < ComboGraph(tree, reduce=True).reduced_size < len(tree)
+    assert execute(tree, reduce=True, random_seed=1)[1] > 0.8
+
+    with pytest.raises(ValueError):
+        execute(graph, reduce=True, treat_as_modularity=True)
+    with pytest.raises(ValueError):
+        execute(graph, reduce=True, intermediate_results_path=str(tmp_path / "results.txt"))
+    with pytest.raises(ValueError):
+        execute(str(tmp_path / "graph.net"), reduce=True)
+    with pytest.raises(ValueError):
+        execute(nx.Graph([(0, 1, {"weight": -1.0}), (1, 2, {"weight": 1.0})]), reduce=True)
+
+
+@pytest.mark.parametrize("components", [False, True])
+def test_multilevel(relaxed_caveman, components):
+    from pycombo import ComboGraph, execute
+
+    graph = ComboGraph(relaxed_caveman, sparse=True, components=components)
+    partition, modularity, restarts = graph.run(
+        multilevel=True, coarsen_to=200, random_seed=42, n_restarts=2, return_restarts=True
+    )
+    assert modularity == pytest.approx(nx.community.modularity(relaxed_caveman, _partitionGroup(partition)))
+    assert modularity >= execute(relaxed_caveman, random_seed=42)[1] - 0.02
+    assert len(restarts) == 2 and modularity == max(restart[1] for restart in restarts)
+    assert graph.run(multilevel=True, coarsen_to=200, random_seed=42) == graph.run(
+        multilevel=True, coarsen_to=200, random_seed=42
+    )
+    # graphs not larger than coarsen_to are partitioned directly
+    assert graph.run(multilevel=True, random_seed=1) == graph.run(random_seed=1)
+
+
+def test_multilevel_inputs(relaxed_caveman, tmp_path):
+    from pycombo import execute
+
+    initial = {node: node // 500 for node in relaxed_caveman}
+    partition, modularity = execute(relaxed_caveman, multilevel=True, coarsen_to=100, initial_partition=initial)
+    assert modularity == pytest.approx(nx.community.modularity(relaxed_caveman, _partitionGroup(partition)))
+    # matrices are built sparse for multilevel mode
+    labels, matrix_modularity = execute(nx.to_numpy_array(relaxed_caveman), multilevel=True, coarsen_to=100, random_seed=42)
+    partition, modularity = execute(relaxed_caveman, multilevel=True, coarsen_to=100, random_seed=42)
+    assert list(labels.values()) == list(partition.values()) and matrix_modularity == pytest.approx(modularity)
+
+    with pytest.raises(ValueError):
+        execute(relaxed_caveman, multilevel=True, coarsen_to=0)
+    with pytest.raises(ValueError):
+        execute(relaxed_caveman, multilevel=True, coarsen_to=100, sparse=False)
+    with pytest.raises(ValueError):
+        execute(nx.to_numpy_array(relaxed_caveman), multilevel=True, coarsen_to=100, sparse=False)
+    with pytest.raises(ValueError):
+        execute(relaxed_caveman, multilevel=True, coarsen_to=100, intermediate_results_path=str(tmp_path / "results.txt"))
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_limits(karate, sparse):
+    from pycombo import ComboGraph
+
+    graph = ComboGraph(karate, sparse=sparse)
+    partition, modularity, converged = graph.run(random_seed=42, return_converged=True)
+    assert converged and (partition, modularity) == graph.run(random_seed=42)
+    assert graph.run(random_seed=42, time_limit_s=60, max_iterations=1000, return_converged=True) == (
+        partition,
+        modularity,
+        True,
+    )
+
+    # every run stops at a complete partition, the best one found so far
+    previous = None
+    for max_iterations in (0, 1, 2):
+        partition, modularity, converged = graph.run(
+            random_seed=42, max_iterations=max_iterations, return_converged=True
+        )
+        assert not converged and len(set(partition.values())) == max_iterations + 1
+        assert modularity == pytest.approx(nx.community.modularity(karate, _partitionGroup(partition)))
+        assert previous is None or modularity > previous
+        previous = modularity
+
+
+@pytest.mark.parametrize("params", [{}, {"components": True}, {"reduce": True}, {"multilevel": True, "coarsen_to": 10}])
+def test_time_limit(karate, params):
+    from pycombo import execute
+
+    partition, modularity, restarts, converged = execute(
+        karate, time_limit_s=0, n_restarts=2, return_restarts=True, return_converged=True, **params
+    )
+    assert not converged
+    assert modularity == pytest.approx(nx.community.modularity(karate, _partitionGroup(partition)))
+    assert len(restarts) == 2
+
+    with pytest.raises(ValueError):
+        execute(karate, time_limit_s=-1)
+    with pytest.raises(ValueError):
+        execute(karate, max_iterations=-1)
+
+
+def test_callback(karate):
+    from pycombo import execute
+
+    calls = []
+    partition, modularity = execute(karate, random_seed=42, callback=lambda *args: calls.append(args), callback_interval_s=0)
+    assert (partition, modularity) == execute(karate, random_seed=42)
+    assert calls[0] == (0, 1, pytest.approx(0)) and calls[-1] == (calls[-1][0], len(set(partition.values())), pytest.approx(modularity))
+    assert all(a[0] <= b[0] and a[2] <= b[2] + 1e-12 for a, b in zip(calls, calls[1:]))
+
+    # returning False stops the run as the time limit does
+    partition, modularity, converged = execute(
+        karate, random_seed=42, callback=lambda iteration, *_: iteration < 2, callback_interval_s=0, return_converged=True
+    )
+    assert not converged and len(set(partition.values())) == 3
+    assert (partition, modularity) == execute(karate, random_seed=42, max_iterations=2)
+
+    with pytest.raises(ZeroDivisionError):
+        execute(karate, callback=lambda *_: 1 / 0, n_restarts=4, n_threads=2)
+    with pytest.raises(ValueError):
+        execute(karate, callback=print, callback_interval_s=-1)
+
+
+@pytest.mark.parametrize(
+    "params", [{}, {"n_restarts": 2, "n_threads": 2}, {"n_restarts": 8, "n_threads": 4}, {"components": True}]
+)
+def test_keyboard_interrupt(params):
+    import _thread
+    import threading
+
+    from pycombo import execute
+
+    # takes several seconds to partition
+    graph = nx.relaxed_caveman_graph(300, 10, p=0.1, seed=42)
+    threading.Timer(0.1, _thread.interrupt_main).start()
+    start = time.time()
+    with pytest.raises(KeyboardInterrupt):
+        execute(graph, **params)
+    assert time.time() - start < 2
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_stats(karate, sparse):
+    from pycombo import ComboGraph, RunStats
+
+    graph = ComboGraph(karate, sparse=sparse)
+    partition, modularity, stats = graph.run(random_seed=42, return_stats=True)
+    assert (partition, modularity) == graph.run(random_seed=42)
+    assert isinstance(stats, RunStats)
+    trajectory = stats.modularity_trajectory
+    assert trajectory[0] == pytest.approx(0) and trajectory[-1] == pytest.approx(modularity)
+    assert len(trajectory) == stats.splits_accepted + 1 and trajectory == sorted(trajectory)
+    assert stats.split_attempts > stats.splits_accepted > 0 and stats.kernighan_lin_moves > 0
+    assert 0 < stats.kernighan_lin_seconds <= stats.split_seconds <= stats.run_seconds
+    assert stats.matrix_bytes == graph.memory_bytes and stats.peak_run_bytes > 0
+    assert min(stats.deconstruction_seconds, stats.conversion_seconds, stats.construction_seconds) >= 0
+
+    # counters are summed over restarts, trajectory is that of the returned one
+    partition, stats = graph.run(random_seed=42, n_restarts=2, return_modularity=False, return_stats=True)
+    first = graph.run(random_seed=42, return_stats=True)[2]
+    assert stats.splits_accepted > first.splits_accepted and stats.split_attempts > first.split_attempts
+
+
+def test_stats_modes(karate):
+    from pycombo import execute
+
+    modularity, stats = execute(karate, random_seed=42, components=True, return_stats=True)[1:]
+    assert stats.modularity_trajectory == [] and stats.splits_accepted > 0
+    modularity, stats = execute(karate, random_seed=42, multilevel=True, coarsen_to=10, return_stats=True)[1:]
+    assert stats.modularity_trajectory[-1] == pytest.approx(modularity)
+    assert stats.coarsening_seconds > 0 and stats.refinement_seconds > 0
+
+
+def test_iter_execute(karate):
+    import threading
+
+    from pycombo import ComboGraph, execute, iter_execute
+
+    partition, modularity = execute(karate, random_seed=42)
+    items = list(iter_execute(karate, random_seed=42, queue_size=2))
+    assert [iteration for iteration, _, _ in items] == list(range(len(items)))
+    assert items[0][2] == pytest.approx(0) and not items[0][1].any()
+    assert list(items[-1][1]) == list(partition.values()) and items[-1][2] == pytest.approx(modularity)
+
+    # leaving the loop early stops the run
+    graph = ComboGraph(nx.relaxed_caveman_graph(300, 10, p=0.1, seed=42))
+    start = time.time()
+    for iteration, labels, _ in graph.iter_run(random_seed=42):
+        if iteration == 2:
+            break
+    assert time.time() - start < 2 and threading.active_count() == 1
+
+    with pytest.raises(ValueError):
+        list(iter_execute(karate, n_restarts=2))
+
+
+def test_array_output(karate):
+    import numpy as np
+    from pycombo import ArrayPartition, CommunityArrays, execute
+
+    partition, modularity = execute(karate, random_seed=42)
+    array, modularity_a = execute(karate, random_seed=42, output="array")
+    assert isinstance(array, ArrayPartition) and array.labels.dtype == np.int32
+    assert modularity_a == modularity and dict(zip(array.nodes, array.labels.tolist())) == partition
+
+    partition, restarts = execute(karate, random_seed=42, n_restarts=2, return_modularity=False, return_restarts=True)
+    communities, restarts_c = execute(karate, random_seed=42, n_restarts=2, return_modularity=False, return_restarts=True,
+                                      output="communities")
+    assert isinstance(communities, CommunityArrays) and isinstance(restarts_c[1][0], CommunityArrays)
+    groups = [sorted(communities.nodes[i] for i in communities.members[start:end])
+              for start, end in zip(communities.offsets, communities.offsets[1:])]
+    assert sorted(groups) == _partitionGroup(partition)
+
+    with pytest.raises(ValueError):
+        execute(karate, output="list")
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_diagnostics(karate, sparse):
+    import numpy as np
+    from pycombo import ComboGraph, Diagnostics
+
+    graph = ComboGraph(karate, sparse=sparse)
+    partition, modularity, diagnostics = graph.run(random_seed=42, max_communities=2, return_diagnostics=True)
+    assert isinstance(diagnostics, Diagnostics)
+    assert diagnostics.community_sizes.tolist() == np.bincount(list(partition.values())).tolist()
+    assert diagnostics.modularity_contributions.sum() == pytest.approx(modularity)
+
+    # weights and strengths are fractions of the total weight, for dense graphs too
+    total = karate.size(weight="weight")
+    internal = [sum(w for u, v, w in karate.edges(data="weight", default=1) if partition[u] == partition[v] == c) for c in range(2)]
+    strengths = [sum(d for u, d in karate.degree(weight="weight") if partition[u] == c) for c in range(2)]
+    assert diagnostics.internal_weights == pytest.approx(np.array(internal) / total)
+    assert diagnostics.strengths == pytest.approx(np.array(strengths) / (2 * total))
+
+    # gains are those of moving each node to its best community
+    labels = [partition[node] for node in graph.nodes]
+    for i, (best, gain) in enumerate(zip(diagnostics.best_communities, diagnostics.best_gains)):
+        if best < 0:  # no neighbors in other communities
+            assert sparse and np.isnan(gain)
+            continue
+        moved = list(labels)
+        moved[i] = best
+        assert graph.modularity(moved) - modularity == pytest.approx(gain)
+
+
+@pytest.mark.parametrize("params", [{"components": True}, {"reduce": True}, {"components": True, "reduce": True}])
+def test_diagnostics_components(karate, params):
+    import numpy as np
+    from pycombo import ComboGraph
+
+    graph = karate.copy()
+    graph.add_nodes_from([100, 101])
+    graph.add_edge(102, 103, weight=2.0)
+    graph.add_edge(0, 200)
+    graph.add_edge(200, 201)
+    partition, modularity, diagnostics = ComboGraph(graph, sparse=True, **params).run(
+        random_seed=42, return_diagnostics=True
+    )
+    assert diagnostics.modularity_contributions.sum() == pytest.approx(modularity)
+
+    # same as diagnostics of the partition of the whole graph
+    _, _, expected = ComboGraph(graph, sparse=True).run(initial_partition=partition, max_iterations=0, return_diagnostics=True)
+    for name in ["community_sizes", "internal_weights", "strengths", "modularity_contributions"]:
+        assert getattr(diagnostics, name) == pytest.approx(getattr(expected, name)), name
+    # pendant node 11 and the chain of 200 and 201 are folded into node 0, and get its values of moving them together
+    folded = {0, 11, 200, 201} if "reduce" in params else set()
+    unfolded = [i for i, node in enumerate(graph.nodes) if node not in folded]
+    assert diagnostics.best_communities[unfolded].tolist() == expected.best_communities[unfolded].tolist()
+    assert np.allclose(diagnostics.best_gains[unfolded], expected.best_gains[unfolded], equal_nan=True)
+
+
+def _community_weights(graph, partition, community_graph):
+    import numpy as np
+
+    # weights summed up over edges between (and within) communities, and weights of community_graph as dense matrix
+    index = {label: k for k, label in enumerate(community_graph.labels)}
+    expected = np.zeros((len(index), len(index)))
+    for u, v, weight in graph.edges(data="weight", default=1):
+        a, b = index[partition[u]], index[partition[v]]
+        expected[a, b] += weight
+        if a != b:
+            expected[b, a] += weight
+    weights = np.zeros_like(expected)
+    indptr, indices = community_graph.indptr, community_graph.indices
+    for k in range(len(index)):
+        weights[k, indices[indptr[k]:indptr[k + 1]]] = community_graph.weights[indptr[k]:indptr[k + 1]]
+    return weights, expected
+
+
+def test_community_graph(karate):
+    import networkx as nx
+    import numpy as np
+    from pycombo import ComboGraph, CommunityGraph, community_graph, execute
+
+    partition, _ = execute(karate, random_seed=42)
+    graph = community_graph(karate, partition)
+    assert isinstance(graph, CommunityGraph) and sorted(graph.labels) == sorted(set(partition.values()))
+    assert graph.sizes.tolist() == [list(partition.values()).count(label) for label in graph.labels]
+    weights, expected = _community_weights(karate, partition, graph)
+    assert weights == pytest.approx(expected)
+
+    labels = [partition[node] for node in ComboGraph(karate).nodes]
+    assert community_graph(ComboGraph(karate, sparse=True), np.array(labels)).labels == graph.labels
+    # dense graphs recover adjacency from the modularity matrix, without entries between unconnected communities
+    for dense in [ComboGraph(karate, sparse=False), nx.to_numpy_array(karate), nx.to_numpy_array(karate).tolist()]:
+        dense_graph = community_graph(dense, labels)
+        assert dense_graph.indptr.tolist() == graph.indptr.tolist()
+        assert dense_graph.indices.tolist() == graph.indices.tolist()
+        assert dense_graph.weights == pytest.approx(graph.weights)
+
+    # directed graphs add up both directions, weights are in units of the graph
+    directed = nx.DiGraph()
+    directed.add_weighted_edges_from([(0, 1, 2.5), (1, 2, 0.5), (2, 0, 1.0), (3, 4, 4.0), (4, 3, 1.5), (2, 3, 3.0)])
+    directed_partition = {0: "a", 1: "a", 2: "a", 3: "b", 4: "b"}
+    for sparse in [True, False]:
+        directed_graph = community_graph(ComboGraph(directed, sparse=sparse), directed_partition)
+        weights, expected = _community_weights(directed, directed_partition, directed_graph)
+        assert weights == pytest.approx(expected)
+        assert weights == pytest.approx(np.array([[4.0, 3.0], [3.0, 5.5]]))
+
+
+def test_community_graph_unsupported(tmp_path, karate):
+    import networkx as nx
+    from pycombo import ComboGraph, community_graph
+
+    labels = [0] * 17 + [1] * 17
+    with pytest.raises(ValueError):
+        community_graph(ComboGraph(karate, components=True), labels)
+    path = tmp_path / "karate.net"
+    nx.write_pajek(karate, path)
+    with pytest.raises(ValueError):
+        community_graph(ComboGraph(str(path)), labels)
+    # files read by community_graph itself are built sparse
+    assert community_graph(str(path), labels).weights.sum() == pytest.approx(
+        community_graph(karate, labels).weights.sum())
+
+
+def test_execute_hierarchical(relaxed_caveman):
+    import numpy as np
+    from pycombo import ComboGraph, Dendrogram, execute, execute_hierarchical
+
+    partition, modularity = execute(relaxed_caveman, random_seed=42, sparse=True)
+    dendrogram = execute_hierarchical(relaxed_caveman, levels=3, random_seed=42, n_threads=2)
+    assert isinstance(dendrogram, Dendrogram) and dendrogram.modularity == pytest.approx(modularity)
+    parents, levels, sizes = dendrogram.parents, dendrogram.levels, dendrogram.sizes
+    assert levels.max() == 2 and (parents[levels == 0] == -1).all()
+    children = parents >= 0
+    assert (levels[children] == levels[parents[children]] + 1).all()
+    split = np.unique(parents[children])
+    assert len(split) > 0 and (np.bincount(parents[children], weights=sizes[children])[split] == sizes[split]).all()
+    leaves = np.setdiff1d(np.arange(len(sizes)), parents)
+    assert np.bincount(dendrogram.labels, minlength=len(sizes))[leaves].tolist() == sizes[leaves].tolist()
+
+    # the first level is the partition of execute, communities are split as execute splits their subgraphs
+    top, first = dendrogram.labels.copy(), dendrogram.labels.copy()
+    while (levels[top] > 0).any():
+        top = np.where(levels[top] > 0, parents[top], top)
+        first = np.where(levels[first] > 1, parents[first], first)
+    assert _partitionGroup(dict(zip(dendrogram.nodes, top))) == _partitionGroup(partition)
+    community = np.flatnonzero(top == top[0])
+    subgraph = relaxed_caveman.subgraph([dendrogram.nodes[i] for i in community])
+    assert _partitionGroup(dict(zip(subgraph, first[community]))) == _partitionGroup(
+        execute(subgraph, random_seed=42, sparse=True, return_modularity=False))
+
+    with pytest.raises(ValueError):
+        execute_hierarchical(relaxed_caveman, levels=0)
+    with pytest.raises(ValueError):
+        execute_hierarchical(ComboGraph(relaxed_caveman, components=True))
+
+
+def test_execute_hierarchical_inputs(relaxed_caveman, tmp_path):
+    import pickle
+
+    import numpy as np
+    from pycombo import ComboGraph, execute_hierarchical
+
+    expected = execute_hierarchical(relaxed_caveman, levels=3, random_seed=42)
+    path = tmp_path / "graph.net"
+    nx.write_pajek(relaxed_caveman, path)
+    # matrices and files are built sparse
+    for graph in [nx.to_numpy_array(relaxed_caveman), str(path)]:
+        dendrogram = execute_hierarchical(graph, levels=3, random_seed=42)
+        assert dendrogram.modularity == pytest.approx(expected.modularity)
+        assert dendrogram.labels.tolist() == expected.labels.tolist()
+        assert dendrogram.parents.tolist() == expected.parents.tolist()
+    # dense graphs are run at the first level, then converted to sparse ones
+    dense = ComboGraph(relaxed_caveman, sparse=False)
+    dendrogram = execute_hierarchical(dense, levels=3, random_seed=42)
+    first, modularity = dense.run(random_seed=42)
+    assert dendrogram.modularity == pytest.approx(modularity) and dendrogram.levels.max() == 2
+    top = dendrogram.labels.copy()
+    while (dendrogram.levels[top] > 0).any():
+        top = np.where(dendrogram.levels[top] > 0, dendrogram.parents[top], top)
+    assert _partitionGroup(dict(enumerate(top))) == _partitionGroup(dict(enumerate(first.values())))
+    with pytest.raises(ValueError):
+        execute_hierarchical(ComboGraph(str(path)))
+
+    # strengths within subgraphs of directed graphs are not known
+    directed = relaxed_caveman.to_directed()
+    assert (execute_hierarchical(directed, levels=1, random_seed=42).levels == 0).all()
+    with pytest.raises(ValueError):
+        execute_hierarchical(directed, levels=2)
+    with pytest.raises(ValueError):
+        execute_hierarchical(ComboGraph(directed, sparse=False), levels=2)
+    with pytest.raises(ValueError):
+        execute_hierarchical(pickle.loads(pickle.dumps(ComboGraph(directed, sparse=True))), levels=2)